@@ -1,9 +1,8 @@
-import os
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy                             # для работы с ORM
 from flask_migrate import Migrate                                   # Обеспечивает систему миграций для SQLAlchemy и Автоматически отслеживает изменения в моделях
-from app.create_db import create_database_if_not_exists
+from app.create_db import create_database_if_not_exists, upgrade_database, MIGRATIONS_DIR
 from flask_wtf.csrf import CSRFProtect                              # Импорт CSRF защиты
 from flask_caching import Cache                                     # Кэшь реализация flask
 from flask_session import Session                                   # cерверного хранения сессий
@@ -30,7 +29,7 @@ def create_app(config_class='app.config.Config'):                   # запус
 
     # Инициализация БД
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, directory=MIGRATIONS_DIR)
 
     # Создаем БД 
     try:
@@ -38,33 +37,69 @@ def create_app(config_class='app.config.Config'):                   # запус
     except Exception as e:
         app.logger.warning(f"Could not create database: {e}")
 
-    # Создаем таблицы в БД
+    # Создаем таблицы в БД и применяем миграции (app/migrations)
     with app.app_context():                                         # в этой части кода создаем таблицы для бд
-        from sqlalchemy import inspect
         from app.models import User                                 # тут импортируем модели которые мы хотим реализовать в виде таблиц в БД
         from app.modules.ldap_mod.models import LDAPServer          # импортируем модель БД LDAP
-        inspector = inspect(db.engine)
-
-        if not inspector.has_table('alembic_version'):              # Если нет таблицы версий, 
-            try:
-                if os.path.exists('migrations'):                    # но есть папка миграций  проверяем существование папки migraitons
-                    from flask_migrate import stamp                 #
-                    db.create_all()                                 # создаем все таблицы из модели 
-                    stamp()                                         # добавляем таблицу alembic_version
-                else:
-                    from flask_migrate import init as migrate_init  # .к. у нас уже есть выше  migrate то тут называем ее migrate_init
-                    migrate_init()                                  # инициализируем миграцию т.е. создается папка migraitons
-                    print(f"Инициализации миграции")
-            except Exception as e:
-                print(f"Ошибка миграции БД {e}")
-            else:                                                   # если есть таблица alembic_version то мы предполагем что есть и папка migrations поэтому просто пробуем обновить БД
-                try:
-                    from flask_migrate import upgrade as migrate_upgrade
-                    from flask_migrate import migrate as generate_migration
-                    generate_migration(message='Авто миграция')
-                    migrate_upgrade()  
-                except:
-                    print(f"Ошибка обновления БД {e}")
+        from app.modules.phonebook_mod.search import ensure_search_extension
+
+        try:
+            ensure_search_extension()                               # расширение pg_trgm нужно до создания поисковых индексов
+        except Exception as e:
+            app.logger.warning(f"Could not enable pg_trgm: {e}")
+
+        try:
+            result = upgrade_database()
+            if result != 'up to date':
+                app.logger.info(f"Схема БД: {result}")
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Ошибка миграции БД: {e}")
+
+    # Заполняем вычисляемые поля для данных, сохраненных до их появления
+    with app.app_context():
+        from app.modules.phonebook_mod.search import rebuild_search_text
+        try:
+            rebuild_search_text()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"Could not rebuild search index: {e}")
+
+        from app.modules.ldap_mod.photo_store import migrate_inline_photos, build_missing_variants
+        try:
+            migrate_inline_photos()                                 # перенос фото из ldap_users.photo (base64) в contact_photos
+            build_missing_variants()                                # уменьшение фото, сохраненных без обработки
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"Could not migrate contact photos: {e}")
+
+        from app.modules.ldap_mod.phones import rebuild_phone_index
+        try:
+            rebuild_phone_index()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"Could not rebuild phone index: {e}")
+
+        from app.modules.ldap_mod.fingerprint import rebuild_content_hashes
+        try:
+            rebuild_content_hashes()                                # после переноса фото: отпечаток включает хеш фото
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"Could not rebuild contact fingerprints: {e}")
+
+        from app.modules.ldap_mod.building_plan import rebuild_building_plan_metadata
+        try:
+            rebuild_building_plan_metadata()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"Could not fill building plan metadata: {e}")
+
+        from app.modules.map_mod.spatial import rebuild_map_positions
+        try:
+            rebuild_map_positions()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"Could not fill map positions: {e}")
 
     from app.route import main_bp
     app.register_blueprint(main_bp)
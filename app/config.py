@@ -11,10 +11,47 @@ class BaseConfig:
     # Время синхронизации LDAP серверов
     LDAP_SYNC_ENABLED = os.environ.get('LDAP_SYNC_ENABLED', 'true').lower() == 'true'
     LDAP_SYNC_INTERVAL_MINUTES = int(os.environ.get('LDAP_SYNC_INTERVAL_MINUTES', 1))
+    # Размер страницы постраничного поиска в LDAP (не больше MaxPageSize сервера, в AD по умолчанию 1000)
+    LDAP_PAGE_SIZE = int(os.environ.get('LDAP_PAGE_SIZE', 500))
+    # Между полными проходами синхронизация запрашивает у LDAP только измененные записи
+    LDAP_FULL_SYNC_INTERVAL_MINUTES = int(os.environ.get('LDAP_FULL_SYNC_INTERVAL_MINUTES', 60))
+    # Пул соединений с LDAP: максимум соединений на сервер и время простоя до закрытия (сек)
+    LDAP_POOL_MAX_SIZE = int(os.environ.get('LDAP_POOL_MAX_SIZE', 4))
+    LDAP_POOL_IDLE_SECONDS = int(os.environ.get('LDAP_POOL_IDLE_SECONDS', 300))
+    # Параллельная синхронизация: сколько серверов синхронизировать одновременно и таймаут на сервер (сек)
+    LDAP_SYNC_MAX_WORKERS = int(os.environ.get('LDAP_SYNC_MAX_WORKERS', 8))
+    LDAP_SYNC_TIMEOUT_SECONDS = int(os.environ.get('LDAP_SYNC_TIMEOUT_SECONDS', 300))
+    # Максимальная задержка повтора для сервера с ошибками синхронизации (мин) и срок жизни блокировки синхронизации (сек);
+    # срок блокировки должен быть больше LDAP_SYNC_TIMEOUT_SECONDS + LDAP_NETWORK_TIMEOUT, иначе идущую синхронизацию сочтут зависшей
+    LDAP_SYNC_MAX_BACKOFF_MINUTES = int(os.environ.get('LDAP_SYNC_MAX_BACKOFF_MINUTES', 60))
+    LDAP_SYNC_LOCK_TTL_SECONDS = int(os.environ.get('LDAP_SYNC_LOCK_TTL_SECONDS', 3600))
+    # Общий для всех воркеров кеш снимков каталога LDAP для страницы выбора контактов: файл, лимит размера (байт), время жизни (сек)
+    LDAP_BROWSE_CACHE_PATH = os.environ.get('LDAP_BROWSE_CACHE_PATH', '/tmp/phonebook_ldap_browse.sqlite')
+    LDAP_BROWSE_CACHE_MAX_BYTES = int(os.environ.get('LDAP_BROWSE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    LDAP_BROWSE_CACHE_TTL_SECONDS = int(os.environ.get('LDAP_BROWSE_CACHE_TTL_SECONDS', 3600))
+    # Сколько пользователей LDAP показывать на одной странице выбора контактов
+    LDAP_BROWSE_PAGE_SIZE = int(os.environ.get('LDAP_BROWSE_PAGE_SIZE', 200))
+    # Таймаут сетевых операций с LDAP сервером (подключение, ожидание ответа), сек
+    LDAP_NETWORK_TIMEOUT = int(os.environ.get('LDAP_NETWORK_TIMEOUT', 30))
 
     # базоый урл для формирования сслыки в письмах
     APP_BASE_URL = os.environ.get('APP_BASE_URL', 'http://localhost:5050')
 
+    # Размер страницы телефонной книги (первая страница рендерится сервером, остальные подгружаются через API)
+    PHONEBOOK_PAGE_SIZE = int(os.environ.get('PHONEBOOK_PAGE_SIZE', 100))
+    PHONEBOOK_PAGE_SIZE_MAX = int(os.environ.get('PHONEBOOK_PAGE_SIZE_MAX', 500))
+
+    # Сколько хранить подготовленную страницу телефонной книги в кеше, секунд (устаревшую версию кеш не отдает в любом случае)
+    PHONEBOOK_CACHE_TIMEOUT = int(os.environ.get('PHONEBOOK_CACHE_TIMEOUT', 86400))
+
+    # Время кеширования фотографий контактов браузером (URL фото меняется вместе с содержимым)
+    PHOTO_CACHE_MAX_AGE = int(os.environ.get('PHOTO_CACHE_MAX_AGE', 31536000))
+
+    # Время кеширования плана здания браузером (адрес плана содержит версию файла)
+    BUILDING_PLAN_CACHE_MAX_AGE = int(os.environ.get('BUILDING_PLAN_CACHE_MAX_AGE', 31536000))
+    # Каталог для тайлов больших планов зданий (строятся при загрузке плана, общий для всех процессов)
+    BUILDING_PLAN_TILE_DIR = os.environ.get('BUILDING_PLAN_TILE_DIR', '/tmp/phonebook_plan_tiles')
+
     # Настройки авторизации
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME')
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD')
@@ -1,6 +1,13 @@
+import os
+from contextlib import contextmanager
 import psycopg2
 from app.config import DBCreationConfig
 
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')              # миграции поставляются вместе с приложением
+BASELINE_REVISION = '0001'                                                          # схема до появления версионированных миграций
+MIGRATION_LOCK_KEY = 7203501                                                        # ключ pg_advisory_lock: миграции выполняет один процесс gunicorn
+
 def create_database_if_not_exists():
     try:
         conn = psycopg2.connect(DBCreationConfig.POSTGRES_ADMIN_URI)                                 # URI подключения  одно и то же . так что испльзуем его
@@ -22,3 +29,59 @@ def create_database_if_not_exists():
     finally:
         if conn:
             conn.close()
+
+
+@contextmanager
+def _migration_lock(engine):
+    """Не дает нескольким процессам одновременно менять схему (только PostgreSQL)"""
+    from sqlalchemy import text
+    if engine.dialect.name != 'postgresql':
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+
+
+def upgrade_database():
+    """
+    Приводит схему БД к текущим моделям (вызывается в контексте приложения при запуске)
+
+    - Пустая БД: таблицы создаются по моделям, БД помечается последней ревизией.
+    - БД, созданная до версионированных миграций (нет alembic_version, она пустая или в ней
+      ревизия, сгенерированная на месте): схема соответствует базовой ревизии — помечаем ее
+      и применяем все последующие.
+    - Иначе применяются недостающие миграции.
+
+    Returns:
+        str: что было сделано ('created', 'upgraded', 'up to date')
+    """
+    from alembic import command
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    from flask import current_app
+    from sqlalchemy import inspect
+    from app import db
+
+    config = current_app.extensions['migrate'].migrate.get_config(MIGRATIONS_DIR)
+    config.attributes['configure_logger'] = False                                   # логирование настраивает приложение
+    with _migration_lock(db.engine):
+        if not inspect(db.engine).has_table('ldap_users'):
+            db.create_all()
+            command.stamp(config, 'head')
+            return 'created'
+
+        scripts = ScriptDirectory.from_config(config)
+        with db.engine.connect() as conn:
+            current = set(MigrationContext.configure(conn).get_current_heads())
+        if current == {scripts.get_current_head()}:
+            return 'up to date'
+
+        known = {script.revision for script in scripts.walk_revisions()}
+        if not current or not current <= known:
+            command.stamp(config, BASELINE_REVISION, purge=True)                    # purge: убираем неизвестную ревизию
+        command.upgrade(config, 'head')
+        return 'upgraded'
@@ -0,0 +1,42 @@
+"""search text
+
+Нормализованная строка поиска контакта и триграммный GIN индекс по ней (PostgreSQL, pg_trgm).
+В других БД индекс не создается: поиск использует индекс в памяти процесса (phonebook_mod/search.py).
+Значения для существующих контактов заполняет rebuild_search_text при запуске приложения.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 06:13:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _is_postgresql():
+    return op.get_context().dialect.name == 'postgresql'
+
+
+def upgrade():
+    with op.batch_alter_table('ldap_users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('search_text', sa.Text(), nullable=True))
+
+    if _is_postgresql():
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_ldap_users_search_text_trgm', 'ldap_users', ['search_text'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if _is_postgresql():
+        op.drop_index('ix_ldap_users_search_text_trgm', table_name='ldap_users')
+
+    with op.batch_alter_table('ldap_users', schema=None) as batch_op:
+        batch_op.drop_column('search_text')
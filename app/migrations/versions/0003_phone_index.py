@@ -0,0 +1,39 @@
+"""phone index
+
+Нормализованные номера телефонов контактов для обратного поиска (ldap_user_phones).
+Номера существующих контактов заполняет rebuild_phone_index при запуске приложения.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 06:13:57.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ldap_user_phones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('digits', sa.String(length=32), nullable=False),
+    sa.Column('digits_reversed', sa.String(length=32), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['ldap_users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ldap_user_phones', schema=None) as batch_op:
+        batch_op.create_index('ix_ldap_user_phones_digits', ['digits'], unique=False)
+        batch_op.create_index('ix_ldap_user_phones_digits_reversed', ['digits_reversed'], unique=False, postgresql_ops={'digits_reversed': 'varchar_pattern_ops'})
+        batch_op.create_index('ix_ldap_user_phones_user_id', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_table('ldap_user_phones')
@@ -0,0 +1,43 @@
+"""contact photos
+
+Хранилище фотографий контактов (contact_photos), адресуемых sha256 содержимого,
+и ссылка на него из ldap_users.photo_hash. Старая колонка ldap_users.photo остается:
+из нее migrate_inline_photos переносит фото существующих контактов при запуске приложения.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 06:15:12.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('contact_photos',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('mimetype', sa.String(length=100), nullable=True),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    with op.batch_alter_table('ldap_users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('photo_hash', sa.String(length=64), nullable=True))
+        batch_op.create_foreign_key('ldap_users_photo_hash_fkey', 'contact_photos', ['photo_hash'], ['hash'])  # имя как у create_all в PostgreSQL
+        batch_op.create_index('ix_ldap_users_photo_hash', ['photo_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ldap_users', schema=None) as batch_op:
+        batch_op.drop_index('ix_ldap_users_photo_hash')
+        batch_op.drop_constraint('ldap_users_photo_hash_fkey', type_='foreignkey')
+        batch_op.drop_column('photo_hash')
+
+    op.drop_table('contact_photos')
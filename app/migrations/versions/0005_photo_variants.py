@@ -0,0 +1,41 @@
+"""photo variants
+
+Уменьшенные копии фотографий (contact_photo_variants) и признак обработки фото
+image_pipeline. Уже сохраненные фото обрабатывает build_missing_variants при запуске приложения.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 06:17:19.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contact_photos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('variants_built', sa.Boolean(), nullable=True))
+
+    op.create_table('contact_photo_variants',
+    sa.Column('photo_hash', sa.String(length=64), nullable=False),
+    sa.Column('px', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('mimetype', sa.String(length=100), nullable=True),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['photo_hash'], ['contact_photos.hash'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('photo_hash', 'px')
+    )
+
+
+def downgrade():
+    op.drop_table('contact_photo_variants')
+
+    with op.batch_alter_table('contact_photos', schema=None) as batch_op:
+        batch_op.drop_column('variants_built')
@@ -0,0 +1,31 @@
+"""incremental sync
+
+Состояние инкрементальной синхронизации LDAP: наибольший полученный uSNChanged
+и время последнего полного прохода. Пустые значения — следующая синхронизация полная.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 06:20:28.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_usn', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('last_full_sync', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.drop_column('last_full_sync')
+        batch_op.drop_column('last_usn')
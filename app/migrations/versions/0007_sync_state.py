@@ -0,0 +1,33 @@
+"""sync state
+
+Состояние планировщика синхронизации сервера: блокировка, число ошибок подряд
+и время, раньше которого сервер не синхронизируется (см. ldap_mod/sync_state.py).
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 06:24:19.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sync_started_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('sync_failures', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('sync_next_run', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.drop_column('sync_next_run')
+        batch_op.drop_column('sync_failures')
+        batch_op.drop_column('sync_started_at')
@@ -0,0 +1,30 @@
+"""content hash
+
+Отпечаток полей и фото контакта (ldap_users.content_hash) для пропуска неизмененных
+записей при синхронизации. Отпечатки существующих контактов заполняет rebuild_content_hashes
+при запуске приложения.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 06:26:02.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ldap_users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ldap_users', schema=None) as batch_op:
+        batch_op.drop_column('content_hash')
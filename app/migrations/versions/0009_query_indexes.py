@@ -0,0 +1,34 @@
+"""query indexes
+
+Индексы ldap_users под запросы приложения: контакты сервера по имени, сортировка и keyset
+пагинация телефонной книги по (cn, id), частичный индекс размещенных на карте.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 06:26:34.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ldap_users', schema=None) as batch_op:
+        batch_op.create_index('ix_ldap_users_server_id_cn', ['server_id', 'cn'], unique=False)
+        batch_op.create_index('ix_ldap_users_cn_id', ['cn', 'id'], unique=False)
+        batch_op.create_index('ix_ldap_users_on_map', ['server_id'], unique=False,
+                              postgresql_where=sa.text('is_on_map = true'), sqlite_where=sa.text('is_on_map = 1'))
+
+
+def downgrade():
+    with op.batch_alter_table('ldap_users', schema=None) as batch_op:
+        batch_op.drop_index('ix_ldap_users_on_map')
+        batch_op.drop_index('ix_ldap_users_cn_id')
+        batch_op.drop_index('ix_ldap_users_server_id_cn')
@@ -0,0 +1,31 @@
+"""contacts version
+
+Счетчик изменений контактов (одна строка) — версия данных для кеша телефонной книги.
+Строка создается при первом изменении контактов.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 06:31:31.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('contacts_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('contacts_version')
@@ -0,0 +1,31 @@
+"""building plan metadata
+
+Хеш и размер файла плана здания: наличие и версия плана проверяются без чтения файла.
+Значения для загруженных планов заполняет rebuild_building_plan_metadata при запуске приложения.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 06:32:07.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('building_plan_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('building_plan_size', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.drop_column('building_plan_size')
+        batch_op.drop_column('building_plan_hash')
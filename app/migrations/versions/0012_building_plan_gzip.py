@@ -0,0 +1,29 @@
+"""building plan gzip
+
+Заранее сжатая gzip копия SVG плана здания. Для загруженных планов строится
+rebuild_building_plan_metadata при запуске приложения.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 06:33:10.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('building_plan_gzip', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.drop_column('building_plan_gzip')
@@ -0,0 +1,33 @@
+"""building plan tiles
+
+Размеры растрового плана здания и сторона тайла пирамиды (пусто — план не режется).
+Для загруженных планов заполняются rebuild_building_plan_metadata при запуске приложения.
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18 06:36:32.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('building_plan_width', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('building_plan_height', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('building_plan_tile_size', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.drop_column('building_plan_tile_size')
+        batch_op.drop_column('building_plan_height')
+        batch_op.drop_column('building_plan_width')
@@ -0,0 +1,34 @@
+"""map positions
+
+Числовые координаты контакта на карте и индекс для выборки по видимой области.
+Значения для размещенных контактов заполняет rebuild_map_positions из coordinates
+при запуске приложения.
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-18 06:37:47.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0014'
+down_revision = '0013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ldap_users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('map_x', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('map_y', sa.Float(), nullable=True))
+        batch_op.create_index('ix_ldap_users_map_xy', ['server_id', 'map_x', 'map_y'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ldap_users', schema=None) as batch_op:
+        batch_op.drop_index('ix_ldap_users_map_xy')
+        batch_op.drop_column('map_y')
+        batch_op.drop_column('map_x')
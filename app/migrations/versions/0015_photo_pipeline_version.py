@@ -0,0 +1,40 @@
+"""photo pipeline version
+
+Признак обработки фото (variants_built) заменяется версией image_pipeline, которой фото
+обработано: версия входит в URL фотографии, поэтому после повторной обработки
+(новая версия или установка Pillow) у фото меняется URL и браузер не показывает старые байты.
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-18 09:12:05.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0015'
+down_revision = '0014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contact_photos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pipeline_version', sa.Integer(), nullable=True))
+
+    op.execute("UPDATE contact_photos SET pipeline_version = CASE WHEN variants_built THEN 1 ELSE 0 END")
+
+    with op.batch_alter_table('contact_photos', schema=None) as batch_op:
+        batch_op.drop_column('variants_built')
+
+
+def downgrade():
+    with op.batch_alter_table('contact_photos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('variants_built', sa.Boolean(), nullable=True))
+
+    op.execute("UPDATE contact_photos SET variants_built = (pipeline_version > 0)")
+
+    with op.batch_alter_table('contact_photos', schema=None) as batch_op:
+        batch_op.drop_column('pipeline_version')
@@ -0,0 +1,31 @@
+"""building plan metadata version
+
+Версия, с которой заполнены вычисляемые колонки плана здания. Без нее план, который
+не сжимается (SVG) или не разбирается как изображение, выглядел незаполненным
+и перечитывался rebuild_building_plan_metadata при каждом запуске приложения.
+Уже загруженные планы один раз проверяются при следующем запуске.
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-18 09:41:26.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0016'
+down_revision = '0015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('building_plan_metadata_version', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ldap_server', schema=None) as batch_op:
+        batch_op.drop_column('building_plan_metadata_version')
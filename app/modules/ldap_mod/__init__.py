@@ -5,10 +5,18 @@ bp = Blueprint('ldap', __name__, url_prefix='/ldap', template_folder='templates'
 
 # Импорт views после создания Blueprint
 from . import views
+from . import phones                    # регистрирует обновление индекса телефонных номеров
+from . import fingerprint               # регистрирует обновление отпечатка контакта
 from .views import quick_add_contact
 from .views import quick_update_contact
 from .views import get_building_plan
 from app.modules.auth_mod.decorators import login_required
+import base64
+
+# Фильтр шаблонов: байты -> base64 (для встраивания фото из LDAP в страницу)
+@bp.app_template_filter('b64encode')
+def b64encode_filter(data):
+    return base64.b64encode(data).decode('ascii') if data else ''
 
 # вывод списка серверов
 @bp.route('/servers')
@@ -90,3 +98,7 @@ bp.add_url_rule('/servers/<int:server_id>/quick-update/<string:contact_guid>',
 def get_building_plan(id):
     return views.get_building_plan(id)
 
+@bp.route('/server/<int:id>/building_plan/tiles/<string:version>/<int:level>/<int:col>/<int:row>')
+def get_building_plan_tile(id, version, level, col, row):
+    return views.get_building_plan_tile(id, version, level, col, row)
+
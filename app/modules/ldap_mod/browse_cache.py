@@ -0,0 +1,211 @@
+"""
+Общее хранилище снимков каталога LDAP для страницы выбора контактов.
+
+Страница list_ldap_contacts получает пользователей LDAP (с фото), а save_selected_contacts
+сохраняет выбранных из того же набора. Снимок между этими запросами хранится в файле SQLite,
+общем для всех процессов gunicorn, поэтому сохранение работает на любом воркере
+и каталог не копируется в память каждого процесса.
+
+- Снимок записывается по мере чтения LDAP пачками по SAVE_BATCH_SIZE пользователей,
+  а читается страницами (отсортированными по ФИО) или по выбранным GUID,
+  поэтому память процесса не зависит от размера каталога.
+- Ключ снимка — сервер + версия снимка (хеш содержимого, передается в форме). Повторное открытие
+  страницы с тем же каталогом использует уже сохраненный снимок, а не добавляет новую копию.
+- Каждый пользователь сериализуется msgspec (MessagePack) компактно, в виде массива без имен полей.
+- Общий размер ограничен LDAP_BROWSE_CACHE_MAX_BYTES: давно не использованные снимки
+  вытесняются первыми (LRU). Снимки старше LDAP_BROWSE_CACHE_TTL_SECONDS удаляются.
+  Снимок, который один больше лимита, не сохраняется (иначе он вытеснил бы сам себя).
+"""
+import hashlib
+import sqlite3
+import time
+from datetime import datetime
+from typing import Optional
+import msgspec
+from flask import current_app
+
+
+class BrowseUser(msgspec.Struct, array_like=True):
+    """Пользователь LDAP в снимке (поля как у LDAPManager.iter_users)"""
+    guid: Optional[str] = None
+    cn: Optional[str] = None
+    mail: Optional[str] = None
+    telephone: Optional[str] = None
+    mobile: Optional[str] = None
+    title: Optional[str] = None
+    department: Optional[str] = None
+    photo: Optional[bytes] = None
+    when_created: Optional[datetime] = None
+    when_changed: Optional[datetime] = None
+    usn_changed: Optional[int] = None
+
+
+SAVE_BATCH_SIZE = 500                                                                   # пользователей в одной транзакции записи снимка
+LOAD_BATCH_SIZE = 500                                                                   # GUID в одном запросе IN при чтении выбранных
+
+_encoder = msgspec.msgpack.Encoder()
+_decoder = msgspec.msgpack.Decoder(BrowseUser)
+
+
+def _connect():
+    connection = sqlite3.connect(current_app.config['LDAP_BROWSE_CACHE_PATH'], timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')                                       # чтение не блокируется записью из других процессов
+    connection.executescript(
+        'DROP TABLE IF EXISTS snapshots;'                                               # старый формат: снимок целиком в одном BLOB
+        'CREATE TABLE IF NOT EXISTS browse_snapshots ('
+        'id INTEGER PRIMARY KEY, key TEXT UNIQUE, size INTEGER NOT NULL, users INTEGER NOT NULL, '
+        'created REAL NOT NULL, last_used REAL NOT NULL);'
+        'CREATE TABLE IF NOT EXISTS browse_users ('
+        'snapshot INTEGER NOT NULL, guid TEXT NOT NULL, sort_name TEXT NOT NULL, data BLOB NOT NULL, '
+        'PRIMARY KEY (snapshot, guid));'
+        'CREATE INDEX IF NOT EXISTS ix_browse_users_order ON browse_users (snapshot, sort_name, guid);'
+    )
+    return connection
+
+
+def _delete(connection, snapshot):
+    connection.execute('DELETE FROM browse_users WHERE snapshot = ?', (snapshot,))
+    connection.execute('DELETE FROM browse_snapshots WHERE id = ?', (snapshot,))
+
+
+def _evict(connection, now):
+    """Удаляет устаревшие снимки и вытесняет давно не использованные сверх лимита размера"""
+    expired = now - current_app.config['LDAP_BROWSE_CACHE_TTL_SECONDS']
+    for (snapshot,) in connection.execute('SELECT id FROM browse_snapshots WHERE created < ?', (expired,)).fetchall():
+        _delete(connection, snapshot)
+    excess = connection.execute('SELECT COALESCE(SUM(size), 0) FROM browse_snapshots').fetchone()[0] - current_app.config['LDAP_BROWSE_CACHE_MAX_BYTES']
+    if excess <= 0:
+        return
+    for snapshot, size in connection.execute('SELECT id, size FROM browse_snapshots ORDER BY last_used').fetchall():
+        _delete(connection, snapshot)
+        excess -= size
+        if excess <= 0:
+            break
+
+
+def _write_batch(connection, snapshot, rows):
+    """Дописывает пачку пользователей в снимок. Returns: bool — снимок еще не вытеснен"""
+    with connection:
+        updated = connection.execute(
+            'UPDATE browse_snapshots SET size = size + ?, users = users + ?, last_used = ? WHERE id = ?',
+            (sum(len(row[3]) for row in rows), len(rows), time.time(), snapshot)
+        ).rowcount
+        if updated:
+            connection.executemany('INSERT OR IGNORE INTO browse_users (snapshot, guid, sort_name, data) VALUES (?, ?, ?, ?)', rows)
+    return bool(updated)
+
+
+def save_snapshot(server_id, users):
+    """
+    Сохраняет снимок пользователей LDAP сервера (если такого же снимка еще нет).
+    users — итератор (например, LDAPManager.iter_users): в памяти держится только одна пачка.
+
+    Returns:
+        str: версия снимка (передается в форме выбора контактов) или None, если снимок не сохранен
+    """
+    now = time.time()
+    max_bytes = current_app.config['LDAP_BROWSE_CACHE_MAX_BYTES']
+    size = 0
+    digest_sum = 0                                                                      # сумма хешей пользователей не зависит от порядка выдачи LDAP
+    connection = _connect()
+    try:
+        with connection:
+            snapshot = connection.execute(                                              # пока снимок пишется, ключа у него нет
+                'INSERT INTO browse_snapshots (key, size, users, created, last_used) VALUES (NULL, 0, 0, ?, ?)', (now, now)
+            ).lastrowid
+
+        rows = []
+        for user in users:
+            if not user.get('guid'):
+                continue
+            data = _encoder.encode(BrowseUser(**user))
+            digest_sum = (digest_sum + int.from_bytes(hashlib.sha256(data).digest(), 'big')) % (1 << 256)
+            rows.append((snapshot, user['guid'], (user.get('cn') or '').lower(), data))
+            size += len(data)
+            if size > max_bytes:                                                        # не поместится в кеш целиком — не сохраняем вовсе
+                current_app.logger.warning(
+                    f"Снимок каталога LDAP сервера {server_id} больше LDAP_BROWSE_CACHE_MAX_BYTES ({max_bytes} байт), не сохранен"
+                )
+                with connection:
+                    _delete(connection, snapshot)
+                return None
+            if len(rows) >= SAVE_BATCH_SIZE:
+                if not _write_batch(connection, snapshot, rows):
+                    return None
+                rows = []
+        if rows and not _write_batch(connection, snapshot, rows):
+            return None
+
+        snapshot_id = hashlib.sha256(digest_sum.to_bytes(32, 'big')).hexdigest()[:32]  # одинаковый каталог — одинаковая версия
+        key = f'{server_id}:{snapshot_id}'
+        with connection:
+            if connection.execute('SELECT 1 FROM browse_snapshots WHERE id = ?', (snapshot,)).fetchone() is None:
+                return None                                                             # вытеснен, пока писался
+            if connection.execute(
+                'UPDATE browse_snapshots SET created = ?, last_used = ? WHERE key = ?', (now, now, key)
+            ).rowcount:                                                                 # снимок уже есть — только продлеваем, копию удаляем
+                _delete(connection, snapshot)
+            else:
+                connection.execute('UPDATE browse_snapshots SET key = ? WHERE id = ?', (key, snapshot))
+            _evict(connection, now)
+        return snapshot_id
+    except BaseException:
+        with connection:
+            _delete(connection, snapshot)                                               # недописанный снимок (ошибка LDAP и т.п.)
+        raise
+    finally:
+        connection.close()
+
+
+def _find_snapshot(connection, server_id, snapshot_id):
+    """id снимка по версии (и отметка использования для LRU) или None"""
+    if not snapshot_id:
+        return None
+    key = f'{server_id}:{snapshot_id}'
+    with connection:
+        row = connection.execute('SELECT id, users FROM browse_snapshots WHERE key = ?', (key,)).fetchone()
+        if row:
+            connection.execute('UPDATE browse_snapshots SET last_used = ? WHERE id = ?', (time.time(), row[0]))
+    return row
+
+
+def load_snapshot(server_id, snapshot_id, guids):
+    """Возвращает словарь GUID -> пользователь (словарь) для guids из снимка или None, если снимка уже нет"""
+    connection = _connect()
+    try:
+        row = _find_snapshot(connection, server_id, snapshot_id)
+        if row is None:
+            return None
+        users = {}
+        guids = list(guids)
+        for start in range(0, len(guids), LOAD_BATCH_SIZE):
+            batch = guids[start:start + LOAD_BATCH_SIZE]
+            for guid, data in connection.execute(
+                f'SELECT guid, data FROM browse_users WHERE snapshot = ? AND guid IN ({",".join("?" * len(batch))})',
+                (row[0], *batch)
+            ):
+                users[guid] = msgspec.structs.asdict(_decoder.decode(data))
+        return users
+    finally:
+        connection.close()
+
+
+def load_snapshot_page(server_id, snapshot_id, page, per_page):
+    """
+    Возвращает страницу пользователей снимка, отсортированных по ФИО
+
+    Returns:
+        tuple: (список пользователей (словари), всего пользователей в снимке) или None, если снимка уже нет
+    """
+    connection = _connect()
+    try:
+        row = _find_snapshot(connection, server_id, snapshot_id)
+        if row is None:
+            return None
+        users = [msgspec.structs.asdict(_decoder.decode(data)) for (data,) in connection.execute(
+            'SELECT data FROM browse_users WHERE snapshot = ? ORDER BY sort_name, guid LIMIT ? OFFSET ?',
+            (row[0], per_page, (page - 1) * per_page)
+        )]
+        return users, row[1]
+    finally:
+        connection.close()
@@ -0,0 +1,85 @@
+"""
+Планы зданий серверов LDAP.
+
+Файл плана (ldap_server.building_plan_data) бывает большим, поэтому колонка загружается
+только при явном обращении (deferred). Для проверок «есть ли план» и для кеширования
+используются легкие колонки building_plan_hash и building_plan_size.
+
+Для SVG планов при загрузке сохраняется сжатая gzip копия (building_plan_gzip):
+текстовый SVG сжимается в разы, а сжимать его на каждый запрос не нужно.
+Большие растровые планы режутся на тайлы (см. plan_tiles).
+"""
+import gzip
+import hashlib
+from app import db
+from .models import LDAPServer
+from .plan_tiles import plan_tile_layout
+
+
+SVG_MIMETYPE = 'image/svg+xml'
+PLAN_METADATA_VERSION = 1                                                               # увеличить при изменении _plan_metadata: планы пересчитаются при запуске
+
+
+def is_svg_plan(mimetype, filename=None):
+    """План в формате SVG (по MIME-type или расширению файла)"""
+    return mimetype == SVG_MIMETYPE or bool(filename and filename.lower().endswith('.svg'))
+
+
+def _plan_metadata(data, mimetype=None, filename=None):
+    """Вычисляемые колонки плана: хеш, размер, gzip копия для SVG и размеры для тайлов"""
+    width, height, tile_size = plan_tile_layout(data, is_svg_plan(mimetype, filename))
+    if not data:
+        return {'building_plan_hash': None, 'building_plan_size': None, 'building_plan_gzip': None,
+                'building_plan_width': None, 'building_plan_height': None, 'building_plan_tile_size': None,
+                'building_plan_metadata_version': None}
+
+    compressed = None
+    if is_svg_plan(mimetype, filename):
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)                     # mtime=0: одинаковый файл — одинаковые байты
+        if len(compressed) >= len(data):                                                # сжатие не помогло — отдаем как есть
+            compressed = None
+
+    return {
+        'building_plan_hash': hashlib.sha256(data).hexdigest(),
+        'building_plan_size': len(data),
+        'building_plan_gzip': compressed,
+        'building_plan_width': width,
+        'building_plan_height': height,
+        'building_plan_tile_size': tile_size,
+        'building_plan_metadata_version': PLAN_METADATA_VERSION                         # проверен, даже если сжатой копии или размеров нет
+    }
+
+
+def set_building_plan(server, data, filename=None, mimetype=None):
+    """Сохраняет файл плана здания сервера вместе с его хешем, размером и сжатой копией"""
+    if is_svg_plan(mimetype, filename):
+        mimetype = SVG_MIMETYPE                                                         # браузер не покажет SVG в <img> с другим типом
+    server.building_plan_data = data
+    server.building_plan_filename = filename
+    server.building_plan_mimetype = mimetype
+    for name, value in _plan_metadata(data, mimetype, filename).items():
+        setattr(server, name, value)
+
+
+def rebuild_building_plan_metadata():
+    """
+    Заполняет вычисляемые колонки для планов, которые еще не проверялись текущей версией
+    (загружены до появления колонок или до изменения _plan_metadata). Тайлы строятся при первом обращении.
+    """
+    server_ids = [server_id for (server_id,) in db.session.query(LDAPServer.id).filter(
+        LDAPServer.building_plan_data.isnot(None),
+        db.or_(
+            LDAPServer.building_plan_metadata_version.is_(None),
+            LDAPServer.building_plan_metadata_version < PLAN_METADATA_VERSION
+        )
+    )]
+    for server_id in server_ids:                                                        # по одному серверу: в памяти не больше одного плана
+        data, mimetype, filename = db.session.query(
+            LDAPServer.building_plan_data, LDAPServer.building_plan_mimetype, LDAPServer.building_plan_filename
+        ).filter(LDAPServer.id == server_id).one()
+        LDAPServer.query.filter(LDAPServer.id == server_id).update(
+            _plan_metadata(data, mimetype, filename), synchronize_session=False
+        )
+        db.session.commit()
+
+    return len(server_ids)
@@ -0,0 +1,138 @@
+"""
+Пакетная запись контактов из LDAP.
+
+Синхронизация большого каталога через ORM дает по одному INSERT/UPDATE/DELETE на контакт.
+Здесь те же изменения записываются пачками:
+- INSERT ... ON CONFLICT (guid) DO UPDATE (PostgreSQL и SQLite) через executemany;
+- DELETE ... WHERE guid IN (...) пачками.
+
+Core запросы не вызывают ORM события, поэтому то, что обычно делают обработчики
+(search_text, content_hash, индекс телефонов, сброс поискового индекса в памяти), делается здесь явно.
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.modules.phonebook_mod.search import build_search_text, invalidate_search_index
+from .models import LDAPUsers, LDAPUserPhone
+from .phones import build_phone_rows
+from .photo_store import store_photos, photo_hash
+from .fingerprint import contact_fingerprint
+
+
+BULK_BATCH_SIZE = 500                                                                   # строк в одной пачке
+CONTACT_FIELDS = ('cn', 'mail', 'telephone', 'mobile', 'title', 'department')          # поля контакта из LDAP
+
+
+def user_rows(ldap_users, server_id, current_photos=None):
+    """
+    Формирует строки ldap_users из данных LDAP.
+    Фото сохраняются в хранилище сразу, но только отличающиеся от текущих (current_photos: {guid: photo_hash}).
+    """
+    current_photos = current_photos or {}
+    digests = [photo_hash(user['photo']) if user.get('photo') else None for user in ldap_users]
+    store_photos([user['photo'] for user, digest in zip(ldap_users, digests)
+                  if digest and digest != current_photos.get(user.get('guid'))])
+
+    rows = []
+    for user, digest in zip(ldap_users, digests):
+        row = {field: user.get(field) for field in CONTACT_FIELDS}
+        row['cn'] = row['cn'] or ''
+        row['guid'] = user.get('guid')
+        row['server_id'] = server_id
+        row['photo_hash'] = digest
+        row['search_text'] = build_search_text(row)
+        row['content_hash'] = contact_fingerprint(row, digest)
+        rows.append(row)
+    return rows
+
+
+def _batches(items, size=BULK_BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _upsert_statement(update_server=False):
+    """
+    INSERT ... ON CONFLICT (guid) DO UPDATE для текущей БД или None, если БД так не умеет.
+    update_server=True — существующий контакт переходит к серверу из новой строки.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(LDAPUsers)
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(LDAPUsers)
+    else:
+        return None
+    updated = CONTACT_FIELDS + ('photo_hash', 'search_text', 'content_hash')
+    if update_server:                                                                   # иначе контакт остается за своим сервером
+        updated += ('server_id',)
+    return statement.on_conflict_do_update(
+        index_elements=['guid'],
+        set_={name: statement.excluded[name] for name in updated}
+    ).returning(LDAPUsers.id, LDAPUsers.guid)                                       # порядок строк не гарантирован — сопоставляем по guid
+
+
+def _write_phones(rows_by_id):
+    """Перестраивает индекс телефонов для записанных контактов"""
+    phones = LDAPUserPhone.__table__
+    ids = list(rows_by_id)
+    db.session.execute(phones.delete().where(phones.c.user_id.in_(ids)))
+    phone_rows = []
+    for user_id, row in rows_by_id.items():
+        phone_rows.extend(build_phone_rows(user_id, row))
+    if phone_rows:
+        db.session.execute(phones.insert(), phone_rows)
+
+
+def upsert_users(rows, update_server=False):
+    """
+    Добавляет или обновляет контакты (строки из user_rows) пачками
+
+    Returns:
+        int: количество записанных контактов
+    """
+    statement = _upsert_statement(update_server)
+    written = 0
+    for batch in _batches(rows):
+        if statement is None:                                                           # другие БД — обычный путь через ORM
+            for row in batch:
+                user = LDAPUsers.query.filter_by(guid=row['guid']).first() or LDAPUsers(server_id=row['server_id'])
+                for name, value in row.items():
+                    if name != 'server_id' or update_server:
+                        setattr(user, name, value)
+                db.session.add(user)
+            written += len(batch)
+            continue
+
+        rows_by_guid = {row['guid']: row for row in batch}
+        written_ids = db.session.execute(statement, batch).all()                         # executemany с RETURNING (insertmanyvalues)
+        _write_phones({user_id: rows_by_guid[guid] for user_id, guid in written_ids})
+        written += len(batch)
+
+    if written:
+        invalidate_search_index()
+    return written
+
+
+def existing_photo_hashes(guids):
+    """Возвращает {guid: photo_hash} для уже сохраненных контактов (запросы IN пачками)"""
+    existing = {}
+    for batch in _batches(guids):
+        existing.update(db.session.query(LDAPUsers.guid, LDAPUsers.photo_hash).filter(LDAPUsers.guid.in_(batch)).all())
+    return existing
+
+
+def delete_users(server_id, guids):
+    """Удаляет контакты сервера по списку GUID пачками. Returns: int — сколько удалено"""
+    deleted = 0
+    for batch in _batches(guids):
+        ids = db.session.query(LDAPUsers.id).filter(LDAPUsers.server_id == server_id, LDAPUsers.guid.in_(batch))
+        LDAPUserPhone.query.filter(LDAPUserPhone.user_id.in_(ids)).delete(synchronize_session=False)   # в SQLite каскад по FK выключен
+        deleted += LDAPUsers.query.filter(
+            LDAPUsers.server_id == server_id,
+            LDAPUsers.guid.in_(batch)
+        ).delete(synchronize_session=False)
+
+    if deleted:
+        invalidate_search_index()
+    return deleted
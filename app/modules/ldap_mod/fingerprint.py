@@ -0,0 +1,56 @@
+"""
+Отпечаток содержимого контакта (ldap_users.content_hash).
+
+sha256 от полей контакта и хеша фотографии. Позволяет при синхронизации сравнивать
+один хеш вместо всех полей: если отпечаток записи LDAP совпадает с сохраненным,
+контакт не изменился и в БД ничего не пишется.
+
+Отпечаток считается по сохраненным значениям, поэтому обновляется автоматически
+при любой записи контакта через ORM (пакетная запись считает его сама, см. bulk.user_rows).
+"""
+import hashlib
+from app import db
+from .models import LDAPUsers
+
+
+FINGERPRINT_FIELDS = ('cn', 'mail', 'telephone', 'mobile', 'title', 'department')    # поля контакта, входящие в отпечаток
+MIGRATION_BATCH_SIZE = 500                                                              # сколько контактов обрабатываем за один проход
+
+
+def contact_fingerprint(values, photo_digest):
+    """
+    Считает отпечаток контакта
+
+    Args:
+        values: словарь (или объект) с полями FINGERPRINT_FIELDS, None и '' считаются одинаковыми
+        photo_digest: хеш фотографии (photo_store.photo_hash) или None
+    """
+    get = values.get if isinstance(values, dict) else lambda name: getattr(values, name)
+    parts = [get(field) or '' for field in FINGERPRINT_FIELDS]
+    parts.append(photo_digest or '')
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+@db.event.listens_for(LDAPUsers, 'before_insert')
+@db.event.listens_for(LDAPUsers, 'before_update')
+def _update_content_hash(mapper, connection, target):
+    target.content_hash = contact_fingerprint(target, target.photo_hash)
+
+
+def rebuild_content_hashes():
+    """Заполняет отпечатки контактов, сохраненных до их появления"""
+    updated = 0
+    while True:
+        rows = db.session.query(LDAPUsers.id, LDAPUsers.photo_hash, *(getattr(LDAPUsers, f) for f in FINGERPRINT_FIELDS)).filter(
+            LDAPUsers.content_hash.is_(None)
+        ).limit(MIGRATION_BATCH_SIZE).all()
+        if not rows:
+            break
+
+        db.session.execute(LDAPUsers.__table__.update().where(
+            LDAPUsers.__table__.c.id == db.bindparam('user_id')
+        ), [{'user_id': row.id, 'content_hash': contact_fingerprint(row, row.photo_hash)} for row in rows])
+        db.session.commit()
+        updated += len(rows)
+
+    return updated
@@ -0,0 +1,83 @@
+"""
+Обработка фотографий контактов при сохранении.
+
+Фото из LDAP (thumbnailPhoto) и загруженные администратором файлы бывают любого размера,
+а показываются кружком 60-80px. Поэтому при сохранении фото:
+- исходник уменьшается до PHOTO_MAX_SIZE по большей стороне и пережимается компактно;
+- строятся квадратные варианты фиксированных размеров PHOTO_VARIANT_SIZES для страниц.
+
+Pillow — необязательная зависимость: без нее фото сохраняются как есть и без вариантов.
+"""
+from io import BytesIO
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:                                                                     # без Pillow обработка отключена
+    Image = None
+
+
+PHOTO_MAX_SIZE = 256                                                                    # максимальная сторона сохраняемого фото, px
+PHOTO_VARIANT_SIZES = (64, 128)                                                         # квадратные варианты для страниц, px
+PHOTO_QUALITY = 80                                                                      # качество сжатия WebP/JPEG
+PIPELINE_VERSION = 1                                                                    # увеличить при изменении обработки: фото обработаются заново и получат новые URL
+
+
+def is_available():
+    """Доступна ли обработка изображений (установлен ли Pillow)"""
+    return Image is not None
+
+
+def current_version():
+    """Версия обработки, которую получают сохраняемые сейчас фото (0 — без Pillow фото сохраняются как есть)"""
+    return PIPELINE_VERSION if is_available() else 0
+
+
+def _output_format():
+    """WebP если Pillow собран с его поддержкой, иначе JPEG"""
+    if features.check('webp'):
+        return 'WEBP', 'image/webp'
+    return 'JPEG', 'image/jpeg'
+
+
+def _encode(image):
+    """Кодирует изображение в компактный формат, возвращает (байты, mimetype)"""
+    fmt, mimetype = _output_format()
+    if fmt == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if fmt == 'WEBP' and 'A' in image.getbands() else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, quality=PHOTO_QUALITY, optimize=True)
+    return buffer.getvalue(), mimetype
+
+
+def process_photo(data):
+    """
+    Уменьшает и пережимает фото, строит варианты фиксированных размеров
+
+    Returns:
+        tuple: (байты, mimetype или None, {размер: (байты, mimetype)})
+               Если Pillow нет или файл не удалось разобрать — (data, None, {})
+    """
+    if not is_available() or not data:
+        return data, None, {}
+
+    try:
+        image = Image.open(BytesIO(data))
+        image = ImageOps.exif_transpose(image)                                          # учитываем поворот камеры из EXIF
+        image.load()
+    except Exception:
+        return data, None, {}
+
+    # Основное фото: уменьшаем до PHOTO_MAX_SIZE с сохранением пропорций
+    main = image.copy()
+    main.thumbnail((PHOTO_MAX_SIZE, PHOTO_MAX_SIZE), Image.LANCZOS)
+    main_data, main_mimetype = _encode(main)
+    if len(main_data) >= len(data) and max(image.size) <= PHOTO_MAX_SIZE:             # исходник и так маленький — не раздуваем его
+        main_data, main_mimetype = data, None
+
+    # Квадратные варианты по центру (на страницах фото показывается кружком)
+    variants = {}
+    for size in PHOTO_VARIANT_SIZES:
+        variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        variants[size] = _encode(variant)
+
+    return main_data, main_mimetype, variants
@@ -1,29 +1,48 @@
-from ldap3 import Server, Connection, ALL
+from ldap3 import Server, Connection, NONE
 from ldap3.core.exceptions import LDAPBindError
-import base64 
+from ldap3.protocol.formatters.formatters import format_uuid_le, format_time
+from ldap3.utils.conv import escape_bytes
 from datetime import datetime, timezone
+import uuid
+
+
+USER_ATTRIBUTES = ['cn', 'mail', 'telephoneNumber', 'mobile', 'title', 'department', 'thumbnailPhoto', 'objectGUID', 'whenCreated', 'whenChanged', 'uSNChanged']
+DEFAULT_PAGE_SIZE = 500                                                             # записей на страницу постраничного поиска
 
 
 class LDAPManager:
-    def __init__(self, server_url, user, password, base_dn, use_ssl=False):      #создаем класс
+    def __init__(self, server_url, user, password, base_dn, use_ssl=False, page_size=DEFAULT_PAGE_SIZE, pool=None, pool_key=None, timeout=None):      #создаем класс
         self.server_url = server_url
         self.user = user
         self.password = password
         self.base_dn = base_dn
         self.use_ssl = use_ssl  # Сохраняем настройку SSL
+        self.page_size = page_size  # Размер страницы при поиске
+        self.pool = pool  # Пул соединений (ldap_pool), без него подключаемся каждый раз заново
+        self.pool_key = pool_key or (None, server_url, user, password, use_ssl)
+        self.timeout = timeout  # Таймаут подключения и ожидания ответа, сек (None — без ограничения)
         self.connection = None
+        self.needs_reset = False  # Соединение в неизвестном состоянии (ошибка или недочитанный поиск) — в пул не возвращаем
+
+    """Открывает новое привязанное соединение"""
+    def _open_connection(self):
+        # Определяем схему подключения в зависимости от SSL
+        if self.use_ssl:
+            scheme = "ldaps://"
+        else:
+            scheme = "ldap://"
+
+        server = Server(scheme +  self.server_url, get_info=NONE, connect_timeout=self.timeout)    # схему сервера не загружаем: атрибуты разбираем сами
+        return Connection(server, user=self.user, password=self.password, auto_bind=True, receive_timeout=self.timeout)
 
-    """Установить соединение с сервером LDAP."""
+    """Установить соединение с сервером LDAP (взять из пула, если он задан)."""
     def connect(self):
         try:
-            # Определяем схему подключения в зависимости от SSL
-            if self.use_ssl:
-                scheme = "ldaps://"
+            if self.pool is not None:
+                self.connection = self.pool.acquire(self.pool_key, self._open_connection)
             else:
-                scheme = "ldap://"
-
-            server = Server(scheme +  self.server_url, get_info=ALL)
-            self.connection = Connection(server, user=self.user, password=self.password, auto_bind=True)
+                self.connection = self._open_connection()
+            self.needs_reset = False
             success_message = "Соединение с LDAP установлено успешно! 😊"
             print(success_message)
             return True, success_message
@@ -66,66 +85,151 @@ class LDAPManager:
         print("Пользователь не найден. ❌")
         return None
 
+    """
+    Постранично (RFC 2696 paged results) выбирает пользователей и отдает их по одному.
+    В памяти одновременно находится только текущая страница, поэтому не упираемся
+    в лимит размера выборки на стороне сервера (в AD обычно 1000 записей).
+    """
+    def iter_users(self, attributes=USER_ATTRIBUTES, search_filter="(objectClass=person)", page_size=None):
+        if not self.connection:
+            print("Сначала нужно установить соединение! ❌")
+            return
+
+        entries = self.connection.extend.standard.paged_search(
+            self.base_dn,
+            search_filter,
+            attributes=attributes,
+            paged_size=page_size or self.page_size,
+            generator=True                                                          # следующая страница запрашивается по мере чтения
+        )
+        self.needs_reset = True                                                     # пока поиск не дочитан до конца, соединение занято им
+        for entry in entries:
+            if entry.get('type') != 'searchResEntry':                               # пропускаем ссылки (referrals)
+                continue
+            yield self._entry_to_user(entry.get('raw_attributes', {}))
+        self.needs_reset = False
+
+    """
+    Постранично выбирает только GUID пользователей (для сверки удаленных записей).
+    Запрашивается единственный атрибут objectGUID, поэтому фото и остальные данные не передаются.
+    """
+    def iter_guids(self, search_filter="(objectClass=person)", page_size=None):
+        if not self.connection:
+            print("Сначала нужно установить соединение! ❌")
+            return
+
+        entries = self.connection.extend.standard.paged_search(
+            self.base_dn,
+            search_filter,
+            attributes=['objectGUID'],
+            paged_size=page_size or self.page_size,
+            generator=True
+        )
+        self.needs_reset = True
+        for entry in entries:
+            if entry.get('type') != 'searchResEntry':
+                continue
+            values = entry.get('raw_attributes', {}).get('objectGUID')
+            if values:
+                yield format_uuid_le(values[0])
+        self.needs_reset = False
+
     """Получить всех пользователей с указанными атрибутами"""
-    def get_all_users(self, attributes=['cn', 'mail', 'telephoneNumber', 'mobile', 'title', 'department', 'thumbnailPhoto', 'objectGUID', 'whenCreated', 'whenChanged'], search_filter="(objectClass=person)"):
-    
+    def get_all_users(self, attributes=USER_ATTRIBUTES, search_filter="(objectClass=person)"):
+        return list(self.iter_users(attributes=attributes, search_filter=search_filter))
+
+    """Преобразует сырые атрибуты записи LDAP в словарь пользователя"""
+    @staticmethod
+    def _entry_to_user(raw):
+        def first(name):                                                            # первое значение атрибута (байты) или None
+            values = raw.get(name)
+            return values[0] if values else None
+
+        def text(name):
+            value = first(name)
+            return value.decode('utf-8', errors='replace') if value is not None else None
+
+        def timestamp(name):                                                        # generalizedTime -> naive datetime в UTC
+            value = first(name)
+            if value is None:
+                return None
+            value = format_time(value)
+            if not isinstance(value, datetime):                                     # не удалось разобрать
+                return None
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value
+
+        guid = first('objectGUID')
+        usn = first('uSNChanged')
+        return {
+            'guid': format_uuid_le(guid) if guid else None,                         # GUID в строковом формате {xxxxxxxx-...}
+            'cn': text('cn'),
+            'mail': text('mail'),
+            'telephone': text('telephoneNumber'),
+            'mobile': text('mobile'),
+            'title': text('title'),                                                 # Должность
+            'department': text('department'),                                       # Отдел
+            'photo': first('thumbnailPhoto') or None,                               # Фото (байты)
+            'when_created': timestamp('whenCreated'),
+            'when_changed': timestamp('whenChanged'),
+            'usn_changed': int(usn) if usn and usn.isdigit() else None              # номер изменения (только AD)
+        }
+
+    """Оборачивает фильтр в скобки, если их нет (для объединения через &)"""
+    @staticmethod
+    def _parenthesize(search_filter):
+        return search_filter if search_filter.startswith('(') else f"({search_filter})"
+
+    """
+    Добавляет к фильтру поиска условие «изменен после последней синхронизации».
+    Предпочтительно по uSNChanged (монотонный счетчик изменений AD), иначе по whenChanged.
+    """
+    @staticmethod
+    def changes_filter(search_filter, last_usn=None, since=None):
+        search_filter = LDAPManager._parenthesize(search_filter)
+        if last_usn is not None:
+            return f"(&{search_filter}(uSNChanged>={last_usn + 1}))"
+        if since is not None:
+            return f"(&{search_filter}(whenChanged>={since.strftime('%Y%m%d%H%M%S')}.0Z))"   # since — naive UTC
+        return search_filter
+
+
+    """
+    Находит пользователя по GUID одним запросом.
+    GUID в строковом формате {xxxxxxxx-...} переводится в байты objectGUID (little-endian, как хранит AD)
+    и экранируется для фильтра. Дополнительно можно ограничить поиск фильтром сервера.
+    """
+    def get_user_by_guid(self, guid, attributes=USER_ATTRIBUTES, search_filter=None):
         if not self.connection:
             print("Сначала нужно установить соединение! ❌")
-            return []
-        
-        self.connection.search(self.base_dn, search_filter, attributes=attributes)
-        
-        users = []
-        for entry in self.connection.entries:
-            # Получаем фото в base64 если оно есть
-            photo_base64 = None
-            if 'thumbnailPhoto' in entry and entry.thumbnailPhoto.value:
-                photo_base64 = base64.b64encode(entry.thumbnailPhoto.value).decode('utf-8')
-
-            # Конвертируем GUID из бинарного в строковый формат
-            guid_str = None
-            if 'objectGUID' in entry and entry.objectGUID.value:
-                guid_str = entry.objectGUID.value
-
-            # Получаем и преобразуем временные метки к naive datetime
-            when_created = None
-            when_changed = None
-            
-            if 'whenCreated' in entry and entry.whenCreated.value:                  # Проверяем, существует ли атрибут `whenCreated` в записи и оно не пустое
-                when_created = entry.whenCreated.value                              # Получаем значение временной метки из LDAP
-                if when_created.tzinfo is not None:                                 # Проверяем, имеет ли datetime временную зону
-                    when_created = when_created.astimezone(timezone.utc).replace(tzinfo=None)               # Преобразуем к naive удаляет информацию о временной зоне
-            
-            if 'whenChanged' in entry and entry.whenChanged.value:                  # Проверяем, существует ли атрибут `whenChanged` в записи и оно не пустое
-                when_changed = entry.whenChanged.value                              # Получаем значение временной метки из LDAP
-                if when_changed.tzinfo is not None:                                 # Проверяем, имеет ли datetime временную зону
-                    when_changed = when_changed.astimezone(timezone.utc).replace(tzinfo=None)                # Преобразуем к naive удаляет информацию о временной зоне
-
-            user_data = {
-                'guid': guid_str,  # Добавляем GUID
-                'cn': entry.cn.value if 'cn' in entry else None,
-                'mail': entry.mail.value if 'mail' in entry else None,
-                'telephone': entry.telephoneNumber.value if 'telephoneNumber' in entry else None,
-                'mobile': entry.mobile.value if 'mobile' in entry else None,
-                'title': entry.title.value if 'title' in entry else None,  # Должность
-                'department': entry.department.value if 'department' in entry else None,  # Отдел
-                'photo': photo_base64,  # Фото в base64
-                'when_created': when_created,
-                'when_changed': when_changed
-            }
-            users.append(user_data)
-        return users
-
-
-    """Находит пользователя по GUID"""
-    def get_user_by_guid(self, guid):        
-        search_filter = f"(objectGUID={guid})"
-        users = self.get_all_users(search_filter)
-        return users[0] if users else None
-
-
-    """Закрыть соединение с сервером LDAP."""
-    def disconnect(self):
+            return None
+        try:
+            guid_filter = f"(objectGUID={escape_bytes(uuid.UUID(guid).bytes_le)})"
+        except (TypeError, ValueError):                                             # некорректный GUID
+            return None
+        if search_filter:
+            guid_filter = f"(&{self._parenthesize(search_filter)}{guid_filter})"
+
+        self.needs_reset = True
+        self.connection.search(self.base_dn, guid_filter, attributes=attributes, size_limit=1)
+        self.needs_reset = False
+        for entry in self.connection.response or []:
+            if entry.get('type') == 'searchResEntry':
+                return self._entry_to_user(entry.get('raw_attributes', {}))
+        return None
+
+
+    """
+    Закрыть соединение с сервером LDAP (или вернуть его в пул).
+    discard=True — после ошибки: соединение закрывается, а не возвращается в пул.
+    Соединение после ошибки LDAP или с недочитанным поиском (needs_reset) закрывается всегда.
+    """
+    def disconnect(self, discard=False):
         if self.connection:
-            self.connection.unbind()
-            print("Соединение с LDAP закрыто. 👋")
\ No newline at end of file
+            if self.pool is not None:
+                self.pool.release(self.pool_key, self.connection, discard=discard or self.needs_reset)
+            else:
+                self.connection.unbind()
+                print("Соединение с LDAP закрыто. 👋")
+            self.connection = None
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Пул соединений с LDAP серверами.
+
+Открытие соединения — это TCP (и часто TLS) рукопожатие плюс bind, поэтому вместо
+подключения на каждый запрос LDAPManager берет уже привязанное соединение из пула
+и возвращает его обратно после работы.
+
+- Соединения группируются по ключу: id сервера + адрес + учетные данные, поэтому после
+  изменения настроек сервера старые соединения просто перестают использоваться.
+- Одно соединение в каждый момент отдается только одному потоку (гринлету).
+- Соединение, пролежавшее без дела дольше HEALTH_CHECK_AFTER, перед выдачей проверяется
+  чтением RootDSE; мертвые соединения закрываются и заменяются новыми.
+- Простаивающие дольше idle_timeout соединения закрываются.
+- Одновременно открыто не больше max_size соединений на ключ, остальные ждут освобождения.
+"""
+import threading
+import time
+from ldap3 import BASE
+
+
+HEALTH_CHECK_AFTER = 30                                                                 # секунд простоя, после которых соединение проверяется перед выдачей
+ACQUIRE_TIMEOUT = 60                                                                    # сколько ждать свободного соединения, секунд
+
+
+class LDAPConnectionPool:
+    """Потокобезопасный пул привязанных соединений ldap3"""
+
+    def __init__(self, max_size=4, idle_timeout=300):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = {}                                                                 # ключ -> [(соединение, время освобождения)]
+        self._in_use = {}                                                               # ключ -> количество выданных соединений
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.unbind()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(connection):
+        """Проверяет соединение чтением RootDSE"""
+        if connection.closed or not connection.bound:
+            return False
+        try:
+            return connection.search('', '(objectClass=*)', search_scope=BASE, attributes=['1.1'])
+        except Exception:
+            return False
+
+    def _evict_idle(self, now):
+        """Закрывает соединения, простаивающие дольше idle_timeout (вызывается под блокировкой)"""
+        expired = []
+        for key, idle in self._idle.items():
+            alive = [(conn, released) for conn, released in idle if now - released < self.idle_timeout]
+            expired.extend(conn for conn, released in idle if now - released >= self.idle_timeout)
+            self._idle[key] = alive
+        return expired
+
+    def acquire(self, key, factory):
+        """
+        Выдает соединение для ключа: свободное из пула или новое, созданное factory()
+
+        Raises:
+            TimeoutError: если все max_size соединений заняты дольше ACQUIRE_TIMEOUT
+            исключения factory(): ошибки подключения и привязки
+        """
+        deadline = time.monotonic() + ACQUIRE_TIMEOUT
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                expired = self._evict_idle(now)
+                idle = self._idle.get(key)
+                if idle:
+                    connection, released = idle.pop()                                   # последнее освобожденное — самое «теплое»
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    break
+                if self._in_use.get(key, 0) < self.max_size:
+                    connection, released = None, None
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    break
+                if not self._condition.wait(deadline - now) and time.monotonic() >= deadline:
+                    raise TimeoutError('Нет свободных соединений с LDAP сервером')
+
+        for conn in expired:                                                            # сетевые операции — вне блокировки
+            self._close(conn)
+
+        try:
+            if connection is not None and (now - released < HEALTH_CHECK_AFTER or self._is_alive(connection)):
+                return connection
+            if connection is not None:
+                self._close(connection)
+            return factory()
+        except Exception:
+            self._forget(key)
+            raise
+
+    def release(self, key, connection, discard=False):
+        """Возвращает соединение в пул (discard=True — закрыть, например после ошибки)"""
+        keep = not discard and not connection.closed and connection.bound
+        with self._condition:
+            self._forget(key, notify=False)
+            if keep:
+                self._idle.setdefault(key, []).append((connection, time.monotonic()))
+            self._condition.notify()
+        if not keep:
+            self._close(connection)
+
+    def _forget(self, key, notify=True):
+        with self._condition:
+            self._in_use[key] = max(self._in_use.get(key, 0) - 1, 0)
+            if notify:
+                self._condition.notify()
+
+    def discard(self, server_id):
+        """Закрывает свободные соединения сервера (после изменения или удаления его настроек)"""
+        with self._condition:
+            keys = [key for key in self._idle if key[0] == server_id]
+            connections = [conn for key in keys for conn, _ in self._idle.pop(key)]
+        for connection in connections:
+            self._close(connection)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Возвращает общий для процесса пул (создается при первом обращении по настройкам приложения)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from flask import current_app
+            _pool = LDAPConnectionPool(
+                max_size=current_app.config['LDAP_POOL_MAX_SIZE'],
+                idle_timeout=current_app.config['LDAP_POOL_IDLE_SECONDS']
+            )
+        return _pool
+
+
+def discard_server_connections(server_id):
+    """Закрывает соединения сервера, если пул уже создан"""
+    if _pool is not None:
+        _pool.discard(server_id)
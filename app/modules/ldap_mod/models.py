@@ -28,17 +28,46 @@ class LDAPServer(db.Model):
     smtp_is_active = db.Column(db.Boolean, default=False)                           # Активны ли SMTP настройки
     notify_on_add = db.Column(db.Boolean, default=False)                            # Уведомлять о новых контактах
     notify_on_update = db.Column(db.Boolean, default=False)                         # Уведомлять об изменениях контактов
+    # Инкрементальная синхронизация
+    last_usn = db.Column(db.BigInteger)                                             # Наибольший uSNChanged, полученный при синхронизации
+    last_full_sync = db.Column(db.DateTime)                                         # Время последнего полного прохода
+    # Состояние планировщика синхронизации (см. sync_state)
+    sync_started_at = db.Column(db.DateTime)                                        # Блокировка: время начала текущей синхронизации
+    sync_failures = db.Column(db.Integer, default=0)                                # Ошибок синхронизации подряд
+    sync_next_run = db.Column(db.DateTime)                                          # Не синхронизировать раньше (задержка после ошибок)
 
     # НОВЫЕ ПОЛЯ ДЛЯ ПЛАНА ЗДАНИЯ В БД
-    building_plan_data = db.Column(db.LargeBinary)                                  # Данные файла
+    building_plan_data = db.deferred(db.Column(db.LargeBinary))                     # Данные файла (загружаются только при обращении)
     building_plan_filename = db.Column(db.String(255))                              # Оригинальное имя файла
     building_plan_mimetype = db.Column(db.String(100))                              # MIME-type (image/svg+xml, image/png, etc.)
+    building_plan_hash = db.Column(db.String(64))                                   # sha256 содержимого плана (пусто — плана нет)
+    building_plan_size = db.Column(db.Integer)                                      # Размер файла плана в байтах
+    building_plan_gzip = db.deferred(db.Column(db.LargeBinary))                     # Заранее сжатая gzip копия (только для SVG)
+    building_plan_width = db.Column(db.Integer)                                     # Размеры растрового плана, px
+    building_plan_height = db.Column(db.Integer)
+    building_plan_tile_size = db.Column(db.Integer)                                 # Сторона тайла пирамиды (пусто — план не режется, см. plan_tiles)
+    building_plan_metadata_version = db.Column(db.Integer)                          # С какой версией заполнены колонки выше (пусто — еще не проверялся)
 
     
 
     def __repr__(self):
         return f'<LDAPServer {self.name}>'
 
+    @property
+    def has_building_plan(self):
+        """Загружен ли план здания (проверяется без чтения самого файла)"""
+        return bool(self.building_plan_hash)
+
+    @property
+    def has_plan_tiles(self):
+        """Показывается ли план тайлами (большой растровый план)"""
+        return self.has_building_plan and bool(self.building_plan_tile_size)
+
+    @property
+    def building_plan_version(self):
+        """Версия плана для адреса файла (?v=...): новый файл — новый адрес"""
+        return self.building_plan_hash[:16] if self.building_plan_hash else None
+
     def get_smtp_config(self):
         """Возвращает конфигурацию SMTP в виде словаря"""
         if not self.smtp_is_active:
@@ -55,6 +84,34 @@ class LDAPServer(db.Model):
         }
 
 
+class ContactPhoto(db.Model):
+    """Хранилище фотографий контактов: сырые байты изображения, адресуемые хешем содержимого"""
+    __tablename__ = 'contact_photos'
+
+    hash = db.Column(db.String(64), primary_key=True)                               # sha256 содержимого (одинаковые фото хранятся один раз)
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))                   # Байты изображения (загружаются только при обращении)
+    mimetype = db.Column(db.String(100), default='image/jpeg')                      # MIME-type изображения
+    size = db.Column(db.Integer)                                                    # Размер в байтах
+    pipeline_version = db.Column(db.Integer, default=0)                             # Версия image_pipeline, которой обработано фото (0 — сохранено как есть)
+
+    def __repr__(self):
+        return f'<ContactPhoto {self.hash[:12]} ({self.size} bytes)>'
+
+
+class ContactPhotoVariant(db.Model):
+    """Уменьшенные копии фотографии фиксированных размеров (см. image_pipeline.py)"""
+    __tablename__ = 'contact_photo_variants'
+
+    photo_hash = db.Column(db.String(64), db.ForeignKey('contact_photos.hash', ondelete='CASCADE'), primary_key=True)  # Исходная фотография
+    px = db.Column(db.Integer, primary_key=True)                                    # Сторона квадрата в пикселях
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))                   # Байты изображения
+    mimetype = db.Column(db.String(100))                                            # MIME-type (image/webp или image/jpeg)
+    size = db.Column(db.Integer)                                                    # Размер в байтах
+
+    def __repr__(self):
+        return f'<ContactPhotoVariant {self.photo_hash[:12]} {self.px}px>'
+
+
 class LDAPUsers(db.Model):
     """Модель для хранения пользователей, импортированных из LDAP"""
     __tablename__ = 'ldap_users'                                                    # Указываем имя таблицы в БД (необязательно, но рекомендуется)
@@ -68,15 +125,66 @@ class LDAPUsers(db.Model):
     mobile = db.Column(db.String(32))                                               # Мобильный телефон пользователя
     title = db.Column(db.String(128))                                               # Должность пользователя
     department = db.Column(db.String(128))                                          # Отдел/подразделение пользователя
-    photo = db.Column(db.Text)                                                      # Фотография пользователя в формате base64
+    photo_hash = db.Column(db.String(64), db.ForeignKey('contact_photos.hash'), index=True)  # Фотография: sha256 содержимого в хранилище contact_photos
+    legacy_photo = db.deferred(db.Column('photo', db.Text))                        # Старое хранение фото в base64 (только для переноса в contact_photos)
     server = db.relationship('LDAPServer', backref=db.backref('users', lazy=True))  # Связь с моделью LDAPServer (один ко многим) # backref создает свойство 'users' в LDAPServer для доступа к связанным пользователям
     
     # НОВЫЕ ПОЛЯ ДЛЯ КАРТЫ
     coordinates = db.Column(db.String(100))                                         # Формат: "x,y" например "120,45"
     is_on_map = db.Column(db.Boolean, default=False)                                # Отображать на карте
+    map_x = db.Column(db.Float)                                                     # Координаты в числовом виде (из coordinates, см. map_mod/spatial.py)
+    map_y = db.Column(db.Float)
 
+    # ПОИСК
+    search_text = db.Column(db.Text)                                                # Нормализованная строка для поиска (см. phonebook_mod/search.py)
+    content_hash = db.Column(db.String(64))                                         # Отпечаток полей и фото для синхронизации (см. fingerprint.py)
+
+    __table_args__ = (
+        db.Index('ix_ldap_users_search_text_trgm', 'search_text',                   # Триграммный индекс для LIKE '%...%' (только PostgreSQL, pg_trgm)
+                 postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_ldap_users_server_id_cn', 'server_id', 'cn'),                  # Контакты сервера (синхронизация, списки, карта) с сортировкой по имени
+        db.Index('ix_ldap_users_cn_id', 'cn', 'id'),                                # Телефонная книга: сортировка и keyset пагинация по (cn, id)
+        db.Index('ix_ldap_users_on_map', 'server_id',                               # Частичный индекс: только размещенные на карте
+                 postgresql_where=(is_on_map == True), sqlite_where=(is_on_map == True)),  # условие в той же форме, что и в запросах filter_by(is_on_map=True)
+        db.Index('ix_ldap_users_map_xy', 'server_id', 'map_x', 'map_y'),           # Карта: выборка размещенных в прямоугольнике (видимая область, поиск соседей)
+    )
+
+
+    @property
+    def has_photo(self):
+        """Есть ли у пользователя фотография"""
+        return self.photo_hash is not None
 
     def __repr__(self):
         """Строковое представление объекта (для отладки)"""
         return f'<LDAPUser {self.cn} (ID: {self.id})>'
 
+
+class LDAPUserPhone(db.Model):
+    """Нормализованные номера телефонов контактов для обратного поиска по номеру (caller ID)"""
+    __tablename__ = 'ldap_user_phones'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('ldap_users.id', ondelete='CASCADE'), nullable=False, index=True)  # Контакт
+    kind = db.Column(db.String(16), nullable=False)                                 # Поле контакта: telephone / mobile
+    digits = db.Column(db.String(32), nullable=False, index=True)                   # Номер только из цифр (точное совпадение)
+    digits_reversed = db.Column(db.String(32), nullable=False)                      # Номер задом наперед (поиск по последним N цифрам)
+
+    __table_args__ = (
+        db.Index('ix_ldap_user_phones_digits_reversed', 'digits_reversed',          # LIKE 'prefix%' по B-tree индексу в PostgreSQL
+                 postgresql_ops={'digits_reversed': 'varchar_pattern_ops'}),
+    )
+
+    def __repr__(self):
+        return f'<LDAPUserPhone {self.digits} (user: {self.user_id})>'
+
+
+class ContactsVersion(db.Model):
+    """Счетчик изменений контактов (одна строка): версия данных для кеша телефонной книги, общая для всех процессов"""
+    __tablename__ = 'contacts_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)                  # Увеличивается при каждом изменении контактов
+
+    def __repr__(self):
+        return f'<ContactsVersion {self.version}>'
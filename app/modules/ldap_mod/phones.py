@@ -0,0 +1,137 @@
+"""
+Индекс телефонных номеров контактов для обратного поиска по номеру звонящего.
+
+Номера из полей telephone и mobile приводятся к виду «только цифры» и хранятся
+в таблице ldap_user_phones. Таблица обновляется автоматически при любой записи
+контакта через ORM, поэтому синхронизация, сохранение из LDAP и ручное
+редактирование не требуют отдельных вызовов.
+"""
+from sqlalchemy import inspect as sa_inspect
+from app import db
+from .models import LDAPUsers, LDAPUserPhone, LDAPServer
+
+
+PHONE_FIELDS = ('telephone', 'mobile')                                                  # поля контакта с номерами
+MIN_SUFFIX_DIGITS = 4                                                                   # минимальная длина поиска по окончанию номера
+LOOKUP_RESULTS_LIMIT = 20                                                               # максимум совпадений в ответе
+
+
+def normalize_phone(value):
+    """
+    Оставляет в номере только цифры.
+    Российский междугородний префикс 8 в 11-значном номере заменяется на 7: 8 (383) 123-45-67 -> 73831234567
+    """
+    if not value:
+        return ''
+    digits = ''.join(ch for ch in value if ch.isdigit())
+    if len(digits) == 11 and digits.startswith('8'):
+        digits = '7' + digits[1:]
+    return digits
+
+
+def build_phone_rows(user_id, values):
+    """Формирует строки для ldap_user_phones из словаря значений полей контакта"""
+    rows = []
+    for kind in PHONE_FIELDS:
+        digits = normalize_phone(values.get(kind))
+        if digits:
+            rows.append({
+                'user_id': user_id,
+                'kind': kind,
+                'digits': digits,
+                'digits_reversed': digits[::-1]
+            })
+    return rows
+
+
+def _write_user_phones(connection, target):
+    phones = LDAPUserPhone.__table__
+    connection.execute(phones.delete().where(phones.c.user_id == target.id))
+    rows = build_phone_rows(target.id, {kind: getattr(target, kind) for kind in PHONE_FIELDS})
+    if rows:
+        connection.execute(phones.insert(), rows)
+
+
+# Поддерживаем индекс номеров при записи контакта (в той же транзакции, что и сам контакт)
+@db.event.listens_for(LDAPUsers, 'after_insert')
+def _phones_after_insert(mapper, connection, target):
+    _write_user_phones(connection, target)
+
+
+@db.event.listens_for(LDAPUsers, 'after_update')
+def _phones_after_update(mapper, connection, target):
+    state = sa_inspect(target)
+    if any(state.attrs[kind].history.has_changes() for kind in PHONE_FIELDS):         # перестраиваем только если изменились номера
+        _write_user_phones(connection, target)
+
+
+@db.event.listens_for(LDAPUsers, 'after_delete')
+def _phones_after_delete(mapper, connection, target):
+    phones = LDAPUserPhone.__table__
+    connection.execute(phones.delete().where(phones.c.user_id == target.id))
+
+
+def rebuild_phone_index():
+    """Заполняет индекс номеров для контактов, сохраненных до его появления"""
+    indexed = db.session.query(LDAPUserPhone.user_id)
+    users = db.session.query(LDAPUsers.id, LDAPUsers.telephone, LDAPUsers.mobile).filter(
+        (LDAPUsers.telephone.isnot(None)) | (LDAPUsers.mobile.isnot(None)),
+        LDAPUsers.id.notin_(indexed)
+    ).all()
+
+    rows = []
+    for user in users:
+        rows.extend(build_phone_rows(user.id, {'telephone': user.telephone, 'mobile': user.mobile}))
+    if rows:
+        db.session.execute(LDAPUserPhone.__table__.insert(), rows)
+        db.session.commit()
+    return len(rows)
+
+
+def _reversed_prefix_condition(prefix):
+    """
+    Условие «digits_reversed начинается с prefix», которое обслуживается индексом:
+    в PostgreSQL — LIKE 'prefix%' (индекс varchar_pattern_ops), в остальных БД — диапазон
+    [prefix, следующий за prefix), т.к. SQLite не использует индекс для LIKE с параметром
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return LDAPUserPhone.digits_reversed.startswith(prefix, autoescape=True)
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)                                      # в номере только цифры: '12' -> '13'
+    return (LDAPUserPhone.digits_reversed >= prefix) & (LDAPUserPhone.digits_reversed < upper)
+
+
+def lookup_by_phone(number, suffix_digits=None, limit=LOOKUP_RESULTS_LIMIT):
+    """
+    Находит контакты по номеру телефона.
+
+    Args:
+        number: номер в любом формате
+        suffix_digits: если указано — сравниваются только последние N цифр номера,
+                       иначе ищется точное совпадение нормализованного номера
+
+    Returns:
+        list: строки (id, cn, title, department, telephone, mobile, organization, kind, digits)
+    """
+    digits = normalize_phone(number)
+    if not digits or (suffix_digits and len(digits) < suffix_digits):                  # в номере меньше цифр, чем нужно сравнить
+        return []
+
+    query = db.session.query(
+        LDAPUsers.id,
+        LDAPUsers.cn,
+        LDAPUsers.title,
+        LDAPUsers.department,
+        LDAPUsers.telephone,
+        LDAPUsers.mobile,
+        LDAPServer.name.label('organization'),
+        LDAPUserPhone.kind,
+        LDAPUserPhone.digits
+    ).join(LDAPUsers, LDAPUsers.id == LDAPUserPhone.user_id
+    ).outerjoin(LDAPServer, LDAPServer.id == LDAPUsers.server_id)
+
+    if suffix_digits:
+        query = query.filter(_reversed_prefix_condition(digits[-suffix_digits:][::-1]))
+    else:
+        query = query.filter(LDAPUserPhone.digits == digits)
+
+    return query.order_by(LDAPUsers.cn, LDAPUsers.id).limit(limit).all()
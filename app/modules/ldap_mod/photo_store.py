@@ -0,0 +1,249 @@
+"""
+Хранилище фотографий контактов.
+
+Фото хранятся сырыми байтами в таблице contact_photos и адресуются sha256 исходного файла,
+поэтому одинаковые фотографии сохраняются один раз, а в ldap_users остается только хеш.
+При первом сохранении фото проходит через image_pipeline: уменьшается, пережимается
+и получает варианты фиксированных размеров (contact_photo_variants).
+
+Хеш исходника нужен только для дедупликации: сохраненные байты зависят еще и от версии
+обработки (pipeline_version), поэтому URL фото содержит и хеш, и версию.
+"""
+import base64
+import hashlib
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from flask import current_app
+from .models import ContactPhoto, ContactPhotoVariant, LDAPUsers
+from .image_pipeline import process_photo, current_version as pipeline_version
+
+
+MIGRATION_BATCH_SIZE = 200                                                              # сколько контактов переносим за один проход
+
+
+def photo_hash(data):
+    """Возвращает хеш содержимого фотографии"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def guess_image_mimetype(data):
+    """Определяет MIME-type изображения по сигнатуре файла"""
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data.startswith(b'GIF8'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'                                                                 # thumbnailPhoto в AD почти всегда JPEG
+
+
+def decode_photo(photo_base64):
+    """Декодирует фото из base64 (старый формат хранения)"""
+    if not photo_base64:
+        return None
+    return base64.b64decode(photo_base64)
+
+
+def _insert_ignore_existing(model, values, index_elements):
+    """INSERT ... ON CONFLICT DO NOTHING (повторная запись того же ключа ничего не делает)"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(model).values(**values).on_conflict_do_nothing(index_elements=index_elements)
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(model).values(**values).on_conflict_do_nothing(index_elements=index_elements)
+    else:
+        key = {name: values[name] for name in index_elements}
+        if db.session.query(model).filter_by(**key).first():
+            return
+        statement = model.__table__.insert().values(**values)
+    db.session.execute(statement)
+
+
+def _store_variants(digest, variants):
+    """Сохраняет уменьшенные варианты фото"""
+    for px, (data, mimetype) in variants.items():
+        _insert_ignore_existing(ContactPhotoVariant, {
+            'photo_hash': digest,
+            'px': px,
+            'data': data,
+            'mimetype': mimetype,
+            'size': len(data)
+        }, ['photo_hash', 'px'])
+
+
+def _save_new_photo(digest, data, mimetype=None):
+    """Обрабатывает и сохраняет фото, которого еще нет в хранилище"""
+    stored_data, stored_mimetype, variants = process_photo(data)
+    _insert_ignore_existing(ContactPhoto, {
+        'hash': digest,
+        'data': stored_data,
+        'mimetype': stored_mimetype or mimetype or guess_image_mimetype(stored_data),
+        'size': len(stored_data),
+        'pipeline_version': pipeline_version()
+    }, ['hash'])
+    _store_variants(digest, variants)
+
+
+def store_photo(data, mimetype=None):
+    """
+    Сохраняет фотографию в хранилище (если такой еще нет)
+
+    Returns:
+        str: хеш фотографии или None если данных нет
+    """
+    if not data:
+        return None
+
+    digest = photo_hash(data)
+    if db.session.query(ContactPhoto.hash).filter(ContactPhoto.hash == digest).first():    # такое фото уже есть — не обрабатываем повторно
+        return digest
+
+    _save_new_photo(digest, data, mimetype)
+    return digest
+
+
+def store_photos(photos):
+    """
+    Пакетный вариант store_photo: уже сохраненные фото ищутся одним IN запросом на пачку,
+    одинаковые фото обрабатываются один раз
+
+    Returns:
+        dict: хеш -> данные для всех непустых фото
+    """
+    pending = {photo_hash(data): data for data in photos if data}
+    digests = list(pending)
+    for start in range(0, len(digests), MIGRATION_BATCH_SIZE):
+        batch = digests[start:start + MIGRATION_BATCH_SIZE]
+        existing = {digest for (digest,) in db.session.query(ContactPhoto.hash).filter(ContactPhoto.hash.in_(batch))}
+        for digest in batch:
+            if digest not in existing:
+                _save_new_photo(digest, pending[digest])
+    return pending
+
+
+def set_user_photo(user, data, mimetype=None):
+    """Устанавливает (или удаляет при data=None) фотографию контакта"""
+    user.photo_hash = store_photo(data, mimetype)
+
+
+def get_photo(digest, px=None):
+    """
+    Возвращает (байты, mimetype, версия обработки) фотографии по хешу или None.
+    Если запрошен размер px и такой вариант есть — возвращается он, иначе основное фото.
+    """
+    if px:
+        row = db.session.query(ContactPhotoVariant.data, ContactPhotoVariant.mimetype, ContactPhoto.pipeline_version).join(
+            ContactPhoto, ContactPhoto.hash == ContactPhotoVariant.photo_hash
+        ).filter(
+            ContactPhotoVariant.photo_hash == digest,
+            ContactPhotoVariant.px == px
+        ).first()
+        if row:
+            return row.data, row.mimetype, row.pipeline_version or 0
+
+    row = db.session.query(ContactPhoto.data, ContactPhoto.mimetype, ContactPhoto.pipeline_version).filter(
+        ContactPhoto.hash == digest
+    ).first()
+    return (row.data, row.mimetype, row.pipeline_version or 0) if row else None
+
+
+def delete_orphan_photos(hashes):
+    """
+    Удаляет фотографии из hashes (и их варианты), на которые больше не ссылается ни один контакт.
+
+    Проверяются только переданные хеши (фото, которые контакты текущей транзакции заменили или удалили),
+    а не все хранилище. Вызывается в той же транзакции, что и запись контактов: строки кандидатов
+    блокируются (SELECT ... FOR UPDATE), поэтому параллельная запись контакта с тем же фото
+    (проверка FK блокирует ту же строку) не разойдется с проверкой ссылок.
+
+    Returns:
+        int: сколько фото удалено
+    """
+    candidates = sorted({digest for digest in hashes if digest})
+    deleted = 0
+    for start in range(0, len(candidates), MIGRATION_BATCH_SIZE):
+        batch = candidates[start:start + MIGRATION_BATCH_SIZE]
+        locked = {digest for (digest,) in db.session.query(ContactPhoto.hash).filter(
+            ContactPhoto.hash.in_(batch)
+        ).with_for_update()}
+        used = {digest for (digest,) in db.session.query(LDAPUsers.photo_hash).filter(
+            LDAPUsers.photo_hash.in_(batch)
+        ).distinct()}
+        orphans = sorted(locked - used)
+        if not orphans:
+            continue
+        ContactPhotoVariant.query.filter(ContactPhotoVariant.photo_hash.in_(orphans)).delete(synchronize_session=False)
+        deleted += ContactPhoto.query.filter(ContactPhoto.hash.in_(orphans)).delete(synchronize_session=False)
+    return deleted
+
+
+def build_missing_variants():
+    """
+    Прогоняет через image_pipeline фото, обработанные более старой версией или
+    сохраненные без обработки (до ее появления или без установленного Pillow).
+    Исходник не хранится, поэтому повторная обработка идет от сохраненных байтов.
+    Фото получает текущую версию, а с ней и новый URL.
+
+    Returns:
+        tuple: (обработано фото, байт до, байт после)
+    """
+    version = pipeline_version()
+    if not version:
+        return 0, 0, 0
+
+    processed = bytes_before = bytes_after = 0
+    while True:
+        photos = ContactPhoto.query.options(db.undefer(ContactPhoto.data)).filter(
+            db.or_(ContactPhoto.pipeline_version.is_(None), ContactPhoto.pipeline_version < version)
+        ).limit(MIGRATION_BATCH_SIZE).all()
+        if not photos:
+            break
+
+        ContactPhotoVariant.query.filter(                                               # варианты прошлой версии строим заново
+            ContactPhotoVariant.photo_hash.in_([photo.hash for photo in photos])
+        ).delete(synchronize_session=False)
+        for photo in photos:
+            stored_data, stored_mimetype, variants = process_photo(photo.data)
+            bytes_before += len(photo.data)
+            photo.data = stored_data
+            photo.mimetype = stored_mimetype or photo.mimetype
+            photo.size = len(stored_data)
+            photo.pipeline_version = version
+            bytes_after += photo.size
+            _store_variants(photo.hash, variants)
+        db.session.commit()
+        processed += len(photos)
+
+    if processed:
+        current_app.logger.info(
+            f"Обработано фото: {processed}, размер {bytes_before} -> {bytes_after} байт "
+            f"(в среднем -{(bytes_before - bytes_after) // processed} байт на фото)"
+        )
+    return processed, bytes_before, bytes_after
+
+
+def migrate_inline_photos():
+    """
+    Переносит фото из старой колонки ldap_users.photo (base64) в contact_photos.
+    Выполняется при запуске приложения, повторный запуск ничего не делает.
+    """
+    migrated = 0
+    while True:
+        rows = db.session.query(LDAPUsers.id, LDAPUsers.legacy_photo).filter(
+            LDAPUsers.legacy_photo.isnot(None)
+        ).limit(MIGRATION_BATCH_SIZE).all()
+        if not rows:
+            break
+
+        for user_id, legacy_photo in rows:
+            try:
+                digest = store_photo(decode_photo(legacy_photo))
+            except ValueError:                                                          # битый base64 — просто отбрасываем
+                digest = None
+            db.session.query(LDAPUsers).filter(LDAPUsers.id == user_id).update(
+                {'photo_hash': digest, 'legacy_photo': None}, synchronize_session=False
+            )
+        db.session.commit()
+        migrated += len(rows)
+
+    return migrated
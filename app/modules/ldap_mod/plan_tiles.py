@@ -0,0 +1,146 @@
+"""
+Тайловая пирамида для больших планов зданий.
+
+План размером 8000x6000 px браузер скачивает и декодирует целиком, даже если на экране
+виден один кабинет. Поэтому растровый план при загрузке режется на тайлы TILE_SIZE x TILE_SIZE
+на нескольких уровнях: уровень 0 — исходное разрешение, каждый следующий уменьшен вдвое,
+последний целиком помещается в один тайл. Карта (static/js/plan_tiles.js) загружает только
+видимые тайлы уровня, подходящего к текущему масштабу.
+
+- Тайлы лежат на диске: BUILDING_PLAN_TILE_DIR/<id сервера>/<версия плана>/<уровень>/<столбец>_<строка>.<ext>
+- Версия плана входит в путь и в адрес тайла: новый план — новые тайлы, тайлы старых версий
+  удаляются при построении новых.
+- Если тайлов на диске нет (каталог очищен, другой экземпляр приложения), они строятся
+  заново при первом обращении.
+- SVG и небольшие планы не режутся: векторный план браузер масштабирует сам, маленький проще отдать целиком.
+
+Pillow — необязательная зависимость: без нее план всегда отдается целиком.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from io import BytesIO
+from flask import current_app
+
+try:
+    from PIL import Image, features
+except ImportError:                                                                     # без Pillow тайлы не строятся
+    Image = None
+
+
+TILE_SIZE = 256                                                                         # сторона тайла, px
+MIN_TILED_SIDE = 2048                                                                   # планы с меньшей большей стороной отдаются целиком
+BUILD_DIR_PREFIX = '.build-'                                                            # временные каталоги построения
+
+_build_lock = threading.Lock()                                                          # одно построение на процесс (это тяжелая операция)
+
+
+def tile_format():
+    """Формат тайлов: WebP без потерь (линии плана остаются четкими) или PNG. Returns: (формат Pillow, расширение)"""
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'PNG', 'png'
+
+
+def plan_tile_layout(data, is_svg=False):
+    """
+    Размеры плана и сторона тайла для пирамиды (читается только заголовок файла)
+
+    Returns:
+        tuple: (ширина, высота, сторона тайла или None, если план не режется на тайлы)
+               (None, None, None) для SVG, без Pillow или если файл не удалось разобрать
+    """
+    if Image is None or not data or is_svg:
+        return None, None, None
+    try:
+        width, height = Image.open(BytesIO(data)).size
+    except Exception:
+        return None, None, None
+    tile_size = TILE_SIZE if max(width, height) >= MIN_TILED_SIDE else None
+    return width, height, tile_size
+
+
+def _server_dir(server_id):
+    return os.path.join(current_app.config['BUILDING_PLAN_TILE_DIR'], str(server_id))
+
+
+def _version_dir(server):
+    return os.path.join(_server_dir(server.id), server.building_plan_version)
+
+
+def _write_pyramid(image, tile_size, target):
+    """Режет изображение на тайлы всех уровней в каталог target"""
+    fmt, ext = tile_format()
+    level = 0
+    while True:
+        level_dir = os.path.join(target, str(level))
+        os.makedirs(level_dir)
+        for left in range(0, image.width, tile_size):
+            for top in range(0, image.height, tile_size):
+                tile = image.crop((left, top, min(left + tile_size, image.width), min(top + tile_size, image.height)))
+                tile.save(os.path.join(level_dir, f'{left // tile_size}_{top // tile_size}.{ext}'), format=fmt, lossless=True, optimize=True)
+        if image.width <= tile_size and image.height <= tile_size:                      # последний уровень — один тайл
+            break
+        image = image.reduce(2)                                                         # следующий уровень вдвое меньше
+        level += 1
+
+
+def build_plan_tiles(server, data=None):
+    """
+    Строит тайлы плана сервера на диске, если их еще нет
+
+    Returns:
+        bool: есть ли тайлы для текущей версии плана
+    """
+    if not server.has_plan_tiles or Image is None:
+        return False
+    target = _version_dir(server)
+    if os.path.isdir(target):
+        return True
+
+    with _build_lock:
+        if os.path.isdir(target):                                                       # построили, пока ждали блокировку
+            return True
+
+        image = Image.open(BytesIO(data or server.building_plan_data))
+        image.load()
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+        os.makedirs(_server_dir(server.id), exist_ok=True)
+        build_dir = tempfile.mkdtemp(prefix=BUILD_DIR_PREFIX, dir=_server_dir(server.id))
+        try:
+            _write_pyramid(image, server.building_plan_tile_size, build_dir)
+            try:
+                os.rename(build_dir, target)                                            # тайлы появляются целиком и сразу
+            except OSError:
+                pass                                                                    # другой процесс успел построить те же тайлы
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    _remove_other_versions(server)
+    return True
+
+
+def _remove_other_versions(server):
+    """Удаляет тайлы прежних планов сервера"""
+    server_dir = _server_dir(server.id)
+    for name in os.listdir(server_dir):
+        if name != server.building_plan_version and not name.startswith(BUILD_DIR_PREFIX):
+            shutil.rmtree(os.path.join(server_dir, name), ignore_errors=True)
+
+
+def remove_plan_tiles(server_id):
+    """Удаляет все тайлы сервера (план удален вместе с сервером)"""
+    shutil.rmtree(_server_dir(server_id), ignore_errors=True)
+
+
+def plan_tile_path(server, level, col, row):
+    """Путь к файлу тайла (при необходимости тайлы строятся) или None, если такого тайла нет"""
+    if Image is None:
+        return None
+    _, ext = tile_format()
+    path = os.path.join(_version_dir(server), str(level), f'{col}_{row}.{ext}')
+    if not os.path.exists(path) and not build_plan_tiles(server):
+        return None
+    return path if os.path.exists(path) else None
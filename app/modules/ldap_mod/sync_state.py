@@ -0,0 +1,57 @@
+"""
+Состояние синхронизации серверов LDAP, общее для всех процессов (хранится в ldap_server).
+
+- sync_started_at — блокировка: пока она стоит, второй запуск синхронизации того же сервера
+  (по расписанию или вручную) не начнется. Захватывается одним атомарным UPDATE,
+  поэтому работает и между процессами gunicorn. Зависшая блокировка (процесс упал)
+  снимается через LDAP_SYNC_LOCK_TTL_SECONDS.
+- sync_failures и sync_next_run — экспоненциальная задержка для сбойных серверов:
+  после N ошибок подряд следующая попытка не раньше чем через interval * 2^(N-1),
+  но не дольше LDAP_SYNC_MAX_BACKOFF_MINUTES. Успешная синхронизация сбрасывает задержку.
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from .models import LDAPServer
+
+
+def try_lock_server(server_id):
+    """Захватывает блокировку синхронизации сервера. Returns: bool — удалось ли"""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=current_app.config['LDAP_SYNC_LOCK_TTL_SECONDS'])
+    locked = LDAPServer.query.filter(
+        LDAPServer.id == server_id,
+        db.or_(LDAPServer.sync_started_at.is_(None), LDAPServer.sync_started_at < stale)
+    ).update({'sync_started_at': now}, synchronize_session=False)
+    db.session.commit()
+    return locked == 1
+
+
+def finish_server_sync(server_id, success):
+    """Снимает блокировку и планирует следующую попытку с учетом результата"""
+    db.session.rollback()                                                               # сессия могла остаться в состоянии ошибки
+    failures = db.session.query(LDAPServer.sync_failures).filter(LDAPServer.id == server_id).scalar() or 0
+
+    if success:
+        failures, next_run = 0, None                                                    # здоровый сервер синхронизируется на каждом запуске задачи
+    else:
+        failures += 1
+        interval = current_app.config['LDAP_SYNC_INTERVAL_MINUTES']
+        delay = min(interval * 2 ** (failures - 1), current_app.config['LDAP_SYNC_MAX_BACKOFF_MINUTES'])
+        next_run = datetime.utcnow() + timedelta(minutes=delay)
+
+    LDAPServer.query.filter(LDAPServer.id == server_id).update({
+        'sync_started_at': None,
+        'sync_failures': failures,
+        'sync_next_run': next_run
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+def due_servers():
+    """Возвращает активные серверы, которым пора синхронизироваться: [(id, name)]"""
+    now = datetime.utcnow()
+    return db.session.query(LDAPServer.id, LDAPServer.name).filter(
+        LDAPServer.is_active.is_(True),
+        db.or_(LDAPServer.sync_next_run.is_(None), LDAPServer.sync_next_run <= now)
+    ).order_by(LDAPServer.id).all()
@@ -1,14 +1,21 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, abort
 from app import db
 from .forms import LDAPServerForm
 from .models import LDAPServer, LDAPUsers
 from .ldap_class import LDAPManager
-from app import cache                       # Импортируем глобальный кеш
-from flask import session
+from .ldap_pool import get_pool, discard_server_connections
+from .sync_state import try_lock_server, finish_server_sync
+from .browse_cache import save_snapshot, load_snapshot, load_snapshot_page
+from app.modules.phonebook_mod.page_cache import bump_contacts_version
+from .bulk import user_rows, upsert_users, delete_users, existing_photo_hashes, BULK_BATCH_SIZE
+from .fingerprint import contact_fingerprint
+from .photo_store import set_user_photo, delete_orphan_photos, photo_hash
+from .building_plan import set_building_plan, is_svg_plan, SVG_MIMETYPE
+from .plan_tiles import build_plan_tiles, plan_tile_path, remove_plan_tiles
 from datetime import datetime, timedelta
+import time
 from flask import current_app
-from flask import Response
-import base64
+from flask import Response, send_file
 
 
 def utc_to_local(utc_dt):
@@ -42,6 +49,22 @@ def format_local_datetime(dt, format_str='%Y-%m-%d %H:%M:%S'):
     return local_dt.strftime(format_str)
 
 
+def create_ldap_manager(server, pooled=True):
+    """Создает LDAP менеджер с настройками сервера из БД (соединения берутся из общего пула, если pooled)"""
+    server_url = f"{server.host}:{server.port}"
+    return LDAPManager(
+        server_url=server_url,
+        user=server.bind_login,
+        password=server.bind_password,
+        base_dn=server.base_dn,
+        use_ssl=server.use_ssl,
+        page_size=current_app.config['LDAP_PAGE_SIZE'],                                                 # размер страницы постраничного поиска
+        pool=get_pool() if pooled else None,
+        timeout=current_app.config['LDAP_NETWORK_TIMEOUT'],
+        pool_key=(server.id, server_url, server.bind_login, server.bind_password, server.use_ssl)
+    )
+
+
 
 def list_ldap_servers():
     """
@@ -59,6 +82,14 @@ def list_ldap_servers():
     return render_template('list_servers.html', servers=servers)
 
 
+def _build_plan_tiles(server):
+    """Строит тайлы загруженного плана. Ошибка не мешает сохранению: тайлы построятся при первом обращении"""
+    try:
+        build_plan_tiles(server)
+    except Exception as e:
+        current_app.logger.warning(f'Не удалось построить тайлы плана сервера {server.name}: {e}')
+
+
 def add_ldap_server():
     """
     Обрабатывает добавление нового LDAP сервера
@@ -103,13 +134,13 @@ def add_ldap_server():
             # Обработка загрузки плана здания
             if form.building_plan.data:
                 plan_file = form.building_plan.data
-                server.building_plan_data = plan_file.read()
-                server.building_plan_filename = plan_file.filename
-                server.building_plan_mimetype = plan_file.content_type
+                set_building_plan(server, plan_file.read(), plan_file.filename, plan_file.content_type)
                 
             # Сохранение в БД
             db.session.add(server)
             db.session.commit()
+            if form.building_plan.data:
+                _build_plan_tiles(server)                                           # тайлы строим сразу, чтобы первый просмотр карты не ждал
             flash('LDAP сервер успешно добавлен', 'success')
             return redirect(url_for('ldap.list_ldap_servers'))
         except Exception as e:
@@ -168,15 +199,16 @@ def edit_ldap_server(server_id):
             # Обновление плана здания (если загружен новый)
             if form.building_plan.data:
                 plan_file = form.building_plan.data
-                server.building_plan_data = plan_file.read()
-                server.building_plan_filename = plan_file.filename
-                server.building_plan_mimetype = plan_file.content_type
+                set_building_plan(server, plan_file.read(), plan_file.filename, plan_file.content_type)
 
             # Конвертируем время обратно в UTC
             if form.last_sync.data:
-                server.last_sync = local_to_utc(form.last_sync.data)
+                last_sync = local_to_utc(form.last_sync.data)
             else:
-                server.last_sync = None
+                last_sync = None
+            if last_sync != server.last_sync:                                       # время изменили вручную — следующие изменения отбираем по whenChanged от него
+                server.last_usn = None
+            server.last_sync = last_sync
 
             # Пароль обрабатываем отдельно
             if form.bind_password.data:
@@ -190,7 +222,11 @@ def edit_ldap_server(server_id):
             else:
                 server.smtp_password = original_smtp_password
 
+            bump_contacts_version()                                                 # название сервера — это организация в телефонной книге
             db.session.commit()
+            discard_server_connections(server.id)                                   # соединения со старыми настройками больше не нужны
+            if form.building_plan.data:
+                _build_plan_tiles(server)                                           # новый план — новые тайлы (старые удаляются)
             flash('Изменения сохранены', 'success')
             return redirect(url_for('ldap.list_ldap_servers'))
         except Exception as e:
@@ -205,7 +241,10 @@ def delete_ldap_server(server_id):
 
     try:
         db.session.delete(server)
+        bump_contacts_version()
         db.session.commit()
+        discard_server_connections(server_id)
+        remove_plan_tiles(server_id)
         flash('Сервер успешно удален', 'success')
     except Exception as e:
         db.session.rollback()
@@ -230,13 +269,7 @@ def test_ldap_connection():
     
     try:
         # Создаем LDAP менеджер с настройками из БД
-        ldap = LDAPManager(
-            server_url=f"{server.host}:{server.port}",
-            user=server.bind_login,
-            password=server.bind_password,
-            base_dn=server.base_dn,
-            use_ssl=server.use_ssl
-        )
+        ldap = create_ldap_manager(server, pooled=False)                            # проверяем именно новое подключение и привязку
         
         # Пытаемся подключиться
         success, message = ldap.connect()
@@ -321,38 +354,46 @@ def test_smtp_connection():
 
 
 
-# получаем список пользователей LDAP
+# получаем список пользователей LDAP (снимок каталога, показываемый постранично)
 def list_ldap_contacts(server_id):
     server = LDAPServer.query.get_or_404(server_id)
-    cache_key = f'ldap_users_{session.sid}'                                                             # уникальный  ID сессии
+    snapshot_id = request.args.get('snapshot_id')                                                       # переход по страницам уже загруженного снимка
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = current_app.config['LDAP_BROWSE_PAGE_SIZE']
 
-    ldap = LDAPManager(                                                                                 # подключаемся к LDAP
-        server_url=f"{server.host}:{server.port}",
-        user=server.bind_login,
-        password=server.bind_password,
-        base_dn=server.base_dn,
-        use_ssl=server.use_ssl  # Добавляем параметр SSL
-    )
+    if not snapshot_id:
+        ldap = create_ldap_manager(server)                                                              # подключаемся к LDAP
 
-    success, message = ldap.connect()                                                                   # подключаемся к LDAP серверу
-    if not success:                                                                                     # если не удачно подключились
-        flash(message, 'danger')
-        return redirect(url_for('ldap.list_ldap_servers'))
-    
-    try:
-        users = ldap.get_all_users(search_filter=server.search_filter)                                  # получаем список пользователей LDAP , предварительно передавая парамтер фильтра
-        users = sorted(users, key=lambda x: x.get('cn', '').lower())                                    # После получения users из LDAP добавляем сортировку
-        cache.set(cache_key, users)                                                                     # Сохранение полученный список  LDAP пользователей в кеш
+        success, message = ldap.connect()                                                               # подключаемся к LDAP серверу
+        if not success:                                                                                 # если не удачно подключились
+            flash(message, 'danger')
+            return redirect(url_for('ldap.list_ldap_servers'))
 
-        saved_users = LDAPUsers.query.filter_by(server_id=server_id).all()                              # получаем список пользователей из БД
-        saved_guids = {user.guid for user in saved_users}                                               # создвем множество из guid элементов
-    
-        return render_template('list_ldap_contacts.html', users=users, server_id=server_id, saved_guids=saved_guids)   # прорисуем список пользователей LDAP
-    except Exception as e:
-        flash(f"Ошибка получения данных: {str(e)}", 'danger')
+        try:
+            snapshot_id = save_snapshot(server_id, ldap.iter_users(search_filter=server.search_filter))   # читаем LDAP постранично сразу в общий для всех воркеров кеш снимков
+        except Exception as e:
+            ldap.disconnect(discard=True)                                                               # после ошибки соединение в пул не возвращаем
+            flash(f"Ошибка получения данных: {str(e)}", 'danger')
+            return redirect(url_for('ldap.list_ldap_servers'))
+        finally:
+            ldap.disconnect()
+        if snapshot_id is None:
+            flash('Список пользователей LDAP не поместился в кеш (LDAP_BROWSE_CACHE_MAX_BYTES), увеличьте лимит', 'danger')
+            return redirect(url_for('ldap.list_ldap_servers'))
+
+    result = load_snapshot_page(server_id, snapshot_id, page, per_page)                                 # в память попадает только одна страница
+    if result is None:
+        flash('Данные пользователей устарели, выполните новый поиск', 'error')
         return redirect(url_for('ldap.list_ldap_servers'))
-    finally:
-        ldap.disconnect()
+    users, total = result
+
+    page_guids = [user['guid'] for user in users]
+    saved_guids = {guid for (guid,) in db.session.query(LDAPUsers.guid).filter(                       # создаем множество из guid сохраненных пользователей этой страницы
+        LDAPUsers.server_id == server_id, LDAPUsers.guid.in_(page_guids)
+    )}
+
+    return render_template('list_ldap_contacts.html', users=users, server_id=server_id, saved_guids=saved_guids,
+                           snapshot_id=snapshot_id, page=page, pages=max(1, -(-total // per_page)), total=total)   # прорисуем страницу пользователей LDAP
 
 
 """
@@ -377,44 +418,28 @@ def save_selected_contacts():
             flash('Не выбрано ни одного пользователя', 'warning')
             return redirect(url_for('ldap.list_ldap_contacts', server_id=server_id))
         
-        # 3. Получаем кешированные данные пользователей из сессии
-        ldap_users_cache = cache.get(f'ldap_users_{session.sid}')
-        if not ldap_users_cache:
+        # 3. Получаем снимок пользователей LDAP, показанный на странице выбора
+        ldap_users_cache = load_snapshot(server_id, request.form.get('snapshot_id'), selected_guids)
+        if ldap_users_cache is None:
             flash('Данные пользователей устарели, выполните новый поиск', 'error')
             return redirect(url_for('ldap.list_ldap_contacts', server_id=server_id))
         
-        # 4. Обрабатываем каждого выбранного пользователя
-        for guid in selected_guids:            
-            user_data = next((u for u in ldap_users_cache if u.get('guid') == guid), None)  # Находим данные пользователя в кеше
-            if not user_data:
-                continue  # Пропускаем если данные не найдены
-
-            existing_user = LDAPUsers.query.filter_by(guid=guid).first()                    # Проверяем существует ли пользователь в БД
-
-            if existing_user:                                                               # Обновляем существующую запись
-                existing_user.cn =          user_data.get('cn', existing_user.cn)
-                existing_user.mail =        user_data.get('mail', existing_user.mail)
-                existing_user.telephone =   user_data.get('telephone', existing_user.telephone)
-                existing_user.mobile =      user_data.get('mobile', existing_user.mobile)
-                existing_user.title =       user_data.get('title', existing_user.title)
-                existing_user.department =  user_data.get('department', existing_user.department)
-                existing_user.photo =       user_data.get('photo', existing_user.photo)
-                existing_user.server_id =   server_id
-            else:
-                new_user = LDAPUsers(                                                       # Создаем новую запись
-                    guid=guid,
-                    server_id=server_id,
-                    cn=user_data.get('cn', ''),
-                    mail=user_data.get('mail'),
-                    telephone=user_data.get('telephone'),
-                    mobile=user_data.get('mobile'),
-                    title=user_data.get('title'),
-                    department=user_data.get('department'),
-                    photo=user_data.get('photo')
-                )
-                db.session.add(new_user)
+        # 4. Находим выбранных пользователей в снимке (словарь по GUID) и одним IN запросом — уже сохраненных
+        selected = list(ldap_users_cache.values())                                          # GUID, которых нет в снимке, пропускаем
+        current_photos = existing_photo_hashes([user_data['guid'] for user_data in selected])
+
+        # 5. Добавляем новых и обновляем существующих пакетной записью (фото пишем только если оно изменилось)
+        rows = user_rows(selected, int(server_id), current_photos)
+        saved = upsert_users(rows, update_server=True)                                      # сохраненный контакт переходит к текущему серверу
+        replaced_photos = [current_photos[row['guid']] for row in rows
+                           if current_photos.get(row['guid']) not in (None, row['photo_hash'])]
+        if replaced_photos:
+            delete_orphan_photos(replaced_photos)                                           # удаляем замененные фото
+        bump_contacts_version()                                                             # телефонная книга в кеше устарела
         db.session.commit()                                                                 # Фиксируем изменения в БД
-        flash(f'Успешно сохранено/обновленно {len(selected_guids)} пользователей', 'success')
+        flash(f'Успешно сохранено/обновленно {saved} пользователей', 'success')
+        if saved < len(selected_guids):                                                     # выбранные GUID, которых нет в снимке
+            flash(f'Не найдено в списке LDAP: {len(selected_guids) - saved} пользователей', 'warning')
     
     except Exception as e:                                                                  # Обработка ошибок
         db.session.rollback()
@@ -437,7 +462,11 @@ def delete_saved_contact(user_id):
     server_id = user.server_id                                                              # сохраняем server_id для редиректа
 
     try:
+        old_photo = user.photo_hash
         db.session.delete(user)
+        db.session.flush()
+        delete_orphan_photos([old_photo])                                                   # фото могло остаться без владельца
+        bump_contacts_version()
         db.session.commit()
         flash(f'Пользователь {user.cn} успешно удален', 'success')
     except Exception as e:
@@ -453,6 +482,7 @@ def edit_saved_contact(user_id):
     
     if request.method == 'POST':
         try:
+            old_photo = user.photo_hash
             # Обновляем поля из формы
             guid_input = request.form.get('guid', '').strip()
             user.guid = guid_input if guid_input else None
@@ -465,12 +495,17 @@ def edit_saved_contact(user_id):
 
             # Обработка удаления фотографии
             if request.form.get('remove_photo'):
-                user.photo = None  # Удаляем фото если чекбокс отмечен
+                user.photo_hash = None  # Удаляем фото если чекбокс отмечен
             # Обработка фотографии
             if 'photo' in request.files:                                                    # Проверяем, был ли передан файл с именем 'photo' в форме
                 photo_file = request.files['photo']                                         # Получаем объект файла из запроса
                 if photo_file and photo_file.filename:                                      # Проверяем, что файл существует и имеет имя (не пустой)
-                    user.photo = base64.b64encode(photo_file.read()).decode('utf-8')        # Конвертируем файл в base64
+                    set_user_photo(user, photo_file.read())                                     # Сохраняем файл в хранилище фото
+
+            db.session.flush()
+            if user.photo_hash != old_photo:
+                delete_orphan_photos([old_photo])                                           # старое фото могло остаться без владельца
+            bump_contacts_version()
 
             db.session.commit()
             flash('Данные пользователя обновлены', 'success')
@@ -514,11 +549,12 @@ def add_new_contact(server_id=None):
             if 'photo' in request.files:
                 photo_file = request.files['photo']
                 if photo_file and photo_file.filename:
-                    # Конвертируем файл в base64
-                    new_user.photo = base64.b64encode(photo_file.read()).decode('utf-8')
+                    # Сохраняем файл в хранилище фото
+                    set_user_photo(new_user, photo_file.read())
             
             # Сохраняем в БД
             db.session.add(new_user)
+            bump_contacts_version()
             db.session.commit()
             
             flash(f'Пользователь {cn} успешно добавлен', 'success')
@@ -541,7 +577,7 @@ def add_new_contact(server_id=None):
 
 """Ручная синхронизация конкретного сервера"""
 def sync_server(server_id):
-    success, message = sync_ldap_contacts(server_id)
+    success, message = sync_ldap_contacts(server_id, full=True)
     if success:
         flash(f'Синхронизация завершена: {message}', 'success')
     else:
@@ -549,20 +585,52 @@ def sync_server(server_id):
     return redirect(url_for('ldap.list_ldap_servers'))
 
 
+"""Пора ли сверить список контактов с LDAP (поиск удаленных контактов)"""
+def _reconcile_due(server):
+    if server.last_full_sync is None:
+        return True
+    interval = timedelta(minutes=current_app.config['LDAP_FULL_SYNC_INTERVAL_MINUTES'])
+    return datetime.utcnow() - server.last_full_sync >= interval
+
+
+"""
+Синхронизирует контакты сервера, если его синхронизация не выполняется прямо сейчас
+(в этом или другом процессе), и записывает результат для планировщика.
+deadline (time.monotonic()) — после него синхронизация прерывается, изменения откатываются
+"""
+def sync_ldap_contacts(server_id, full=False, deadline=None):
+    LDAPServer.query.get_or_404(server_id)
+    if not try_lock_server(server_id):
+        return False, "Синхронизация этого сервера уже выполняется"
+
+    success = False
+    try:
+        success, message = _sync_ldap_contacts(server_id, full, deadline)
+        return success, message
+    finally:
+        finish_server_sync(server_id, success)
+
+
 """
 Синхронизирует контакты между LDAP и локальной БД
-Проверяет новые контакты и обновления существующих
+Проверяет новые контакты и обновления существующих.
+Обычно у LDAP запрашиваются только записи, измененные после прошлой синхронизации.
+Раз в LDAP_FULL_SYNC_INTERVAL_MINUTES удаленные контакты находятся сверкой по списку одних GUID;
+полный проход (full=True или первая синхронизация) загружает все записи со всеми атрибутами.
+Срок deadline проверяется после каждой записи LDAP, ожидание ответа сервера ограничено LDAP_NETWORK_TIMEOUT
 """
-def sync_ldap_contacts(server_id):
+def _sync_ldap_contacts(server_id, full=False, deadline=None):
     server = LDAPServer.query.get_or_404(server_id)                                                     # получаем данные по серверу из БД по его ID
+    full = full or server.last_sync is None
+    reconcile = full or _reconcile_due(server)
+    if full:
+        search_filter = server.search_filter
+        changed_since = server.last_sync                                                                # при полном проходе изменения отбираем по времени сами (None — берем все)
+    else:                                                                                               # условие на изменения проверяет сам LDAP сервер
+        search_filter = LDAPManager.changes_filter(server.search_filter, last_usn=server.last_usn, since=server.last_sync)
+        changed_since = None                                                                            # все полученные записи уже изменены после прошлой синхронизации
 
-    ldap = LDAPManager(                                                                                 # создаем объект LDAP
-        server_url=f"{server.host}:{server.port}",
-        user=server.bind_login,
-        password=server.bind_password,
-        base_dn=server.base_dn,
-        use_ssl=server.use_ssl                                                                          # Добавляем параметр SSL
-    )
+    ldap = create_ldap_manager(server)                                                                  # создаем объект LDAP
 
     success, message = ldap.connect()                                                                   # Подключаемся к серверу LDAP
 
@@ -570,9 +638,11 @@ def sync_ldap_contacts(server_id):
         return False, message
     
     try:
-        ldap_users = ldap.get_all_users(search_filter=server.search_filter)                             # Получаем всех пользователей из LDAP  по фильтру
-
-        db_users = {user.guid: user for user in LDAPUsers.query.filter_by(server_id=server_id).filter(  # Генерируем словарь всех пользователей из БД у которых есть GUID для этого сервера  исключае пустые строки
+        db_users = {user.guid: user for user in db.session.query(                                       # Генерируем словарь всех пользователей из БД у которых есть GUID для этого сервера  исключае пустые строки
+            LDAPUsers.guid, LDAPUsers.content_hash, LDAPUsers.photo_hash,                               # только то, что нужно для сравнения
+            LDAPUsers.cn, LDAPUsers.mail, LDAPUsers.telephone, LDAPUsers.mobile, LDAPUsers.title, LDAPUsers.department
+        ).filter(
+            LDAPUsers.server_id == server_id,
             LDAPUsers.guid.isnot(None),             # guid не NULL
             LDAPUsers.guid != ''                    # guid не пустая строка
         ).all()}                                                                                        
@@ -582,27 +652,21 @@ def sync_ldap_contacts(server_id):
         deleted_users = 0
         new_contacts = []                                                                               # Список для хранения новых контактов для уведомлений
         updated_contacts = []                                                                           # Для хранения информации об измененных контактах
-
-
-        # Собираем GUID всех пользователей из LDAP
-        ldap_guids = set()
-        for ldap_user in ldap_users:                                                                    # Обрабатываем каждого пользователя из LDAP
-            guid = ldap_user.get('guid')
-            if guid:
-                ldap_guids.add(guid)
-
-        # Удаляем пользователей, которых нет в LDAP
-        for guid in db_users:
-            db_user = db_users[guid]
-            if guid not in ldap_guids:
-                db.session.delete(db_user)
-                deleted_users += 1
-
-        # Обрабатываем каждого пользователя из LDAP
-        for ldap_user in ldap_users:                                                                    # Обрабатываем каждого пользователя из LDAP
+        ldap_guids = set()                                                                              # GUID всех пользователей из LDAP (для поиска удаленных)
+        pending_users = []                                                                              # новые и измененные контакты для пакетной записи
+        replaced_photos = []                                                                            # хеши фото, которые заменены или удалены (кандидаты на удаление)
+        current_photos = {guid: user.photo_hash for guid, user in db_users.items()}                     # фото, которые уже сохранены (повторно не пишем)
+        highest_usn = server.last_usn or 0
+        sync_started = datetime.utcnow().replace(microsecond=0)
+
+        # Обрабатываем пользователей LDAP за один проход по мере получения страниц
+        for ldap_user in ldap.iter_users(search_filter=search_filter):
+            _check_deadline(deadline)
             guid = ldap_user.get('guid')
             if not guid:
                 continue
+            ldap_guids.add(guid)
+            highest_usn = max(highest_usn, ldap_user.get('usn_changed') or 0)
 
             # Получаем временные метки из LDAP (не сохраняем в БД)
             when_created = ldap_user.get('when_created')
@@ -610,8 +674,12 @@ def sync_ldap_contacts(server_id):
 
             if guid in db_users:                                                                        # находим пользоваться в LDAP по guid из БД 
                 db_user = db_users[guid]                                                                # обновляем данные пользователя
-                if (_user_data_changed(db_user, ldap_user)) and (when_changed is None or when_changed > server.last_sync):   # Обновляем только если контакт изменился после последней синхронизации
-                    if server.notify_on_update:                                                         # если стоит крыжик уведомлять об изменениях контакта
+                photo = ldap_user.get('photo')
+                new_photo = photo_hash(photo) if photo else None
+                if db_user.content_hash == contact_fingerprint(ldap_user, new_photo):
+                    continue                                                                            # отпечаток совпал — контакт не изменился, в БД не пишем
+                if changed_since is None or when_changed is None or when_changed >= changed_since:      # Обновляем только если контакт изменился после последней синхронизации (та же секунда включительно)
+                    if server.notify_on_update and _user_data_changed(db_user, ldap_user):             # если стоит крыжик уведомлять об изменениях контакта (смена одного фото применяем сразу)
                         changes = _get_changes_dict(db_user, ldap_user) 
                         updated_contacts.append({
                             'guid': guid,
@@ -619,16 +687,35 @@ def sync_ldap_contacts(server_id):
                             'changes': changes
                         })
                     else:                                                                               # Автоматическое обновление
-                        _update_user_from_ldap(db_user, ldap_user)
+                        pending_users.append(ldap_user)                                                 # фото пишем только если изменился его хеш
                         updated_users += 1
+                        if db_user.photo_hash and db_user.photo_hash != new_photo:
+                            replaced_photos.append(db_user.photo_hash)
             else:                                                                                       # тут идет логика добавления пользователя из LDAP в БД
-                if when_created is None or when_created > server.last_sync:                             # если врем создания больше времени синхронизации
+                if changed_since is None or when_created is None or when_created >= changed_since:      # если врем создания не раньше времени синхронизации
                     if server.notify_on_add:                                                            # и если стоит галочка уведомлять по емали
                         new_contacts.append(ldap_user)                                                  # Добавляем новый контакт в список для уведомлений
                     else:                                                                               # если галочки уведомлять по емайлу нету
-                        _create_user_from_ldap(ldap_user, server_id)                                    # сразу добавляем контакт
+                        pending_users.append(ldap_user)                                                 # сразу добавляем контакт
                         new_users += 1
 
+            if len(pending_users) >= BULK_BATCH_SIZE:                                                   # пишем пачками, не копим весь каталог в памяти
+                upsert_users(user_rows(pending_users, server_id, current_photos))
+                pending_users = []
+
+        upsert_users(user_rows(pending_users, server_id, current_photos))
+
+        # Удаляем пользователей, которых нет в LDAP (список GUID известен только после полного прохода)
+        if reconcile:
+            if not full:                                                                                # изменения загружены выше, здесь нужны только GUID (без фото и прочих атрибутов)
+                ldap_guids = set()
+                for guid in ldap.iter_guids(search_filter=server.search_filter):
+                    _check_deadline(deadline)
+                    ldap_guids.add(guid)
+            deleted_guids = [guid for guid in db_users if guid not in ldap_guids]
+            deleted_users = delete_users(server_id, deleted_guids)
+            replaced_photos.extend(db_users[guid].photo_hash for guid in deleted_guids)
+
 
         # Отправляем email уведомление о новых контактах если они есть и уведомления включены
         if new_contacts and server.notify_on_add and server.smtp_is_active:
@@ -640,7 +727,15 @@ def sync_ldap_contacts(server_id):
             from app.modules.mail_mod.notification_service_update_contact import send_update_contacts_notification
             send_update_contacts_notification(server, updated_contacts)
 
-        server.last_sync =  datetime.utcnow().replace(microsecond=0)                                       # Обновляем время последней синхронизации
+        server.last_sync = sync_started                                                                 # Обновляем время последней синхронизации (на момент начала прохода, чтобы не пропустить изменения во время него)
+        server.last_usn = highest_usn or None
+        if reconcile:
+            server.last_full_sync = sync_started
+        db.session.flush()
+        if replaced_photos:                                                                             # проверяем только фото, которые этот проход заменил или удалил
+            delete_orphan_photos(replaced_photos)
+        if new_users or updated_users or deleted_users:                                                 # без изменений кеш телефонной книги остается актуальным
+            bump_contacts_version()
         db.session.commit()
 
 
@@ -650,10 +745,16 @@ def sync_ldap_contacts(server_id):
             return True, f"Синхронизация завершена. Новых: {new_users}, Обновлено: {updated_users}"
     except Exception as e:
         db.session.rollback()
+        ldap.disconnect(discard=True)                                                                   # ошибка LDAP, таймаут или брошенный постраничный поиск — соединение закрываем
         return False, f"Ошибка синхронизации: {str(e)}"
     finally:
         ldap.disconnect()
 
+"""Прерывает синхронизацию, если ее срок истек (исключение откатывает транзакцию)"""
+def _check_deadline(deadline):
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError("превышено время синхронизации")
+
 """Проверяет, изменились ли данные пользователя"""
 def _user_data_changed(db_user, ldap_user):
     return (db_user.cn != ldap_user.get('cn') or
@@ -663,31 +764,6 @@ def _user_data_changed(db_user, ldap_user):
             db_user.title != ldap_user.get('title') or
             db_user.department != ldap_user.get('department'))
 
-"""Обновляет данные пользователя из LDAP"""
-def _update_user_from_ldap(db_user, ldap_user):
-    db_user.cn = ldap_user.get('cn', db_user.cn)
-    db_user.mail = ldap_user.get('mail', db_user.mail)
-    db_user.telephone = ldap_user.get('telephone', db_user.telephone)
-    db_user.mobile = ldap_user.get('mobile', db_user.mobile)
-    db_user.title = ldap_user.get('title', db_user.title)
-    db_user.department = ldap_user.get('department', db_user.department)
-    db_user.photo = ldap_user.get('photo', db_user.photo)
-
-"""Создает нового пользователя из LDAP данных"""
-def _create_user_from_ldap(ldap_user, server_id):
-    new_user = LDAPUsers(
-        guid=ldap_user.get('guid'),
-        server_id=server_id,
-        cn=ldap_user.get('cn', ''),
-        mail=ldap_user.get('mail'),
-        telephone=ldap_user.get('telephone'),
-        mobile=ldap_user.get('mobile'),
-        title=ldap_user.get('title'),
-        department=ldap_user.get('department'),
-        photo=ldap_user.get('photo')
-    )
-    db.session.add(new_user)
-
 """Возвращает словарь измененных полей"""
 def _get_changes_dict(db_user, ldap_user):
     
@@ -718,13 +794,7 @@ def quick_add_contact(server_id, contact_guid):
         return redirect(url_for('ldap.show_list_saved_contacts', server_id=server_id))
     
     # Подключаемся к LDAP для получения данных контакта
-    ldap = LDAPManager(
-        server_url=f"{server.host}:{server.port}",
-        user=server.bind_login,
-        password=server.bind_password,
-        base_dn=server.base_dn,
-        use_ssl=server.use_ssl
-    )
+    ldap = create_ldap_manager(server)
     
     success, message = ldap.connect()
     if not success:
@@ -732,14 +802,8 @@ def quick_add_contact(server_id, contact_guid):
         return redirect(url_for('ldap.list_ldap_servers'))
     
     try:
-        # Получаем ВСЕХ пользователей и находим нужный по GUID
-        all_users = ldap.get_all_users(search_filter=server.search_filter)
-        ldap_user = None
-
-        for user in all_users:
-            if user.get('guid') == contact_guid:
-                ldap_user = user
-                break
+        # Точечный поиск одной записи по objectGUID (с учетом фильтра сервера)
+        ldap_user = ldap.get_user_by_guid(contact_guid, search_filter=server.search_filter)
 
         if not ldap_user:
             flash('Контакт не найден в LDAP', 'danger')
@@ -754,11 +818,12 @@ def quick_add_contact(server_id, contact_guid):
             telephone=ldap_user.get('telephone'),
             mobile=ldap_user.get('mobile'),
             title=ldap_user.get('title'),
-            department=ldap_user.get('department'),
-            photo=ldap_user.get('photo')
+            department=ldap_user.get('department')
         )
+        set_user_photo(new_user, ldap_user.get('photo'))
         
         db.session.add(new_user)
+        bump_contacts_version()
         db.session.commit()
         
         flash(f'Контакт {new_user.cn} успешно добавлен', 'success')
@@ -766,6 +831,7 @@ def quick_add_contact(server_id, contact_guid):
         
     except Exception as e:
         db.session.rollback()
+        ldap.disconnect(discard=True)                                                       # после ошибки соединение в пул не возвращаем
         flash(f'Ошибка добавления контакта: {e}', 'danger')
         return redirect(url_for('ldap.list_ldap_servers'))
     finally:
@@ -786,13 +852,7 @@ def quick_update_contact(server_id, contact_guid):
         return redirect(url_for('ldap.list_ldap_servers'))
     
     # Подключаемся к LDAP для получения актуальных данных
-    ldap = LDAPManager(
-        server_url=f"{server.host}:{server.port}",
-        user=server.bind_login,
-        password=server.bind_password,
-        base_dn=server.base_dn,
-        use_ssl=server.use_ssl
-    )
+    ldap = create_ldap_manager(server)
     
     success, message = ldap.connect()
     if not success:
@@ -800,14 +860,8 @@ def quick_update_contact(server_id, contact_guid):
         return redirect(url_for('ldap.list_ldap_servers'))
     
     try:
-        # Получаем ВСЕХ пользователей и находим нужный по GUID
-        all_users = ldap.get_all_users(search_filter=server.search_filter)
-        ldap_user = None
-        
-        for user in all_users:
-            if user.get('guid') == contact_guid:
-                ldap_user = user
-                break
+        # Точечный поиск одной записи по objectGUID (с учетом фильтра сервера)
+        ldap_user = ldap.get_user_by_guid(contact_guid, search_filter=server.search_filter)
         
         if not ldap_user:
             flash('Контакт не найден в LDAP', 'danger')
@@ -824,13 +878,15 @@ def quick_update_contact(server_id, contact_guid):
         }
         
         # Обновляем данные контакта
+        old_photo = existing_contact.photo_hash
         existing_contact.cn = ldap_user.get('cn', existing_contact.cn)
         existing_contact.mail = ldap_user.get('mail', existing_contact.mail)
         existing_contact.telephone = ldap_user.get('telephone', existing_contact.telephone)
         existing_contact.mobile = ldap_user.get('mobile', existing_contact.mobile)
         existing_contact.title = ldap_user.get('title', existing_contact.title)
         existing_contact.department = ldap_user.get('department', existing_contact.department)
-        existing_contact.photo = ldap_user.get('photo', existing_contact.photo)
+        if 'photo' in ldap_user:
+            set_user_photo(existing_contact, ldap_user['photo'])
         
         # Определяем какие поля изменились
         changed_fields = []
@@ -840,6 +896,10 @@ def quick_update_contact(server_id, contact_guid):
             if old_val != new_val:
                 changed_fields.append(f"{field}: '{old_val}' → '{new_val}'")
         
+        db.session.flush()
+        if existing_contact.photo_hash != old_photo:
+            delete_orphan_photos([old_photo])
+        bump_contacts_version()
         db.session.commit()
         
         if changed_fields:
@@ -851,6 +911,7 @@ def quick_update_contact(server_id, contact_guid):
         
     except Exception as e:
         db.session.rollback()
+        ldap.disconnect(discard=True)                                                       # после ошибки соединение в пул не возвращаем
         flash(f'Ошибка обновления контакта: {e}', 'danger')
         return redirect(url_for('ldap.list_ldap_servers'))
     finally:
@@ -858,23 +919,76 @@ def quick_update_contact(server_id, contact_guid):
 
 """ Просмотр загруженной карты здания в БД"""
 def get_building_plan(id):
+    """
+    Отдает файл плана здания как статический ресурс.
+
+    Хеш содержимого служит ETag: повторный запрос с актуальной копией получает 304
+    без чтения файла из БД. Шаблоны ссылаются на адрес с версией (?v=...), поэтому
+    такой ответ браузер кеширует надолго. Поддерживаются запросы диапазонов (Range),
+    SVG отдается заранее сжатым, если браузер принимает gzip.
+    """
     server = LDAPServer.query.get_or_404(id)
-    if not server.building_plan_data:
+    if not server.has_building_plan:
+        abort(404)
+
+    is_svg = is_svg_plan(server.building_plan_mimetype, server.building_plan_filename)
+    mimetype = SVG_MIMETYPE if is_svg else server.building_plan_mimetype                  # SVG, загруженный с другим типом, браузер иначе не покажет
+    use_gzip = is_svg and not request.range and request.accept_encodings['gzip'] > 0      # сжатую копию отдаем только целиком
+    etag = f'{server.building_plan_hash}-gz' if use_gzip else server.building_plan_hash
+
+    # Содержимое с этим хешем у браузера уже есть: файл из БД не читаем
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        data = None
+        if use_gzip:
+            data = db.session.query(LDAPServer.building_plan_gzip).filter(LDAPServer.id == server.id).scalar()
+        if data:
+            response = Response(data, mimetype=mimetype)
+            response.content_encoding = 'gzip'
+        else:                                                                           # сжатой копии нет — отдаем исходный файл
+            etag = server.building_plan_hash
+            data = server.building_plan_data
+            response = Response(data, mimetype=mimetype)
+
+        # Простое имя файла без русских символов
+        filename = 'building_plan'
+        if server.building_plan_filename:
+            # Берем только расширение файла
+            import os
+            _, ext = os.path.splitext(server.building_plan_filename)
+            filename = f'building_plan{ext}'
+        response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
+
+        response.set_etag(etag)
+        if not response.content_encoding:
+            response.accept_ranges = 'bytes'                                            # сообщаем браузеру, что можно докачивать частями
+        response.make_conditional(request, accept_ranges=not response.content_encoding, complete_length=len(data))
+
+    response.set_etag(etag)
+    if is_svg:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    if request.args.get('v') == server.building_plan_version:                          # адрес с актуальной версией не меняет содержимого
+        response.cache_control.max_age = current_app.config.get('BUILDING_PLAN_CACHE_MAX_AGE', 31536000)
+        response.cache_control.immutable = True
+    else:                                                                               # адрес без версии — каждый раз сверяем ETag
+        response.cache_control.no_cache = True
+    return response
+
+
+"""Тайл плана здания (см. plan_tiles)"""
+def get_building_plan_tile(id, version, level, col, row):
+    server = LDAPServer.query.get_or_404(id)
+    if not server.has_plan_tiles or version != server.building_plan_version:           # тайлы устаревшей версии не отдаем
+        abort(404)
+
+    path = plan_tile_path(server, level, col, row)
+    if not path:
         abort(404)
-    
-    # Простое имя файла без русских символов
-    filename = 'building_plan'
-    if server.building_plan_filename:
-        # Берем только расширение файла
-        import os
-        _, ext = os.path.splitext(server.building_plan_filename)
-        filename = f'building_plan{ext}'
-    
-    return Response(
-        server.building_plan_data,
-        mimetype=server.building_plan_mimetype,
-        headers={
-            'Content-Disposition': f'inline; filename="{filename}"'
-        }
-    )
 
+    # Адрес содержит версию плана, поэтому содержимое по нему не меняется
+    response = send_file(path, conditional=True, etag=True,
+                         max_age=current_app.config.get('BUILDING_PLAN_CACHE_MAX_AGE', 31536000))
+    response.cache_control.immutable = True
+    return response
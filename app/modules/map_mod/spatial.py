@@ -0,0 +1,139 @@
+"""
+Пространственные запросы к размещенным на карте пользователям.
+
+Координаты хранятся строкой coordinates ("x,y", в пикселях исходного плана) и в числовом
+виде в колонках map_x/map_y. Числовые колонки обновляются автоматически при любой записи
+контакта через ORM и покрыты индексом (server_id, map_x, map_y), поэтому:
+- видимая область карты выбирается диапазонным запросом по индексу, без чтения всех пользователей сервера;
+- ближайшие коллеги ищутся в расширяющемся квадрате вокруг точки, пока не наберется нужное количество.
+"""
+import math
+from app import db
+from app.modules.ldap_mod.models import LDAPUsers
+
+
+VIEWPORT_RESULTS_LIMIT = 2000                                                           # максимум пользователей в ответе для видимой области
+NEAREST_RESULTS_LIMIT = 50                                                              # максимум ближайших коллег
+NEAREST_START_RADIUS = 256                                                              # начальная половина стороны квадрата поиска, px
+MIGRATION_BATCH_SIZE = 500                                                              # сколько контактов обрабатываем за один проход
+
+
+def parse_coordinates(coordinates):
+    """Разбирает строку "x,y" в (x, y). Пустая или некорректная строка -> (None, None)"""
+    if not coordinates:
+        return None, None
+    try:
+        x, y = (float(part) for part in coordinates.split(','))
+    except ValueError:
+        return None, None
+    if not (math.isfinite(x) and math.isfinite(y)):
+        return None, None
+    return x, y
+
+
+# Поддерживаем числовые координаты при любой записи через ORM
+@db.event.listens_for(LDAPUsers, 'before_insert')
+@db.event.listens_for(LDAPUsers, 'before_update')
+def _update_map_position(mapper, connection, target):
+    target.map_x, target.map_y = parse_coordinates(target.coordinates)
+
+
+def rebuild_map_positions():
+    """Заполняет числовые координаты у пользователей, размещенных до их появления"""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(LDAPUsers.id, LDAPUsers.coordinates).filter(
+            LDAPUsers.coordinates.isnot(None),
+            LDAPUsers.map_x.is_(None),
+            LDAPUsers.id > last_id                                                      # некорректные координаты остаются пустыми — не выбираем их повторно
+        ).order_by(LDAPUsers.id).limit(MIGRATION_BATCH_SIZE).all()
+        if not rows:
+            break
+
+        last_id = rows[-1].id
+        values = []
+        for row in rows:
+            x, y = parse_coordinates(row.coordinates)
+            if x is not None:
+                values.append({'user_id': row.id, 'map_x': x, 'map_y': y})
+        if values:
+            db.session.execute(LDAPUsers.__table__.update().where(
+                LDAPUsers.__table__.c.id == db.bindparam('user_id')
+            ), values)
+        db.session.commit()
+        updated += len(values)
+
+    return updated
+
+
+def _placed_users_query(server_id):
+    """Размещенные на карте пользователи сервера (только нужные для карты колонки)"""
+    return db.session.query(
+        LDAPUsers.id,
+        LDAPUsers.cn,
+        LDAPUsers.title,
+        LDAPUsers.department,
+        LDAPUsers.telephone,
+        LDAPUsers.map_x,
+        LDAPUsers.map_y
+    ).filter(
+        LDAPUsers.server_id == server_id,
+        LDAPUsers.is_on_map == True,
+        LDAPUsers.map_x.isnot(None)
+    )
+
+
+def _in_rectangle(query, x1, y1, x2, y2):
+    return query.filter(
+        LDAPUsers.map_x.between(min(x1, x2), max(x1, x2)),
+        LDAPUsers.map_y.between(min(y1, y2), max(y1, y2))
+    )
+
+
+def users_in_viewport(server_id, x1, y1, x2, y2, limit=VIEWPORT_RESULTS_LIMIT):
+    """
+    Возвращает размещенных пользователей внутри прямоугольника (x1, y1)-(x2, y2)
+
+    Returns:
+        tuple: (список строк, True если результат обрезан по limit)
+    """
+    rows = _in_rectangle(_placed_users_query(server_id), x1, y1, x2, y2).order_by(
+        LDAPUsers.map_x, LDAPUsers.map_y
+    ).limit(limit + 1).all()                                                            # на одну запись больше, чтобы понять обрезан ли ответ
+    return rows[:limit], len(rows) > limit
+
+
+def nearest_users(server_id, x, y, limit=10, exclude_id=None):
+    """
+    Возвращает ближайших к точке размещенных пользователей, отсортированных по расстоянию
+
+    Returns:
+        list: [(строка пользователя, расстояние в px)]
+    """
+    if not (math.isfinite(x) and math.isfinite(y)):
+        return []
+
+    query = _placed_users_query(server_id)
+    if exclude_id:
+        query = query.filter(LDAPUsers.id != exclude_id)
+    total, min_x, max_x, min_y, max_y = query.with_entities(
+        db.func.count(), db.func.min(LDAPUsers.map_x), db.func.max(LDAPUsers.map_x),
+        db.func.min(LDAPUsers.map_y), db.func.max(LDAPUsers.map_y)
+    ).one()
+    if not total:
+        return []
+
+    # Квадрат с такой половиной стороны покрывает всех размещенных: дальше расширять некуда
+    max_radius = max(abs(x - min_x), abs(x - max_x), abs(y - min_y), abs(y - max_y))
+    # Точка за пределами размещенных: начинаем с квадрата, который уже до них дотягивается
+    outside = max(min_x - x, x - max_x, min_y - y, y - max_y, 0)
+    radius = outside + NEAREST_START_RADIUS
+    while True:
+        radius = min(radius, max_radius)
+        rows = _in_rectangle(query, x - radius, y - radius, x + radius, y + radius).all()
+        found = sorted(((row, math.hypot(row.map_x - x, row.map_y - y)) for row in rows), key=lambda item: item[1])
+        within = [item for item in found if item[1] <= radius]                         # в квадрате, но дальше radius, могут быть не ближайшими
+        if len(within) >= limit or len(rows) >= total or radius >= max_radius:
+            return (within if len(within) >= limit else found)[:limit]
+        radius *= 2
@@ -242,92 +242,114 @@ document.addEventListener('DOMContentLoaded', function() {
         return marker;
     }
     
-    // Сохранить координаты пользователя
-    async function saveUserCoordinates(userId, coordinates) {
+    // Очередь изменений размещения: сохраняются пакетами одним запросом
+    const BATCH_DELAY = 1500;       // пауза без изменений перед отправкой, мс
+    const BATCH_MAX_SIZE = 50;      // при таком количестве изменений отправляем сразу
+    const batchUrl = mapContainer ? mapContainer.dataset.batchUrl : null;
+    const pendingChanges = new Map();   // id пользователя -> { coordinates, previous }
+    let flushTimer = null;
+
+    // Сохранить координаты пользователя (интерфейс обновляется сразу, запрос — пакетом)
+    function saveUserCoordinates(userId, coordinates) {
+        queueChange(userId, coordinates);
+    }
+
+    // Убрать пользователя с карты
+    function removeUserFromMap(userId) {
+        queueChange(userId, null);
+    }
+
+    function queueChange(userId, coordinates) {
+        userId = Number(userId);            // id из data-атрибутов приходят строками
+        const userItem = document.querySelector(`.user-item[data-user-id="${userId}"]`);
+        const pending = pendingChanges.get(userId);
+        // Запоминаем сохраненное на сервере положение, чтобы вернуть его при ошибке
+        const previous = pending ? pending.previous : (userItem ? userItem.dataset.coordinates || null : null);
+
+        pendingChanges.set(userId, { coordinates: coordinates, previous: previous });
+        updateUserInterface(userId, coordinates);
+
+        clearTimeout(flushTimer);
+        if (pendingChanges.size >= BATCH_MAX_SIZE) {
+            flushChanges();
+        } else {
+            flushTimer = setTimeout(flushChanges, BATCH_DELAY);
+        }
+    }
+
+    // Отправить накопленные изменения одним запросом
+    async function flushChanges(keepalive = false) {
+        clearTimeout(flushTimer);
+        if (!pendingChanges.size || !batchUrl) return;
+
+        const batch = new Map(pendingChanges);
+        pendingChanges.clear();
+        const changes = Array.from(batch, ([userId, change]) => ({ user_id: userId, coordinates: change.coordinates }));
+
         try {
-            const url = `/map/update_coordinates/${userId}`;
-            console.log('Saving coordinates to:', url);
-            
-            const response = await fetch(url, {
+            const response = await fetch(batchUrl, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                     'X-CSRFToken': getCSRFToken()
                 },
-                body: JSON.stringify({ coordinates: coordinates })
+                body: JSON.stringify({ changes: changes }),
+                keepalive: keepalive            // запрос завершится, даже если страницу закрывают
             });
-            
-            console.log('Response status:', response.status, response.statusText);
-            
+
             // Проверяем content-type перед парсингом JSON
             const contentType = response.headers.get('content-type');
-            console.log('Content-Type:', contentType);
-            
             if (!contentType || !contentType.includes('application/json')) {
-                // Читаем текст ответа для отладки
-                const text = await response.text();
-                console.error('Non-JSON response:', text.substring(0, 200));
-                throw new Error(`Сервер вернул HTML вместо JSON. Status: ${response.status}`);
+                throw new Error(`Сервер вернул не JSON ответ. Status: ${response.status}`);
             }
-            
+
             const result = await response.json();
-            console.log('JSON response:', result);
-            
-            if (result.success) {
-                // Обновляем интерфейс
-                updateUserInterface(userId, coordinates);
-                showToast('Координаты сохранены', 'success');
-            } else {
-                showToast('Ошибка сохранения: ' + (result.message || 'Unknown error'), 'error');
+            if (!result.results) {
+                throw new Error(result.message || 'Unknown error');
+            }
+
+            const failed = result.results.filter(item => !item.success);
+            failed.forEach(item => revertChange(item.user_id, batch.get(item.user_id)));
+            if (failed.length) {
+                showToast('Не сохранено: ' + failed.map(item => `${item.user_id} — ${item.message}`).join('; '), 'error');
             }
         } catch (error) {
             console.error('Error:', error);
-            showToast('Ошибка: ' + error.message, 'error');
+            batch.forEach((change, userId) => revertChange(userId, change));
+            showToast('Ошибка сохранения: ' + error.message, 'error');
         }
     }
+
+    // Вернуть сохраненное положение пользователя, если его не успели изменить снова
+    function revertChange(userId, change) {
+        if (!change || pendingChanges.has(userId)) return;
+        updateUserInterface(userId, change.previous);
+    }
+
+    // Сохраняем несохраненные изменения при уходе со страницы
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'hidden') flushChanges(true);
+    });
+    window.addEventListener('pagehide', function() {
+        flushChanges(true);
+    });
     
     // Получить CSRF токен
     function getCSRFToken() {
         const metaTag = document.querySelector('meta[name="csrf-token"]');
         return metaTag ? metaTag.getAttribute('content') : '';
     }
-    
-    // Убрать пользователя с карты
-    async function removeUserFromMap(userId) {
-        try {
-            const response = await fetch(`/map/remove/${userId}`, {
-                method: 'POST',
-                headers: {
-                    'X-CSRFToken': getCSRFToken()
-                }
-            });
-            
-            // Проверяем content-type перед парсингом JSON
-            const contentType = response.headers.get('content-type');
-            if (!contentType || !contentType.includes('application/json')) {
-                throw new Error('Сервер вернул не JSON ответ');
-            }
-            
-            const result = await response.json();
-            
-            if (result.success) {
-                // Удаляем маркер и обновляем интерфейс
-                removeUserMarker(userId);
-                updateUserInterface(userId, null);
-                showToast('Пользователь удален с карты', 'success');
-            } else {
-                showToast('Ошибка удаления', 'error');
-            }
-        } catch (error) {
-            console.error('Error:', error);
-            showToast('Ошибка: ' + error.message, 'error');
-        }
-    }
         
     // Обновить интерфейс пользователя
     function updateUserInterface(userId, coordinates) {
-        const userItem = document.querySelector(`[data-user-id="${userId}"]`);
+        const userItem = document.querySelector(`.user-item[data-user-id="${userId}"]`);
         if (!userItem) return;
+
+        if (coordinates) {
+            userItem.dataset.coordinates = coordinates;
+        } else {
+            delete userItem.dataset.coordinates;
+        }
         
         // Обновляем кнопки
         const findBtn = userItem.querySelector('.btn-find');
@@ -1,6 +1,13 @@
 from flask import render_template, request, jsonify
+from sqlalchemy import update
 from app import db
 from app.modules.ldap_mod.models import LDAPServer, LDAPUsers
+from app.modules.phonebook_mod.page_cache import bump_contacts_version
+from .spatial import parse_coordinates
+
+
+MAX_BATCH_CHANGES = 1000                                                            # максимум изменений в одном пакетном запросе
+
 
 def show_map(server_id):
     """Показать карту здания с пользователями"""
@@ -17,6 +24,7 @@ def update_user_coordinates(user_id):
     if 'coordinates' in data:
         user.coordinates = data['coordinates']
         user.is_on_map = True if data['coordinates'] else False
+        bump_contacts_version()                                                     # is_on_map выводится в телефонной книге
         db.session.commit()
         return jsonify({'success': True, 'message': 'Координаты обновлены'})
     
@@ -38,6 +46,8 @@ def get_users_for_map(server_id):
             'title': user.title,
             'department': user.department,
             'coordinates': user.coordinates,
+            'x': user.map_x,                                                        # координаты числами, разбирать строку не нужно
+            'y': user.map_y,
             'is_on_map': user.is_on_map
         })
     
@@ -48,6 +58,77 @@ def remove_from_map(user_id):
     user = LDAPUsers.query.get_or_404(user_id)
     user.coordinates = None
     user.is_on_map = False
+    bump_contacts_version()
     db.session.commit()
     return jsonify({'success': True, 'message': 'Пользователь удален с карты'})
 
+def _is_user_id(value):
+    """id пользователя из JSON: целое число (true/false в Python тоже int, их не принимаем)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def update_coordinates_batch(server_id):
+    """
+    Пакетное изменение размещения пользователей сервера на карте.
+
+    Тело запроса: {"changes": [{"user_id": 1, "coordinates": "120,45"}, {"user_id": 2, "coordinates": null}, ...]}
+    Пустые coordinates — убрать пользователя с карты. Все допустимые изменения применяются
+    одним UPDATE в одной транзакции, для каждого элемента возвращается свой результат.
+    """
+    LDAPServer.query.get_or_404(server_id)
+    data = request.get_json(silent=True) or {}
+    changes = data.get('changes')
+
+    if not isinstance(changes, list) or not changes:
+        return jsonify({'success': False, 'message': 'Не переданы изменения'}), 400
+    if len(changes) > MAX_BATCH_CHANGES:
+        return jsonify({'success': False, 'message': f'Не больше {MAX_BATCH_CHANGES} изменений за запрос'}), 400
+
+    # Пользователи из запроса, которые принадлежат этому серверу (одним запросом)
+    requested_ids = {change.get('user_id') for change in changes if isinstance(change, dict) and _is_user_id(change.get('user_id'))}
+    server_user_ids = {user_id for (user_id,) in db.session.query(LDAPUsers.id).filter(
+        LDAPUsers.server_id == server_id,
+        LDAPUsers.id.in_(requested_ids)
+    )} if requested_ids else set()
+
+    results = []
+    values = {}                                                                     # id -> новые значения (повторное изменение того же пользователя заменяет предыдущее)
+    for change in changes:
+        user_id = change.get('user_id') if isinstance(change, dict) else None
+        if not _is_user_id(user_id):
+            results.append({'user_id': user_id, 'success': False, 'message': 'Не указан пользователь'})
+            continue
+        if user_id not in server_user_ids:
+            results.append({'user_id': user_id, 'success': False, 'message': 'Пользователь не найден на этом сервере'})
+            continue
+
+        coordinates = change.get('coordinates') or None
+        x, y = parse_coordinates(coordinates) if isinstance(coordinates, str) else (None, None)
+        if coordinates is not None and x is None:
+            results.append({'user_id': user_id, 'success': False, 'message': 'Некорректные координаты'})
+            continue
+
+        # Bulk UPDATE не вызывает ORM события, поэтому числовые координаты задаем сами
+        values[user_id] = {
+            'id': user_id,
+            'coordinates': coordinates,
+            'is_on_map': coordinates is not None,
+            'map_x': x,
+            'map_y': y
+        }
+        results.append({'user_id': user_id, 'success': True,
+                        'message': 'Координаты обновлены' if coordinates else 'Пользователь удален с карты'})
+
+    if values:
+        try:
+            db.session.execute(update(LDAPUsers), list(values.values()))               # один executemany UPDATE по первичному ключу
+            bump_contacts_version()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Ошибка сохранения: {e}'}), 500
+
+    return jsonify({
+        'success': all(result['success'] for result in results),
+        'message': f'Применено изменений: {len(values)} из {len(changes)}',
+        'results': results
+    })
@@ -5,12 +5,40 @@ bp = Blueprint('phonebook', __name__, url_prefix='/phonebook', template_folder='
 
 # Импорт views должен быть после создания blueprint чтобы избежать циклических импортов
 from . import views
+from app.modules.ldap_mod.image_pipeline import current_version as photo_pipeline_version
+
+@bp.url_defaults
+def add_photo_version(endpoint, values):
+    # Ссылка на фото содержит версию обработки: после повторной обработки у фото новый URL
+    if endpoint == 'phonebook.contact_photo':
+        values.setdefault('v', photo_pipeline_version())
 
 @bp.route('/phonebook_index')
 def phonebook_index():
     return views.phonebook_index()
 
+@bp.route('/api/contacts')
+def api_contacts():
+    return views.api_contacts()
+
+@bp.route('/api/lookup')
+def api_lookup_phone():
+    return views.api_lookup_phone()
+
+@bp.route('/photo/<string:photo_hash>')
+@bp.route('/photo/<string:photo_hash>/<int:size>')
+def contact_photo(photo_hash, size=None):
+    return views.contact_photo(photo_hash, size)
+
 @bp.route('/map/<int:server_id>')
 @bp.route('/map/<int:server_id>/<int:user_id>')
 def view_map(server_id, user_id=None):
     return views.view_map(server_id, user_id)
+
+@bp.route('/api/map/<int:server_id>/users')
+def api_map_users(server_id):
+    return views.api_map_users(server_id)
+
+@bp.route('/api/map/<int:server_id>/nearest')
+def api_map_nearest(server_id):
+    return views.api_map_nearest(server_id)
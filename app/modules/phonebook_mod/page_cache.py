@@ -0,0 +1,60 @@
+"""
+Кеш главной страницы телефонной книги.
+
+Контакты меняются только при синхронизации и правках администратора, а страницу открывают
+постоянно. Поэтому данные страницы без поиска (организации, алфавитный указатель, количество
+и уже отрендеренные карточки первой страницы) готовятся один раз на версию данных.
+
+- Версия — счетчик в таблице contacts_version, общий для всех процессов gunicorn.
+  Каждое изменение контактов увеличивает его (bump_contacts_version) в той же транзакции.
+- Ключ кеша содержит версию: после изменения старая запись просто перестает использоваться.
+- Версия служит и ETag страницы: браузер с актуальной копией получает 304 без рендеринга.
+"""
+from flask import current_app, render_template
+from markupsafe import Markup
+from app import db, cache
+from app.modules.ldap_mod.models import ContactsVersion
+from app.modules.ldap_mod.image_pipeline import current_version as photo_pipeline_version
+from .queries import get_contacts_page, count_contacts, get_first_letters, get_organizations
+
+
+VERSION_ROW_ID = 1                                                                      # счетчик хранится в единственной строке
+
+
+def current_contacts_version():
+    """Возвращает текущую версию данных контактов (0, если изменений еще не было)"""
+    version = db.session.query(ContactsVersion.version).filter(ContactsVersion.id == VERSION_ROW_ID).scalar()
+    return version or 0
+
+
+def bump_contacts_version():
+    """
+    Увеличивает версию данных контактов. Вызывается перед commit вместе с изменениями,
+    поэтому новая версия становится видна другим процессам одновременно с ними.
+    """
+    updated = ContactsVersion.query.filter(ContactsVersion.id == VERSION_ROW_ID).update(
+        {'version': ContactsVersion.version + 1}, synchronize_session=False            # атомарный инкремент на стороне БД
+    )
+    if not updated:                                                                     # первое изменение — создаем строку счетчика
+        db.session.add(ContactsVersion(id=VERSION_ROW_ID, version=1))
+
+
+def get_phonebook_page(version):
+    """
+    Возвращает подготовленные данные страницы телефонной книги (без поиска) для версии:
+    из кеша, а если их там нет — собирает из БД и кладет в кеш
+    """
+    key = f'phonebook_page:{version}:{photo_pipeline_version()}'                      # ссылки на фото в карточках содержат версию обработки
+    page = cache.get(key)
+    if page is None:
+        contacts, next_cursor = get_contacts_page(limit=current_app.config.get('PHONEBOOK_PAGE_SIZE', 100))
+        page = {
+            'contacts_html': render_template('phonebook/_contact_cards.html', contacts=contacts),
+            'next_cursor': next_cursor,
+            'letters': get_first_letters(),
+            'organizations': get_organizations(),
+            'total_contacts': count_contacts()
+        }
+        cache.set(key, page, timeout=current_app.config.get('PHONEBOOK_CACHE_TIMEOUT', 86400))
+
+    return dict(page, contacts_html=Markup(page['contacts_html']))
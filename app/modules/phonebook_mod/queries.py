@@ -0,0 +1,107 @@
+"""
+Слой запросов на чтение для публичной телефонной книги.
+
+Все функции возвращают не ORM объекты, а строки (Row) только с нужными колонками:
+контакты вместе с названием организации выбираются одним JOIN запросом,
+а фотографии (таблица contact_photos) в выборку не попадают вообще.
+"""
+from app import db
+from app.modules.ldap_mod.models import LDAPUsers, LDAPServer
+from .search import search_contacts
+import base64
+import json
+
+
+UNKNOWN_ORGANIZATION = 'Неизвестно'                                                     # подпись для контактов без сервера
+
+
+def contacts_query():
+    """Базовый запрос контактов с названием организации (без фотографий)"""
+    return db.session.query(
+        LDAPUsers.id,
+        LDAPUsers.server_id,
+        LDAPUsers.cn,
+        LDAPUsers.mail,
+        LDAPUsers.telephone,
+        LDAPUsers.mobile,
+        LDAPUsers.title,
+        LDAPUsers.department,
+        LDAPUsers.is_on_map,
+        LDAPUsers.photo_hash,                                                           # только хеш фото, сами данные не читаем
+        db.func.coalesce(LDAPServer.name, UNKNOWN_ORGANIZATION).label('organization')
+    ).outerjoin(LDAPServer, LDAPServer.id == LDAPUsers.server_id)
+
+
+def get_phonebook_contacts(search_query=None):
+    """Возвращает список контактов для телефонной книги: все по имени или найденные по релевантности"""
+    if search_query:
+        return search_contacts(contacts_query(), search_query)
+
+    return contacts_query().order_by(LDAPUsers.cn, LDAPUsers.id).all()
+
+
+def encode_cursor(cn, user_id):
+    """Упаковывает позицию (cn, id) последнего контакта страницы в непрозрачную строку"""
+    raw = json.dumps([cn, user_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Распаковывает курсор обратно в (cn, id). Некорректный курсор -> ValueError"""
+    try:
+        cn, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(cn), int(user_id)
+    except Exception:
+        raise ValueError('Некорректный курсор')
+
+
+def get_contacts_page(cursor=None, organization=None, limit=100):
+    """
+    Возвращает одну страницу контактов и курсор следующей страницы.
+
+    Используется keyset пагинация по (cn, id): следующая страница начинается строго
+    после последнего контакта предыдущей, поэтому стоимость запроса не зависит от номера страницы.
+    """
+    query = contacts_query()
+
+    if organization:
+        query = query.filter(LDAPServer.name == organization)
+
+    if cursor:
+        after_cn, after_id = decode_cursor(cursor)
+        query = query.filter(
+            db.tuple_(LDAPUsers.cn, LDAPUsers.id) > db.tuple_(after_cn, after_id)           # сравнение строк (cn, id) > (...) — поиск по индексу, а не обход с начала
+        )
+
+    rows = query.order_by(LDAPUsers.cn, LDAPUsers.id).limit(limit + 1).all()       # берем на одну запись больше, чтобы понять есть ли продолжение
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].cn, rows[-1].id)
+
+    return rows, next_cursor
+
+
+def count_contacts(organization=None):
+    """Возвращает общее количество контактов (с учетом фильтра по организации)"""
+    query = db.session.query(db.func.count(LDAPUsers.id))
+    if organization:
+        query = query.join(LDAPServer, LDAPServer.id == LDAPUsers.server_id).filter(LDAPServer.name == organization)
+    return query.scalar()
+
+
+def get_first_letters():
+    """Возвращает отсортированный список первых букв имен для алфавитного указателя"""
+    rows = db.session.query(db.func.substr(LDAPUsers.cn, 1, 1)).distinct().all()
+    return sorted({row[0].upper() for row in rows if row[0]})                            # upper в Python, т.к. SQLite не умеет кириллицу
+
+
+def get_organizations():
+    """Возвращает отсортированный список названий организаций для фильтра"""
+    organizations = db.session.query(LDAPServer.name).distinct().filter(
+        LDAPServer.name.isnot(None),
+        LDAPServer.name != ''
+    ).order_by(LDAPServer.name).all()
+
+    return [org[0] for org in organizations if org[0]]
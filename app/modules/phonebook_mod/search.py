@@ -0,0 +1,158 @@
+"""
+Поиск по телефонной книге.
+
+Для каждого контакта хранится нормализованная строка search_text (нижний регистр, ё -> е),
+собранная из имени, почты, телефона, должности и отдела. Она обновляется автоматически
+при любой записи контакта через ORM.
+
+- В PostgreSQL по search_text построен GIN индекс pg_trgm, поэтому LIKE '%...%' не требует
+  полного просмотра таблицы, а результаты ранжируются через word_similarity.
+- В остальных БД (SQLite при тестовых запусках) используется триграммный индекс в памяти процесса.
+"""
+import threading
+from sqlalchemy import text
+from app import db
+from app.modules.ldap_mod.models import LDAPUsers
+
+
+SEARCH_FIELDS = ('cn', 'mail', 'telephone', 'title', 'department')                    # поля, по которым ищем
+SEARCH_RESULTS_LIMIT = 500                                                              # максимум результатов поиска
+
+
+def normalize_search_text(value):
+    """Приводит строку к виду для поиска: casefold, ё -> е, одиночные пробелы"""
+    if not value:
+        return ''
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+def build_search_text(values):
+    """Собирает поисковую строку из словаря значений полей контакта"""
+    parts = (normalize_search_text(values.get(field)) for field in SEARCH_FIELDS)
+    return ' '.join(part for part in parts if part)
+
+
+def _query_tokens(search_query):
+    """Разбивает поисковый запрос на нормализованные слова"""
+    return normalize_search_text(search_query).split()
+
+
+# Поддерживаем search_text в актуальном состоянии при любой записи через ORM
+@db.event.listens_for(LDAPUsers, 'before_insert')
+@db.event.listens_for(LDAPUsers, 'before_update')
+def _update_search_text(mapper, connection, target):
+    target.search_text = build_search_text({field: getattr(target, field) for field in SEARCH_FIELDS})
+
+
+# Любое изменение контактов делает индекс в памяти устаревшим
+@db.event.listens_for(LDAPUsers, 'after_insert')
+@db.event.listens_for(LDAPUsers, 'after_update')
+@db.event.listens_for(LDAPUsers, 'after_delete')
+def _mark_fallback_index_dirty(mapper, connection, target):
+    invalidate_search_index()
+
+
+def ensure_search_extension():
+    """Включает расширение pg_trgm (нужно до создания триграммного индекса)"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+
+
+def rebuild_search_text():
+    """Заполняет search_text у контактов, сохраненных до появления поиска"""
+    users = LDAPUsers.query.filter(LDAPUsers.search_text.is_(None)).all()
+    for user in users:
+        user.search_text = build_search_text({field: getattr(user, field) for field in SEARCH_FIELDS})
+    if users:
+        db.session.commit()
+    return len(users)
+
+
+class TrigramIndex:
+    """
+    Простой триграммный индекс в памяти: триграмма -> множество id контактов.
+    Используется вместо pg_trgm, когда БД не PostgreSQL.
+    """
+
+    def __init__(self, rows):
+        self.texts = {}                                                                 # id -> search_text
+        self.postings = {}                                                              # триграмма -> {id}
+        for user_id, search_text in rows:
+            search_text = search_text or ''
+            self.texts[user_id] = search_text
+            for trigram in self.trigrams(search_text):
+                self.postings.setdefault(trigram, set()).add(user_id)
+
+    @staticmethod
+    def trigrams(value):
+        return {value[i:i + 3] for i in range(len(value) - 2)}
+
+    def search(self, tokens, limit=SEARCH_RESULTS_LIMIT):
+        """Возвращает id контактов, содержащих все слова запроса, по убыванию релевантности"""
+        candidates = None
+        query_trigrams = set()
+        for token in tokens:
+            token_trigrams = self.trigrams(token)
+            query_trigrams |= token_trigrams
+            if not token_trigrams:                                                      # слово короче 3 символов — отбор только проверкой подстроки
+                continue
+            ids = set.intersection(*(self.postings.get(t, set()) for t in token_trigrams))
+            candidates = ids if candidates is None else candidates & ids
+
+        if candidates is None:
+            candidates = self.texts.keys()
+
+        scored = []
+        for user_id in candidates:
+            search_text = self.texts[user_id]
+            if all(token in search_text for token in tokens):
+                text_trigrams = self.trigrams(search_text) or {search_text}
+                score = len(query_trigrams & text_trigrams) / len(text_trigrams)
+                starts = search_text.startswith(tokens[0])                              # совпадение с начала имени выше
+                scored.append((not starts, -score, user_id))
+
+        scored.sort()
+        return [user_id for _, _, user_id in scored[:limit]]
+
+
+_fallback_index = None
+_fallback_lock = threading.Lock()
+
+
+def invalidate_search_index():
+    """Сбрасывает индекс в памяти (перестроится при следующем поиске)"""
+    global _fallback_index
+    _fallback_index = None
+
+
+def _get_fallback_index():
+    global _fallback_index
+    with _fallback_lock:
+        if _fallback_index is None:
+            rows = db.session.query(LDAPUsers.id, LDAPUsers.search_text).all()
+            _fallback_index = TrigramIndex(rows)
+        return _fallback_index
+
+
+def search_contacts(query, search_query, limit=SEARCH_RESULTS_LIMIT):
+    """
+    Применяет поиск к запросу контактов (см. queries.contacts_query)
+    и возвращает найденные строки в порядке релевантности
+    """
+    tokens = _query_tokens(search_query)
+    if not tokens:
+        return []
+
+    if db.engine.dialect.name == 'postgresql':
+        for token in tokens:
+            query = query.filter(LDAPUsers.search_text.contains(token, autoescape=True))  # LIKE '%...%' обслуживается GIN индексом
+        rank = db.func.word_similarity(' '.join(tokens), LDAPUsers.search_text)
+        return query.order_by(rank.desc(), LDAPUsers.cn, LDAPUsers.id).limit(limit).all()
+
+    ids = _get_fallback_index().search(tokens, limit)
+    if not ids:
+        return []
+    rows = {row.id: row for row in query.filter(LDAPUsers.id.in_(ids)).all()}
+    return [rows[user_id] for user_id in ids if user_id in rows]
@@ -31,81 +31,131 @@ function initializeContacts() {
     const contactCards = cardsContainer.querySelectorAll('.contact-card');
     
     // Сохраняем данные каждой карточки
-    originalContactsData = Array.from(contactCards).map(card => ({
-        html: card.outerHTML,
-        name: card.getAttribute('data-name') || '',
-        email: card.getAttribute('data-email') || '',
+    originalContactsData = Array.from(contactCards).map(extractContactData);
+}
+
+/**
+ * Извлекает данные карточки контакта для клиентской фильтрации
+ * (карточка остается в DOM, фильтр только скрывает или показывает ее колонку)
+ */
+function extractContactData(card) {
+    return {
+        column: card.parentElement,
+        name: (card.getAttribute('data-name') || '').toLowerCase(),
+        email: (card.getAttribute('data-email') || '').toLowerCase(),
         phone: card.getAttribute('data-phone') || '',
         mobile: card.getAttribute('data-mobile') || '',
-        title: card.getAttribute('data-title') || '',
-        department: card.getAttribute('data-department') || '',
+        title: (card.getAttribute('data-title') || '').toLowerCase(),
+        department: (card.getAttribute('data-department') || '').toLowerCase(),
         organization: card.getAttribute('data-organization') || ''
-    }));
+    };
 }
 
 /**
- * Основная функция фильтрации контактов
- * Динамически перестраивает DOM на основе фильтров
+ * Текущие значения фильтров
  */
-function filterContacts() {
-    const searchInput = document.getElementById('searchInput');
-    const organizationFilter = document.getElementById('organizationFilter');
-    const resultsCounter = document.getElementById('resultsCounter');
-    const noResults = document.getElementById('noResults');
-    const cardsContainer = document.getElementById('contacts-cards-container');
-    
-    const searchText = searchInput.value.toLowerCase();
-    const organizationValue = organizationFilter.value;
-    
+function currentFilter() {
+    const searchText = document.getElementById('searchInput').value.toLowerCase();
+    return {
+        searchText: searchText,
+        transliteratedText: transliterateToRussian(searchText),     // Транслитерируем введенный текст
+        organization: document.getElementById('organizationFilter').value
+    };
+}
+
+/**
+ * Подходит ли контакт под фильтры
+ */
+function matchesFilter(contactData, filter) {
+    const { searchText, transliteratedText } = filter;
+    const organization = contactData.organization.toLowerCase();
+
+    const matchesSearch = searchText === '' || 
+        contactData.name.includes(searchText) ||
+        contactData.name.includes(transliteratedText) ||
+        contactData.email.includes(searchText) ||
+        contactData.email.includes(transliteratedText) ||
+        contactData.phone.includes(searchText) ||
+        contactData.phone.includes(transliteratedText) ||
+        contactData.mobile.includes(searchText) ||
+        contactData.mobile.includes(transliteratedText) ||
+        contactData.title.includes(searchText) ||
+        contactData.title.includes(transliteratedText) ||
+        contactData.department.includes(searchText) ||
+        contactData.department.includes(transliteratedText) ||
+        organization.includes(searchText) ||
+        organization.includes(transliteratedText);
+    
+    const matchesOrganization = filter.organization === '' || 
+        contactData.organization === filter.organization;
+
+    return matchesSearch && matchesOrganization;
+}
+
+/**
+ * Показывает или скрывает карточки и возвращает количество показанных
+ */
+function applyFilter(contacts, filter) {
     let visibleCount = 0;
+    contacts.forEach(contactData => {
+        const visible = matchesFilter(contactData, filter);
+        contactData.column.style.display = visible ? '' : 'none';
+        if (visible) visibleCount++;
+    });
+    return visibleCount;
+}
 
-    
-    
-    // Создаем новый контейнер для карточек
-    const newContainer = document.createElement('div');
-    newContainer.className = 'row';
-    newContainer.id = 'contacts-cards-container';
-    
-    // Фильтруем оригинальные данные
-    originalContactsData.forEach(contactData => {
-        const transliteratedText = transliterateToRussian(searchText);      // Транслитерируем введенный текст
-
-        const matchesSearch = searchText === '' || 
-            contactData.name.toLowerCase().includes(searchText) ||
-            contactData.name.toLowerCase().includes(transliteratedText) ||
-            contactData.email.toLowerCase().includes(searchText) ||
-            contactData.email.toLowerCase().includes(transliteratedText) ||
-            contactData.phone.includes(searchText) ||
-            contactData.phone.includes(transliteratedText) ||
-            contactData.mobile.includes(searchText) ||
-            contactData.mobile.includes(transliteratedText) ||
-            contactData.title.toLowerCase().includes(searchText) ||
-            contactData.title.toLowerCase().includes(transliteratedText) ||
-            contactData.department.toLowerCase().includes(searchText) ||
-            contactData.department.toLowerCase().includes(transliteratedText) ||
-            contactData.organization.toLowerCase().includes(searchText) ||
-            contactData.organization.toLowerCase().includes(transliteratedText);
-        
-        const matchesOrganization = organizationValue === '' || 
-            contactData.organization === organizationValue;
-        
-        // Если карточка подходит под фильтры
-        if (matchesSearch && matchesOrganization) {
-            // Создаем элемент из сохраненного HTML
-            const colDiv = document.createElement('div');
-            colDiv.className = 'col-md-6 col-lg-4 mb-4';
-            colDiv.innerHTML = contactData.html;
-            
-            newContainer.appendChild(colDiv);
-            visibleCount++;
+let visibleContactsCount = 0;
+
+/**
+ * Постраничная подгрузка остальных контактов через JSON API
+ * Страницы запрашиваются последовательно по курсору, пока сервер его возвращает.
+ * Карточки новой страницы добавляются в конец списка, фильтр применяется только к ним.
+ */
+async function loadRemainingContacts() {
+    const loader = document.getElementById('contactsLoader');
+    if (!loader) return;
+
+    const url = loader.getAttribute('data-url');
+    let cursor = loader.getAttribute('data-next-cursor');
+
+    while (cursor) {
+        try {
+            const response = await fetch(`${url}?format=html&cursor=${encodeURIComponent(cursor)}`);
+            const result = await response.json();
+            if (!result.success) {
+                console.error('Ошибка загрузки контактов:', result.message);
+                return;
+            }
+
+            const template = document.createElement('template');
+            template.innerHTML = result.html;
+            const pageContacts = Array.from(template.content.querySelectorAll('.contact-card')).map(extractContactData);
+
+            visibleContactsCount += applyFilter(pageContacts, currentFilter());
+            originalContactsData.push(...pageContacts);
+            document.getElementById('contacts-cards-container').appendChild(template.content);
+
+            cursor = result.next_cursor;
+            loader.setAttribute('data-next-cursor', cursor || '');
+
+            updateUI(visibleContactsCount);
+        } catch (error) {
+            console.error('Ошибка загрузки контактов:', error);
+            return;
         }
-    });
-    
-    // Заменяем старый контейнер новым
-    cardsContainer.parentNode.replaceChild(newContainer, cardsContainer);
+    }
+}
+
+/**
+ * Основная функция фильтрации контактов
+ * Скрывает карточки, не подходящие под фильтры (DOM не перестраивается)
+ */
+function filterContacts() {
+    visibleContactsCount = applyFilter(originalContactsData, currentFilter());
     
     // Обновляем UI
-    updateUI(visibleCount);
+    updateUI(visibleContactsCount);
 }
 
 /**
@@ -172,6 +222,7 @@ document.addEventListener('DOMContentLoaded', function() {
         initializeContacts();
         setupEventListeners();
         filterContacts(); // Первоначальное отображение
+        loadRemainingContacts(); // Подгружаем остальные страницы
         
     }, 100);
 });
@@ -1,6 +1,14 @@
-from flask import render_template, request, flash, redirect, url_for
+import math
+from flask import render_template, request, flash, redirect, url_for, abort, Response, jsonify, current_app, make_response, session
+from markupsafe import Markup
 from app import db
 from app.modules.ldap_mod.models import LDAPUsers, LDAPServer
+from .queries import get_phonebook_contacts, get_organizations
+from .queries import get_contacts_page, get_first_letters
+from .page_cache import current_contacts_version, get_phonebook_page
+from app.modules.ldap_mod.phones import lookup_by_phone, normalize_phone, MIN_SUFFIX_DIGITS
+from app.modules.ldap_mod.photo_store import get_photo
+from app.modules.map_mod.spatial import users_in_viewport, nearest_users, NEAREST_RESULTS_LIMIT
 
 def phonebook_index():
     """
@@ -9,69 +17,164 @@ def phonebook_index():
     try:
         # Параметры поиска
         search_query = request.args.get('search', '').strip()
-        
-        # Базовый запрос
-        query = LDAPUsers.query.order_by(LDAPUsers.cn)
-        
-        # Применяем поиск (если нужно серверный поиск)
+
         if search_query:
-            query = query.filter(
-                (LDAPUsers.cn.ilike(f'%{search_query}%')) |
-                (LDAPUsers.mail.ilike(f'%{search_query}%')) |
-                (LDAPUsers.telephone.ilike(f'%{search_query}%')) |
-                (LDAPUsers.title.ilike(f'%{search_query}%')) |
-                (LDAPUsers.department.ilike(f'%{search_query}%'))  # Добавляем поиск по отделу
-            )
-        
-        # Получаем контакты
-        contacts = query.all()
-        
-        # Добавляем информацию об организации к каждому контакту
-        contacts_with_org = []
-        for contact in contacts:
-            server = LDAPServer.query.get(contact.server_id)
-            # Добавляем organization как атрибут контакта
-            contact.organization = server.name if server else 'Неизвестно'
-            contacts_with_org.append(contact)
-        
-        # Получаем уникальные организации для фильтра
-        organizations = db.session.query(LDAPServer.name).distinct().filter(
-            LDAPServer.name.isnot(None),
-            LDAPServer.name != ''
-        ).order_by(LDAPServer.name).all()
-        
-        organizations = [org[0] for org in organizations if org[0]]
-        
-        return render_template('phonebook/index.html',
-                             contacts=contacts_with_org,  # Теперь передаем обычные контакты
-                             search_query=search_query,
-                             organizations=organizations,
-                             total_contacts=len(contacts))
+            # Результаты поиска отдаем целиком (не кешируются — зависят от запроса)
+            contacts = get_phonebook_contacts(search_query)
+            return render_template('phonebook/index.html',
+                                 contacts_html=Markup(render_template('phonebook/_contact_cards.html', contacts=contacts)),
+                                 next_cursor=None,
+                                 letters=get_first_letters(),
+                                 search_query=search_query,
+                                 organizations=get_organizations(),
+                                 total_contacts=len(contacts))
+
+        # Без поиска страница зависит только от версии данных контактов (и от того, вошел ли пользователь — навбар)
+        version = current_contacts_version()
+        etag = f'phonebook-{version}-{1 if session.get("user_id") else 0}'
+        if request.if_none_match.contains_weak(etag) and '_flashes' not in session:    # у браузера актуальная копия — ничего не рендерим
+            response = Response(status=304)
+        else:
+            # Первая страница уже отрендерена в кеше, остальное браузер подгрузит через API
+            response = make_response(render_template('phonebook/index.html',
+                                                     search_query=search_query,
+                                                     **get_phonebook_page(version)))
+
+        response.set_etag(etag, weak=True)                                              # weak: в странице есть CSRF токен сессии
+        response.cache_control.private = True
+        response.cache_control.no_cache = True                                          # браузер каждый раз сверяет версию
+        response.vary.add('Cookie')
+        return response
         
     except Exception as e:
         # Упрощенная обработка ошибок
         flash(f'Ошибка загрузки телефонной книги: {e}', 'danger')
         return redirect(url_for('main.index'))  # Перенаправляем на главную
 
+def api_contacts():
+    """
+    JSON API постраничной выдачи контактов (keyset пагинация по (cn, id))
+
+    Параметры запроса:
+        cursor: курсор из next_cursor предыдущей страницы (для первой страницы не указывается)
+        organization: название организации для фильтрации
+        limit: размер страницы (не больше PHONEBOOK_PAGE_SIZE_MAX)
+        format: html — вместо полей контактов вернуть готовые карточки (для подгрузки на странице)
+    """
+    cursor = request.args.get('cursor') or None
+    organization = request.args.get('organization', '').strip() or None
+    max_limit = current_app.config.get('PHONEBOOK_PAGE_SIZE_MAX', 500)
+    limit = request.args.get('limit', current_app.config.get('PHONEBOOK_PAGE_SIZE', 100), type=int)
+    limit = max(1, min(limit, max_limit))
+
+    try:
+        contacts, next_cursor = get_contacts_page(cursor=cursor, organization=organization, limit=limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    if request.args.get('format') == 'html':
+        return jsonify({
+            'success': True,
+            'html': render_template('phonebook/_contact_cards.html', contacts=contacts),
+            'next_cursor': next_cursor
+        })
+
+    return jsonify({
+        'success': True,
+        'contacts': [{
+            'id': contact.id,
+            'server_id': contact.server_id,
+            'cn': contact.cn,
+            'mail': contact.mail,
+            'telephone': contact.telephone,
+            'mobile': contact.mobile,
+            'title': contact.title,
+            'department': contact.department,
+            'organization': contact.organization,
+            'is_on_map': contact.is_on_map,
+            'photo_url': url_for('phonebook.contact_photo', photo_hash=contact.photo_hash, size=128) if contact.photo_hash else None
+        } for contact in contacts],
+        'next_cursor': next_cursor
+    })
+
+def api_lookup_phone():
+    """
+    Обратный поиск контакта по номеру телефона (для АТС / caller ID)
+
+    Параметры запроса:
+        number: номер в любом формате
+        suffix: сравнивать только последние N цифр (если не указан — точное совпадение)
+    """
+    number = request.args.get('number', '').strip()
+    suffix = request.args.get('suffix', type=int)
+
+    if not number:
+        return jsonify({'success': False, 'message': 'Не указан номер'}), 400
+    if suffix is not None and suffix < MIN_SUFFIX_DIGITS:
+        return jsonify({'success': False, 'message': f'Минимальная длина окончания номера: {MIN_SUFFIX_DIGITS}'}), 400
+    if suffix is not None and len(normalize_phone(number)) < suffix:
+        return jsonify({'success': False, 'message': f'В номере меньше {suffix} цифр'}), 400
+
+    matches = lookup_by_phone(number, suffix_digits=suffix)
+
+    return jsonify({
+        'success': True,
+        'contacts': [{
+            'id': match.id,
+            'cn': match.cn,
+            'title': match.title,
+            'department': match.department,
+            'organization': match.organization,
+            'telephone': match.telephone,
+            'mobile': match.mobile,
+            'matched_field': match.kind,
+            'matched_number': match.digits
+        } for match in matches]
+    })
+
+def _photo_etag(photo_hash, size, version):
+    """ETag фото: хеш исходника, размер и версия обработки"""
+    return f'{photo_hash}-{size or 0}-v{version}'
+
+def contact_photo(photo_hash, size=None):
+    """
+    Отдает фотографию контакта по хешу исходника (size — уменьшенный квадратный вариант).
+
+    Сохраненные байты определяются хешем исходника и версией обработки (параметр v, его
+    добавляет url_for). URL с актуальной версией адресует конкретное содержимое, поэтому
+    браузер может кешировать ответ бессрочно. Ссылку без версии или со старой версией
+    браузер кеширует только со сверкой по ETag.
+    """
+    max_age = current_app.config.get('PHOTO_CACHE_MAX_AGE', 31536000)
+    version = request.args.get('v', type=int)
+
+    # Содержимое этой версии не меняется: если у браузера есть копия, БД не трогаем
+    if version is not None and request.if_none_match.contains(_photo_etag(photo_hash, size, version)):
+        response = Response(status=304)
+        stored_version = version
+    else:
+        photo = get_photo(photo_hash, size)
+        if not photo:
+            abort(404)
+        data, mimetype, stored_version = photo
+        response = Response(data, mimetype=mimetype or 'image/jpeg')
+
+    response.set_etag(_photo_etag(photo_hash, size, stored_version))
+    if stored_version == version:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 def view_map(server_id, user_id=None):
     """
     Показать карту здания только для просмотра (без возможности редактирования)
     """
     server = LDAPServer.query.get_or_404(server_id)
     
-    # Получаем всех пользователей для этого сервера и преобразуем в словари
-    users = LDAPUsers.query.filter_by(server_id=server_id).all()
-    users_data = []
-    for user in users:
-        users_data.append({
-            'id': user.id,
-            'cn': user.cn,
-            'coordinates': user.coordinates,
-            'title': user.title,
-            'department': user.department
-        })
-    
-    # Если указан user_id, находим этого пользователя для подсветки
+    # На странице показывается только подсвеченный пользователь, остальных карта запрашивает по видимой области (api_map_users)
     highlight_user_data = None
     if user_id:
         user = LDAPUsers.query.get(user_id)
@@ -80,11 +183,84 @@ def view_map(server_id, user_id=None):
                 'id': user.id,
                 'cn': user.cn,
                 'coordinates': user.coordinates,
+                'x': user.map_x,
+                'y': user.map_y,
                 'title': user.title,
                 'department': user.department
             }
     
     return render_template('phonebook/map_view.html',
                         server=server,
-                        users=users_data,
                         highlight_user=highlight_user_data)
+
+def _map_user_json(row, distance=None):
+    """Пользователь на карте для JSON ответа"""
+    data = {
+        'id': row.id,
+        'cn': row.cn,
+        'title': row.title,
+        'department': row.department,
+        'telephone': row.telephone,
+        'x': row.map_x,
+        'y': row.map_y
+    }
+    if distance is not None:
+        data['distance'] = round(distance, 1)
+    return data
+
+def _finite_float(value):
+    """float() без inf и nan (координаты из запроса)"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f'Некорректная координата: {value}')
+    return number
+
+def api_map_users(server_id):
+    """
+    Пользователи, размещенные в видимой области карты
+
+    Параметры запроса:
+        x1, y1, x2, y2: углы прямоугольника в пикселях плана
+    """
+    try:
+        x1, y1, x2, y2 = (_finite_float(request.args[name]) for name in ('x1', 'y1', 'x2', 'y2'))
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'message': 'Укажите область: x1, y1, x2, y2'}), 400
+
+    users, truncated = users_in_viewport(server_id, x1, y1, x2, y2)
+    return jsonify({
+        'success': True,
+        'users': [_map_user_json(user) for user in users],
+        'truncated': truncated                                                          # в области больше пользователей, чем отдано
+    })
+
+def api_map_nearest(server_id):
+    """
+    Ближайшие к точке коллеги на карте
+
+    Параметры запроса:
+        x, y: точка в пикселях плана
+        user_id: вместо точки — место этого пользователя (сам он в ответ не попадает)
+        limit: сколько коллег вернуть (не больше NEAREST_RESULTS_LIMIT)
+    """
+    user_id = request.args.get('user_id', type=int)
+    limit = max(1, min(request.args.get('limit', 10, type=int), NEAREST_RESULTS_LIMIT))
+
+    if user_id:
+        user = db.session.query(LDAPUsers.map_x, LDAPUsers.map_y).filter(
+            LDAPUsers.id == user_id, LDAPUsers.server_id == server_id
+        ).first()
+        if not user or user.map_x is None:
+            return jsonify({'success': False, 'message': 'Пользователь не размещен на карте'}), 404
+        x, y = user.map_x, user.map_y
+    else:
+        x = request.args.get('x', type=_finite_float)
+        y = request.args.get('y', type=_finite_float)
+        if x is None or y is None:
+            return jsonify({'success': False, 'message': 'Укажите точку (x, y) или user_id'}), 400
+
+    nearest = nearest_users(server_id, x, y, limit=limit, exclude_id=user_id)
+    return jsonify({
+        'success': True,
+        'users': [_map_user_json(user, distance) for user, distance in nearest]
+    })
@@ -1,12 +1,44 @@
 from flask_apscheduler import APScheduler
 import os
 import fcntl
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Создаем глобальный экземпляр планировщика APScheduler
 # APScheduler предоставляет расширенные возможности планирования задач
 # Глобальная переменная позволяет обращаться к планировщику из других модулей
 scheduler = APScheduler()
 
+def sync_server_isolated(app, server_id, started_at, timeout):
+    """
+    Синхронизирует один сервер в отдельном потоке.
+
+    Args:
+        app: Экземпляр Flask приложения
+        server_id: ID сервера LDAP
+        started_at: словарь, куда записывается время начала (для контроля таймаута)
+        timeout: через сколько секунд от начала синхронизация прерывается и откатывается
+
+    Returns:
+        tuple: (success, message, длительность в секундах)
+
+    У каждого потока свой контекст приложения, а значит и своя сессия БД,
+    которая закрывается по завершении, даже если синхронизация упала.
+    """
+    started = started_at[server_id] = time.monotonic()
+    with app.app_context():
+        from app import db
+        from app.modules.ldap_mod.views import sync_ldap_contacts
+        try:
+            success, message = sync_ldap_contacts(server_id, deadline=started + timeout)
+        except Exception as e:
+            db.session.rollback()
+            success, message = False, str(e)
+        finally:
+            db.session.remove()
+    return success, message, time.monotonic() - started
+
+
 def sync_all_servers(app):
     """
     Основная функция синхронизации всех активных LDAP серверов.
@@ -16,41 +48,72 @@ def sync_all_servers(app):
     
     Функция выполняет:
     1. Получение всех активных LDAP серверов из базы данных 
-    2. Последовательную синхронизацию каждого сервера
-    3. Логирование результатов синхронизации
+    2. Параллельную синхронизацию серверов, которым пора синхронизироваться (не более LDAP_SYNC_MAX_WORKERS одновременно)
+    3. Логирование результатов и длительности синхронизации каждого сервера
+
+    Медленный или недоступный сервер не задерживает остальные серверы (каждый в своем потоке).
+    Потоки Python нельзя прервать снаружи, поэтому LDAP_SYNC_TIMEOUT_SECONDS соблюдает сама синхронизация:
+    после этого срока она останавливается на следующей записи LDAP и откатывает изменения,
+    а ожидание ответа LDAP ограничено LDAP_NETWORK_TIMEOUT. Значит, поток сервера завершается
+    не позже чем через LDAP_SYNC_TIMEOUT_SECONDS + LDAP_NETWORK_TIMEOUT (плюс запись одной пачки),
+    и задача дожидается всех потоков — следующий запуск не пересекается с зависшими синхронизациями.
+    Если процесс все же упал посреди синхронизации, блокировку сервера снимет LDAP_SYNC_LOCK_TTL_SECONDS.
     """
     # Создаем контекст Flask приложения для работы с БД и другими компонентами
     # Контекст необходим для доступа к моделям SQLAlchemy и конфигурации
     with app.app_context():
         # Импортируем модели и функции внутри функции для избежания циклических импортов
         # Это стандартная практика в Flask для предотвращения проблем с импортами
-        from app.modules.ldap_mod.models import LDAPServer
-        from app.modules.ldap_mod.views import sync_ldap_contacts
+        from app.modules.ldap_mod.sync_state import due_servers
         
-        # Получаем все активные серверы из базы данных
-        # Фильтруем только те серверы, у которых is_active=True
-        active_servers = LDAPServer.query.filter_by(is_active=True).all()
+        # Получаем активные серверы, которым пора синхронизироваться
+        # (серверы с ошибками пропускают запуски, пока не истечет их задержка)
+        active_servers = [(server.id, server.name) for server in due_servers()]
         
         # Логируем начало процесса синхронизации
         app.logger.info(f"Начинаем синхронизацию {len(active_servers)} активных серверов")
-        
-        # Проходим по каждому активному серверу и выполняем синхронизацию
-        for server in active_servers:
+
+    if not active_servers:
+        return
+
+    max_workers = min(app.config['LDAP_SYNC_MAX_WORKERS'], len(active_servers))
+    timeout = app.config['LDAP_SYNC_TIMEOUT_SECONDS']
+    started = time.monotonic()
+    started_at = {}                                                         # server_id -> время начала синхронизации
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ldap_sync')
+    futures = {executor.submit(sync_server_isolated, app, server_id, started_at, timeout): (server_id, name) for server_id, name in active_servers}
+
+    pending = set(futures)
+    overdue = set()                                                         # о превышении таймаута сообщаем один раз
+    while pending:
+        done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = futures[future][1]
             try:
-                # Вызываем функцию синхронизации для конкретного сервера
-                # Функция sync_ldap_contacts возвращает кортеж (success, message)
-                success, message = sync_ldap_contacts(server.id)
-                
-                # Логируем результат синхронизации в зависимости от успешности
-                if success:
-                    app.logger.info(f"Сервер {server.name}: {message}")
-                else:
-                    app.logger.error(f"Сервер {server.name}: {message}")
-                    
+                success, message, duration = future.result()
             except Exception as e:
                 # Ловим любые исключения и логируем ошибку
                 # Это предотвращает падение всей синхронизации из-за ошибки одного сервера
-                app.logger.error(f"Ошибка сервера {server.name}: {e}")
+                app.logger.error(f"Ошибка сервера {name}: {e}")
+                continue
+
+            # Логируем результат синхронизации в зависимости от успешности
+            if success:
+                app.logger.info(f"Сервер {name}: {message} ({duration:.1f} с)")
+            else:
+                app.logger.error(f"Сервер {name}: {message} ({duration:.1f} с)")
+
+        # Синхронизация дольше таймаута прервется сама (см. выше), ждем ее остановки
+        now = time.monotonic()
+        for future in pending - overdue:
+            server_id, name = futures[future]
+            if server_id in started_at and now - started_at[server_id] > timeout:
+                app.logger.warning(f"Сервер {name}: синхронизация не уложилась в {timeout} с, ожидаем ее остановки")
+                overdue.add(future)
+
+    executor.shutdown(wait=True)
+
+    app.logger.info(f"Синхронизация {len(active_servers)} серверов заняла {time.monotonic() - started:.1f} с")
 
 def init_scheduler(app):
     """
@@ -103,6 +166,8 @@ def init_scheduler(app):
                 args=[app],                       # Аргументы для функции - передаем app
                 trigger='interval',               # Тип триггера - интервальный
                 minutes=app.config['LDAP_SYNC_INTERVAL_MINUTES'],  # Интервал в минутах из конфига
+                max_instances=1,                  # Не запускаем задачу, пока не завершилась предыдущая
+                coalesce=True,                    # Пропущенные запуски выполняем один раз, а не пачкой
                 replace_existing=True             # Заменяем существующую задачу с таким же ID
             )
             app.logger.info("✅ Задача синхронизации LDAP добавлена в планировщик")
@@ -0,0 +1,133 @@
+// Тайловый показ больших планов зданий (тайлы строит сервер, см. ldap_mod/plan_tiles.py)
+//
+// Элемент .plan-tiles имеет размер исходного плана, поэтому координаты маркеров,
+// клики и масштабирование через transform работают так же, как с <img>.
+// Загружаются только тайлы, попадающие в видимую часть #map-container, и только
+// того уровня пирамиды, который соответствует текущему масштабу.
+(function() {
+    'use strict';
+
+    const MARGIN_TILES = 1;     // сколько тайлов подгружать за краем видимой области
+
+    function PlanTiles(element) {
+        this.element = element;
+        this.container = element.closest('#map-container') || element.parentElement;
+        this.url = element.dataset.tilesUrl;                // шаблон адреса с {z}/{x}/{y}
+        this.width = Number(element.dataset.width);
+        this.height = Number(element.dataset.height);
+        this.tileSize = Number(element.dataset.tileSize);
+        this.tiles = new Map();                             // "уровень/столбец/строка" -> <img>
+        this.wanted = new Set();
+        this.scheduled = false;
+
+        // Последний уровень пирамиды целиком помещается в один тайл
+        this.maxLevel = 0;
+        while (Math.max(this.width, this.height) / Math.pow(2, this.maxLevel) > this.tileSize) {
+            this.maxLevel++;
+        }
+
+        const schedule = () => this.schedule();
+        this.container.addEventListener('scroll', schedule, { passive: true });
+        this.container.addEventListener('wheel', schedule, { passive: true });
+        window.addEventListener('resize', schedule);
+        // Масштаб меняется через style.transform
+        new MutationObserver(schedule).observe(element, { attributes: true, attributeFilter: ['style'] });
+
+        this.update();
+    }
+
+    // Пересчет не чаще одного раза за кадр
+    PlanTiles.prototype.schedule = function() {
+        if (this.scheduled) return;
+        this.scheduled = true;
+        requestAnimationFrame(() => {
+            this.scheduled = false;
+            this.update();
+        });
+    };
+
+    // Уровень, у которого пиксель тайла примерно равен пикселю экрана
+    PlanTiles.prototype.levelFor = function(scale) {
+        const density = scale * (window.devicePixelRatio || 1);
+        const level = Math.floor(Math.log2(1 / density));
+        return Math.max(0, Math.min(this.maxLevel, level));
+    };
+
+    PlanTiles.prototype.update = function() {
+        const rect = this.element.getBoundingClientRect();
+        if (!rect.width) return;
+        const scale = rect.width / this.width;
+        const view = this.container.getBoundingClientRect();
+
+        // Видимая часть плана в пикселях исходного плана
+        const left = Math.max(0, (view.left - rect.left) / scale);
+        const top = Math.max(0, (view.top - rect.top) / scale);
+        const right = Math.min(this.width, (view.right - rect.left) / scale);
+        const bottom = Math.min(this.height, (view.bottom - rect.top) / scale);
+        if (right <= left || bottom <= top) return;
+
+        const level = this.levelFor(scale);
+        const span = this.tileSize * Math.pow(2, level);   // сторона тайла уровня в пикселях исходного плана
+        const lastCol = Math.ceil(this.width / span) - 1;
+        const lastRow = Math.ceil(this.height / span) - 1;
+        const firstCol = Math.max(0, Math.floor(left / span) - MARGIN_TILES);
+        const firstRow = Math.max(0, Math.floor(top / span) - MARGIN_TILES);
+        const endCol = Math.min(lastCol, Math.floor(right / span) + MARGIN_TILES);
+        const endRow = Math.min(lastRow, Math.floor(bottom / span) + MARGIN_TILES);
+
+        const wanted = new Set();
+        const loads = [];
+        for (let col = firstCol; col <= endCol; col++) {
+            for (let row = firstRow; row <= endRow; row++) {
+                const key = `${level}/${col}/${row}`;
+                wanted.add(key);
+                if (!this.tiles.has(key)) {
+                    loads.push(this.addTile(key, level, col, row, span));
+                }
+            }
+        }
+        this.wanted = wanted;
+
+        // Ненужные тайлы убираем, когда загрузились новые (чтобы не мигал пустой фон)
+        Promise.all(loads).then(() => this.prune());
+    };
+
+    PlanTiles.prototype.addTile = function(key, level, col, row, span) {
+        const tile = document.createElement('img');
+        tile.className = 'plan-tile';
+        tile.alt = '';
+        tile.draggable = false;
+        tile.style.cssText = `
+            position: absolute;
+            left: ${col * span}px;
+            top: ${row * span}px;
+            width: ${Math.min(span, this.width - col * span)}px;
+            height: ${Math.min(span, this.height - row * span)}px;
+            z-index: ${this.maxLevel - level};
+            pointer-events: none;
+        `;
+        const loaded = new Promise(resolve => {
+            tile.onload = resolve;
+            tile.onerror = resolve;
+        });
+        tile.src = this.url.replace('{z}', level).replace('{x}', col).replace('{y}', row);
+        this.element.appendChild(tile);
+        this.tiles.set(key, tile);
+        return loaded;
+    };
+
+    PlanTiles.prototype.prune = function() {
+        this.tiles.forEach((tile, key) => {
+            if (!this.wanted.has(key)) {
+                tile.remove();
+                this.tiles.delete(key);
+            }
+        });
+    };
+
+    document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('.plan-tiles').forEach(element => {
+            element.planTiles = new PlanTiles(element);
+        });
+    });
+})();
@@ -0,0 +1,9 @@
+"""
+Бенчмарки. Запуск из корня проекта: python -m bench.<имя>
+"""
+import os
+
+# Config читает окружение при импорте, поэтому значения задаются до импорта приложения
+os.environ.setdefault('TIME_ZONE_OFFSET', '0')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['LDAP_SYNC_ENABLED'] = 'false'
@@ -0,0 +1,80 @@
+"""
+Общая часть бенчмарков: приложение с отдельной БД и замер времени.
+
+По умолчанию используется временный файл SQLite. Чтобы мерить на PostgreSQL,
+укажите пустую БД в BENCH_DATABASE_URL (таблицы в ней будут созданы и очищены).
+"""
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.config import Config
+
+
+_tmp_dir = tempfile.mkdtemp(prefix='phonebook-bench-')
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('BENCH_DATABASE_URL', f'sqlite:///{os.path.join(_tmp_dir, "phonebook.db")}')
+    SESSION_FILE_DIR = os.path.join(_tmp_dir, 'sessions')
+    LDAP_BROWSE_CACHE_PATH = os.path.join(_tmp_dir, 'ldap_browse.sqlite')
+    BUILDING_PLAN_TILE_DIR = os.path.join(_tmp_dir, 'plan_tiles')
+
+
+def create_bench_app():
+    """Создает приложение на БД бенчмарка и очищает в ней таблицы"""
+    app = create_app(BenchConfig)
+    with app.app_context():
+        clear_tables()
+    return app
+
+
+def clear_tables():
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.commit()
+
+
+def analyze():
+    """Обновляет статистику планировщика после заполнения таблиц"""
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+class StatementCounter:
+    """Считает SQL запросы, отправленные в БД внутри блока with"""
+
+    def __init__(self):
+        self.count = 0
+
+    def _before_cursor_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+
+def measure(func, arguments):
+    """Вызывает func для каждого набора аргументов, возвращает (время вызовов в мс, результаты)"""
+    timings = []
+    results = []
+    for args in arguments:
+        started = time.perf_counter()
+        results.append(func(*args))
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, results
+
+
+def summary(timings):
+    """Среднее, медиана и 95-й перцентиль в мс"""
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f'avg {statistics.mean(ordered):8.3f}  p50 {statistics.median(ordered):8.3f}  p95 {p95:8.3f}'
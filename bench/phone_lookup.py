@@ -0,0 +1,84 @@
+"""
+Бенчмарк обратного поиска по номеру телефона (ldap_user_phones).
+
+Заполняет БД контактами с номерами в разных форматах и замеряет lookup_by_phone:
+точный номер, поиск по последним цифрам и несуществующий номер. Для сравнения
+замеряется прежний способ — LIKE '%номер%' по полю telephone (полный просмотр таблицы).
+
+Запуск из корня проекта:
+    python -m bench.phone_lookup [--contacts 100000] [--queries 1000]
+"""
+import argparse
+import random
+
+from bench.common import create_bench_app, analyze, measure, summary
+from app import db
+from app.modules.ldap_mod.models import LDAPServer, LDAPUsers, LDAPUserPhone
+from app.modules.ldap_mod.phones import lookup_by_phone, rebuild_phone_index
+
+
+PHONE_FORMATS = ('8 ({0}) {1}-{2}-{3}', '+7 {0} {1} {2} {3}', '7{0}{1}{2}{3}')          # как номера встречаются в AD
+
+
+def format_phone(number, rng):
+    digits = f'{number:010d}'
+    return rng.choice(PHONE_FORMATS).format(digits[:3], digits[3:6], digits[6:8], digits[8:])
+
+
+def seed(contacts, rng):
+    server = LDAPServer(name='Организация', host='ldap.local')
+    db.session.add(server)
+    db.session.flush()
+
+    numbers = rng.sample(range(3830000000, 3839999999), contacts * 2)
+    rows = [{
+        'guid': f'guid-{index:08d}',
+        'server_id': server.id,
+        'cn': f'Сотрудник {index:08d}',
+        'telephone': format_phone(numbers[index * 2], rng),
+        'mobile': format_phone(numbers[index * 2 + 1], rng) if index % 3 == 0 else None,
+    } for index in range(contacts)]
+    for start in range(0, len(rows), 5000):
+        db.session.execute(LDAPUsers.__table__.insert(), rows[start:start + 5000])
+    db.session.commit()
+    rebuild_phone_index()
+    analyze()
+    return [row['telephone'] for row in rows]
+
+
+def legacy_lookup(number):
+    """Прежний поиск: подстрока в свободном формате поля telephone"""
+    return LDAPUsers.query.filter(LDAPUsers.telephone.ilike(f'%{number}%')).limit(20).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    app = create_bench_app()
+    with app.app_context():
+        phones = seed(args.contacts, rng)
+        print(f'{db.engine.dialect.name}: контактов {args.contacts}, номеров в индексе {LDAPUserPhone.query.count()}')
+
+        sample = rng.sample(phones, args.queries)
+        cases = [
+            ('точный номер', lookup_by_phone, [(phone,) for phone in sample]),
+            ('последние 4 цифры', lookup_by_phone, [(phone, 4) for phone in sample]),
+            ('последние 7 цифр', lookup_by_phone, [(phone, 7) for phone in sample]),
+            ('нет такого номера', lookup_by_phone, [('+7 999 000 00 00',)] * args.queries),
+            ('прежний LIKE по telephone', legacy_lookup, [(phone,) for phone in sample[:max(1, args.queries // 20)]]),
+        ]
+        print(f'{"запрос":28} {"вызовов":>8}  {"время, мс":40}  {"найдено":>8}')
+        for name, func, arguments in cases:
+            measure(func, arguments[:10])                                               # прогрев
+            timings, results = measure(func, arguments)
+            found = sum(len(result) for result in results) / len(results)
+            print(f'{name:28} {len(arguments):8}  {summary(timings)}  {found:8.2f}')
+
+
+if __name__ == '__main__':
+    main()
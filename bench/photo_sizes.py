@@ -0,0 +1,78 @@
+"""
+Бенчмарк обработки фотографий контактов (image_pipeline.process_photo).
+
+Для типичных источников фото (thumbnailPhoto из AD, загруженный портрет, снимок с камеры)
+генерирует изображения и показывает, сколько байт на контакт занимает исходник,
+что сохраняется после обработки (основное фото и варианты) и сколько отдается
+браузеру на странице телефонной книги (вариант 128px вместо исходника).
+
+Запуск из корня проекта:
+    python -m bench.photo_sizes [--contacts 20]
+"""
+import argparse
+import random
+import statistics
+import time
+from io import BytesIO
+
+from PIL import Image, ImageFilter
+
+from app.modules.ldap_mod.image_pipeline import process_photo, PHOTO_VARIANT_SIZES
+
+
+PAGE_VARIANT = 128                                                                      # размер фото в карточке телефонной книги
+PROFILES = (                                                                            # (название, ширина, высота, качество JPEG)
+    ('thumbnailPhoto AD 96x96', 96, 96, 90),
+    ('портрет 600x800', 600, 800, 90),
+    ('камера 4000x3000', 4000, 3000, 92),
+)
+
+
+def make_photo(width, height, quality, rng):
+    """JPEG, похожий на фотографию: плавный фон, пятна и шум сенсора"""
+    small = Image.new('RGB', (16, 12))
+    small.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(16 * 12)])
+    image = small.resize((width, height), Image.BICUBIC).filter(ImageFilter.GaussianBlur(max(1, width // 200)))
+    noise = Image.effect_noise((width, height), 24).convert('RGB')
+    image = Image.blend(image, noise, 0.12)
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=20, help='фото каждого вида')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f'{"источник":26} {"исходник":>10} {"сохранено":>10} {"в т.ч. варианты":>16} {"экономия":>10} '
+          f'{"отдается":>9} {"экономия":>10} {"обработка":>10}')
+    print(f'{"":26} {"байт":>10} {"байт":>10} {"байт":>16} {"хранение":>10} '
+          f'{"128px":>9} {"трафик":>10} {"мс":>10}')
+    for name, width, height, quality in PROFILES:
+        original, stored, variants, served, timings = [], [], [], [], []
+        for _ in range(args.contacts):
+            data = make_photo(width, height, quality, rng)
+            started = time.perf_counter()
+            main_data, _, photo_variants = process_photo(data)
+            timings.append((time.perf_counter() - started) * 1000)
+            variants_size = sum(len(variant) for variant, _ in photo_variants.values())
+            original.append(len(data))
+            stored.append(len(main_data) + variants_size)
+            variants.append(variants_size)
+            served.append(len(photo_variants[PAGE_VARIANT][0]) if PAGE_VARIANT in photo_variants else len(main_data))
+
+        mean = statistics.mean
+        print(f'{name:26} {mean(original):10.0f} {mean(stored):10.0f} {mean(variants):16.0f} '
+              f'{mean(original) - mean(stored):10.0f} {mean(served):9.0f} {mean(original) - mean(served):10.0f} '
+              f'{mean(timings):10.1f}')
+
+    print(f'\nВарианты: {", ".join(f"{size}px" for size in PHOTO_VARIANT_SIZES)}. '
+          'Экономия хранения — исходник минус все сохраненные данные фото, '
+          'трафика — исходник минус фото, отдаваемое в карточке.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Бенчмарк записи синхронизации LDAP: пакетный upsert против записи через ORM.
+
+Каталог LDAP эмулируется ldap3 MOCK_SYNC. Для каждого способа записи выполняются
+первичная загрузка каталога и повторная полная синхронизация, перед которой у части
+записей изменена должность, а часть удалена. Показываются общее время синхронизации
+(в том числе чтение из mock каталога), время записи контактов в БД (upsert_users и
+delete_users) и число SQL запросов.
+
+Путь через ORM — запасной вариант upsert_users для БД без INSERT ... ON CONFLICT
+(по контакту: поиск по guid и INSERT/UPDATE при flush).
+
+Запуск из корня проекта:
+    python -m bench.sync_bulk [--entries 50000] [--changed 0.1] [--deleted 0.01]
+"""
+import argparse
+import time
+import uuid
+
+from ldap3 import Server, Connection, MOCK_SYNC, OFFLINE_AD_2012_R2, MODIFY_REPLACE
+
+from bench.common import create_bench_app, clear_tables, StatementCounter
+from app import db
+from app.modules.ldap_mod import bulk, views
+from app.modules.ldap_mod.ldap_class import LDAPManager
+from app.modules.ldap_mod.models import LDAPServer, LDAPUsers
+
+
+BASE_DN = 'dc=bench,dc=local'
+
+
+def build_directory(entries):
+    """MOCK_SYNC соединение с каталогом из entries пользователей"""
+    server = Server('mock', get_info=OFFLINE_AD_2012_R2)
+    connection = Connection(server, user=f'cn=admin,{BASE_DN}', password='secret', client_strategy=MOCK_SYNC)
+    connection.strategy.add_entry(f'cn=admin,{BASE_DN}', {'objectClass': 'top', 'userPassword': 'secret'})
+    for number in range(entries):
+        connection.strategy.add_entry(f'cn=user{number},{BASE_DN}', {
+            'objectClass': 'person',
+            'cn': f'Сотрудник {number:06d}',
+            'mail': f'user{number}@bench.local',
+            'telephoneNumber': f'+7 383 {number:07d}',
+            'title': 'Инженер',
+            'department': f'Отдел {number % 50}',
+            'objectGUID': uuid.UUID(int=number + 1).bytes_le,
+        })
+    connection.bind()
+    return connection
+
+
+def change_directory(connection, entries, changed, deleted):
+    """Меняет должность у доли changed записей и удаляет долю deleted"""
+    step = max(1, round(1 / changed)) if changed else None
+    for number in range(0, entries, step) if step else ():
+        connection.modify(f'cn=user{number},{BASE_DN}', {'title': [(MODIFY_REPLACE, ['Ведущий инженер'])]})
+    step = max(1, round(1 / deleted)) if deleted else None
+    for number in range(1, entries, step) if step else ():
+        connection.delete(f'cn=user{number},{BASE_DN}')
+
+
+def timed(func, timings):
+    """Обертка, которая добавляет время вызовов func в список timings"""
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings.append(time.perf_counter() - started)
+    return wrapper
+
+
+def run_sync(server_id, full=False):
+    """Синхронизация: (общее время, время записи контактов в БД, число запросов, сообщение)"""
+    counter = StatementCounter()
+    write_timings = []
+    upsert_users, delete_users = views.upsert_users, views.delete_users
+    views.upsert_users, views.delete_users = timed(upsert_users, write_timings), timed(delete_users, write_timings)
+    started = time.perf_counter()
+    try:
+        with counter:
+            success, message = views.sync_ldap_contacts(server_id, full=full)
+    finally:
+        views.upsert_users, views.delete_users = upsert_users, delete_users
+    elapsed = time.perf_counter() - started
+    if not success:
+        raise RuntimeError(message)
+    return elapsed, sum(write_timings), counter.count, message
+
+
+def bench_mode(name, args):
+    connection = build_directory(args.entries)
+
+    def connect(self):                                                                  # менеджеры синхронизации подключаются к mock каталогу
+        self.connection = connection
+        return True, 'ok'
+
+    LDAPManager.connect = connect
+    LDAPManager.disconnect = lambda self, discard=False: None
+
+    clear_tables()
+    server = LDAPServer(name='Bench', host='mock', port=389, base_dn=BASE_DN, bind_login='admin',
+                        bind_password='secret', search_filter='(objectClass=person)')
+    db.session.add(server)
+    db.session.commit()
+
+    results = [('первичная загрузка', *run_sync(server.id))]
+    change_directory(connection, args.entries, args.changed, args.deleted)
+    results.append(('повторная синхронизация', *run_sync(server.id, full=True)))
+
+    for stage, elapsed, write, statements, message in results:
+        print(f'{name:6} {stage:24} {elapsed:9.2f} {write:9.2f} {statements:10}  {message}')
+    print(f'{name:6} контактов в БД: {LDAPUsers.query.count()}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=50000)
+    parser.add_argument('--changed', type=float, default=0.1, help='доля измененных записей')
+    parser.add_argument('--deleted', type=float, default=0.01, help='доля удаленных записей')
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    with app.app_context():
+        print(f'{db.engine.dialect.name}: записей в LDAP {args.entries}')
+        print(f'{"запись":6} {"этап":24} {"всего, с":>9} {"запись, с":>9} {"запросов":>10}  результат')
+        bench_mode('bulk', args)
+
+        upsert_statement = bulk._upsert_statement
+        bulk._upsert_statement = lambda update_server=False: None                     # запасной путь через ORM
+        try:
+            bench_mode('ORM', args)
+        finally:
+            bulk._upsert_statement = upsert_statement
+
+
+if __name__ == '__main__':
+    main()
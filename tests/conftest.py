@@ -0,0 +1,137 @@
+"""
+Общие фикстуры тестов.
+
+Приложение создается один раз на сессию с временной БД SQLite (или с БД из TEST_DATABASE_URL,
+например PostgreSQL). После каждого теста все таблицы очищаются, кеш сбрасывается.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+_tmp_dir = tempfile.mkdtemp(prefix='phonebook-tests-')
+
+# Config читает окружение при импорте, поэтому значения задаются до импорта приложения
+os.environ.setdefault('TIME_ZONE_OFFSET', '0')
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('ADMIN_USERNAME', 'admin')
+os.environ.setdefault('ADMIN_PASSWORD', 'admin')
+os.environ['LDAP_SYNC_ENABLED'] = 'false'
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db, cache
+from app.config import Config
+from app.modules.ldap_mod.models import LDAPServer, LDAPUsers, ContactPhoto
+from app.modules.phonebook_mod.search import build_search_text, invalidate_search_index
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', f'sqlite:///{os.path.join(_tmp_dir, "phonebook.db")}')
+    SESSION_FILE_DIR = os.path.join(_tmp_dir, 'sessions')
+    LDAP_BROWSE_CACHE_PATH = os.path.join(_tmp_dir, 'ldap_browse.sqlite')
+    BUILDING_PLAN_TILE_DIR = os.path.join(_tmp_dir, 'plan_tiles')
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture(autouse=True)
+def _clean_database(app):
+    yield
+    db.session.rollback()
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.commit()
+    db.session.expunge_all()
+    cache.clear()
+    invalidate_search_index()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(app):
+    """Клиент с выполненным входом администратора"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    return client
+
+
+@pytest.fixture
+def count_queries(app):
+    """
+    Считает SQL запросы внутри блока:
+
+        with count_queries() as statements:
+            ...
+        assert len(statements) == 3
+    """
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    return counter
+
+
+def insert_contacts(count, servers=3, photo_every=5, **values):
+    """
+    Быстро создает count контактов на servers серверах (Core insert, без ORM событий).
+    Каждый photo_every-й контакт получает фото. Возвращает список id серверов.
+    """
+    server_ids = []
+    for number in range(servers):
+        server = LDAPServer(name=f'Организация {number}', host=f'ldap{number}.local', base_dn='dc=test,dc=local')
+        db.session.add(server)
+        db.session.flush()
+        server_ids.append(server.id)
+
+    photo_hash = None
+    if photo_every:
+        photo_hash = 'a' * 64
+        db.session.add(ContactPhoto(hash=photo_hash, data=b'\xff\xd8 test', mimetype='image/jpeg', size=7))
+        db.session.flush()
+
+    rows = []
+    for number in range(count):
+        row = {
+            'guid': f'guid-{number:08d}',
+            'server_id': server_ids[number % servers],
+            'cn': f'Сотрудник {number:08d}',
+            'mail': f'user{number}@test.local',
+            'telephone': f'+7 495 {number:07d}',
+            'mobile': None,
+            'title': 'Инженер',
+            'department': f'Отдел {number % 7}',
+            'photo_hash': photo_hash if photo_every and number % photo_every == 0 else None,
+            'is_on_map': False,
+        }
+        row.update(values)
+        row['search_text'] = build_search_text(row)
+        rows.append(row)
+
+    for start in range(0, len(rows), 5000):
+        db.session.execute(LDAPUsers.__table__.insert(), rows[start:start + 5000])
+    db.session.commit()
+    cache.clear()
+    invalidate_search_index()
+    return server_ids
@@ -0,0 +1,24 @@
+"""Кеш снимков каталога LDAP: версия по содержимому и ограничение размера."""
+from app.modules.ldap_mod.browse_cache import save_snapshot, load_snapshot, load_snapshot_page
+
+
+def _users(count):
+    return [{'guid': f'guid-{number:04d}', 'cn': f'Сотрудник {number:04d}', 'photo': bytes(100)} for number in range(count)]
+
+
+def test_same_directory_in_any_order_gets_same_version(app):
+    users = _users(1200)
+    snapshot_id = save_snapshot(1, iter(users))
+
+    assert save_snapshot(1, reversed(users)) == snapshot_id
+    assert load_snapshot_page(1, snapshot_id, 2, 500)[1] == 1200
+    assert load_snapshot(1, snapshot_id, ['guid-0007'])['guid-0007']['cn'] == 'Сотрудник 0007'
+
+
+def test_oversized_snapshot_is_not_stored(app, monkeypatch, caplog):
+    monkeypatch.setitem(app.config, 'LDAP_BROWSE_CACHE_MAX_BYTES', 10_000)
+    small_id = save_snapshot(1, iter(_users(10)))
+
+    assert save_snapshot(2, iter(_users(1000))) is None
+    assert 'не сохранен' in caplog.text
+    assert load_snapshot_page(1, small_id, 1, 100)[1] == 10                             # прежние снимки не вытеснены
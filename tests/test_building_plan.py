@@ -0,0 +1,48 @@
+"""План здания сервера: отдача файла и заполнение вычисляемых колонок."""
+import gzip
+
+from app import db
+from app.modules.ldap_mod.building_plan import set_building_plan, rebuild_building_plan_metadata, SVG_MIMETYPE
+from app.modules.ldap_mod.models import LDAPServer
+
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg">' + b'<rect width="10" height="10"/>' * 200 + b'</svg>'
+
+
+def _add_server(name='Организация'):
+    server = LDAPServer(name=name, host='ldap.local', base_dn='dc=test,dc=local')
+    db.session.add(server)
+    return server
+
+
+def test_svg_detected_by_extension_is_served_gzipped(client):
+    server = _add_server()
+    set_building_plan(server, SVG, filename='plan.svg')
+    server.building_plan_mimetype = 'application/octet-stream'                          # план загружен до нормализации типа
+    db.session.commit()
+
+    response = client.get(f'/ldap/server/{server.id}/building_plan', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert response.mimetype == SVG_MIMETYPE
+    assert response.content_encoding == 'gzip'
+    assert gzip.decompress(response.data) == SVG
+
+
+def test_rebuild_checks_each_plan_once(app, count_queries):
+    server = _add_server()
+    server.building_plan_data = b'<svg/>'                                               # не сжимается gzip — сжатой копии не будет
+    server.building_plan_filename = 'plan.svg'
+    server.building_plan_mimetype = SVG_MIMETYPE
+    broken = _add_server('Другая организация')
+    broken.building_plan_data = b'not an image'                                         # не разбирается — размеров не будет
+    broken.building_plan_filename = 'plan.png'
+    broken.building_plan_mimetype = 'image/png'
+    db.session.commit()
+
+    assert rebuild_building_plan_metadata() == 2
+    assert db.session.get(LDAPServer, server.id).building_plan_gzip is None
+
+    with count_queries() as statements:
+        assert rebuild_building_plan_metadata() == 0                                    # при следующем запуске планы уже не читаются
+    assert len(statements) == 1
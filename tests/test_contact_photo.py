@@ -0,0 +1,53 @@
+"""Фото контактов: URL содержит версию обработки, бессрочно кешируется только актуальная версия."""
+from io import BytesIO
+
+from PIL import Image
+
+from app import db
+from app.modules.ldap_mod.image_pipeline import PIPELINE_VERSION
+from app.modules.ldap_mod.models import ContactPhoto, LDAPServer, LDAPUsers
+from app.modules.ldap_mod.photo_store import photo_hash, build_missing_variants
+
+
+def _jpeg(size=400):
+    buffer = BytesIO()
+    Image.new('RGB', (size, size), (200, 120, 40)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def _add_unprocessed_contact():
+    """Контакт с фото, сохраненным до обработки (как после установки Pillow на старую базу)"""
+    data = _jpeg()
+    digest = photo_hash(data)
+    server = LDAPServer(name='Организация', host='ldap.local', base_dn='dc=test,dc=local')
+    db.session.add(server)
+    db.session.add(ContactPhoto(hash=digest, data=data, mimetype='image/jpeg', size=len(data), pipeline_version=0))
+    db.session.flush()
+    db.session.add(LDAPUsers(cn='Сотрудник', server_id=server.id, photo_hash=digest))
+    db.session.commit()
+    return digest, data
+
+
+def test_reprocessed_photo_gets_new_url(client):
+    digest, data = _add_unprocessed_contact()
+    old_url = f'/phonebook/photo/{digest}/128?v=0'
+
+    build_missing_variants()
+
+    photo = db.session.get(ContactPhoto, digest)
+    assert photo.pipeline_version == PIPELINE_VERSION
+    assert photo.size < len(data)
+
+    photo_url = client.get('/phonebook/api/contacts').get_json()['contacts'][0]['photo_url']
+    assert photo_url == f'/phonebook/photo/{digest}/128?v={PIPELINE_VERSION}'
+    response = client.get(photo_url)
+    assert response.status_code == 200
+    assert response.cache_control.immutable
+
+    response = client.get(old_url)                                                      # ссылка из старой страницы: байты уже другие
+    assert response.status_code == 200
+    assert not response.cache_control.immutable
+    assert response.cache_control.no_cache
+
+    response = client.get(photo_url, headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
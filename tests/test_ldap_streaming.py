@@ -0,0 +1,135 @@
+"""
+Синхронизация обрабатывает каталог LDAP потоком: страницы запрашиваются по мере чтения
+(paged results с cookie), а контакты пишутся в БД пачками, не накапливаясь целиком в памяти.
+"""
+import inspect
+import uuid
+
+import pytest
+from ldap3 import Server, Connection, MOCK_SYNC, OFFLINE_AD_2012_R2
+
+from app import db
+from app.modules.ldap_mod import views as ldap_views
+from app.modules.ldap_mod.bulk import BULK_BATCH_SIZE
+from app.modules.ldap_mod.ldap_class import LDAPManager
+from app.modules.ldap_mod.models import LDAPServer, LDAPUsers
+
+
+ENTRIES = 50000
+PAGE_SIZE = 1000
+BASE_DN = 'dc=test,dc=local'
+
+
+@pytest.fixture(scope='module')
+def ldap_connection():
+    server = Server('mock', get_info=OFFLINE_AD_2012_R2)
+    connection = Connection(server, user=f'cn=admin,{BASE_DN}', password='secret', client_strategy=MOCK_SYNC)
+    connection.strategy.add_entry(f'cn=admin,{BASE_DN}', {'objectClass': 'top', 'userPassword': 'secret'})
+    for number in range(ENTRIES):
+        connection.strategy.add_entry(f'cn=user{number},{BASE_DN}', {
+            'objectClass': 'person',
+            'cn': f'user{number}',
+            'mail': f'user{number}@test.local',
+            'telephoneNumber': f'+7 495 {number:07d}',
+            'objectGUID': uuid.UUID(int=number + 1).bytes_le,
+        })
+    connection.bind()
+    return connection
+
+
+@pytest.fixture
+def search_calls(ldap_connection, monkeypatch):
+    """Подключает менеджеры к mock серверу и записывает параметры каждого запроса поиска"""
+    calls = []
+    search = ldap_connection.search
+    signature = inspect.signature(search)
+
+    def recording_search(*args, **kwargs):
+        arguments = signature.bind(*args, **kwargs).arguments
+        calls.append({'paged_size': arguments.get('paged_size'), 'paged_cookie': arguments.get('paged_cookie')})
+        return search(*args, **kwargs)
+
+    def connect(self):
+        self.connection = ldap_connection
+        return True, 'ok'
+
+    monkeypatch.setattr(ldap_connection, 'search', recording_search)
+    monkeypatch.setattr(LDAPManager, 'connect', connect)
+    monkeypatch.setattr(LDAPManager, 'disconnect', lambda self, discard=False: None)
+    return calls
+
+
+def test_iter_users_requests_pages_lazily(ldap_connection, search_calls):
+    manager = LDAPManager('mock', 'admin', 'secret', BASE_DN, page_size=PAGE_SIZE)
+    manager.connect()
+
+    users = manager.iter_users()
+    assert inspect.isgenerator(users)
+    assert search_calls == []                                                           # до чтения ничего не запрашивается
+
+    first = next(users)
+    assert first['guid']
+    assert len(search_calls) == 1                                                       # первая запись отдана после первой страницы
+
+    total = 1 + sum(1 for _ in users)
+    assert total == ENTRIES
+    assert ENTRIES // PAGE_SIZE <= len(search_calls) <= ENTRIES // PAGE_SIZE + 1      # последняя страница может прийти пустой
+    assert all(call['paged_size'] == PAGE_SIZE for call in search_calls)
+    assert search_calls[0]['paged_cookie'] is None
+    assert all(call['paged_cookie'] for call in search_calls[1:])                     # следующие страницы — по cookie предыдущей
+
+
+def test_sync_writes_batches_while_reading_pages(app, ldap_connection, search_calls, monkeypatch):
+    app.config['LDAP_PAGE_SIZE'] = PAGE_SIZE
+    server = LDAPServer(name='Mock', host='mock', port=389, base_dn=BASE_DN, bind_login='admin',
+                        bind_password='secret', search_filter='(objectClass=person)')
+    db.session.add(server)
+    db.session.commit()
+
+    batches = []                                                                        # (размер пачки, сколько страниц уже запрошено)
+    upsert_users = ldap_views.upsert_users
+
+    def recording_upsert(rows, *args, **kwargs):
+        batches.append((len(rows), len(search_calls)))
+        return upsert_users(rows, *args, **kwargs)
+
+    monkeypatch.setattr(ldap_views, 'upsert_users', recording_upsert)
+
+    success, message = ldap_views.sync_ldap_contacts(server.id)
+    assert success, message
+    assert LDAPUsers.query.filter_by(server_id=server.id).count() == ENTRIES
+
+    pages = ENTRIES // PAGE_SIZE
+    assert sum(size for size, _ in batches) == ENTRIES
+    assert max(size for size, _ in batches) <= BULK_BATCH_SIZE                        # в памяти не больше одной пачки
+    assert batches[0][1] == 1                                                           # первая пачка записана до второй страницы
+    assert len([1 for _, seen in batches if seen < pages]) >= pages - 1                # запись идет вперемешку с чтением страниц
+
+
+class _RecordingPool:
+    """Пул из одного mock соединения, запоминающий, как соединение вернули"""
+    def __init__(self, connection):
+        self.connection = connection
+        self.released = []
+
+    def acquire(self, key, factory):
+        return self.connection
+
+    def release(self, key, connection, discard=False):
+        self.released.append(discard)
+
+
+@pytest.mark.parametrize('read_all', [True, False])
+def test_abandoned_search_is_not_returned_to_pool(ldap_connection, read_all):
+    pool = _RecordingPool(ldap_connection)
+    manager = LDAPManager('mock', 'admin', 'secret', BASE_DN, page_size=PAGE_SIZE, pool=pool)
+    manager.connect()
+
+    users = manager.iter_users()
+    if read_all:
+        assert sum(1 for _ in users) == ENTRIES
+    else:
+        next(users)                                                                     # поиск брошен после первой страницы
+    manager.disconnect()
+
+    assert pool.released == [not read_all]
@@ -0,0 +1,120 @@
+"""Синхронизация контактов с LDAP: отбор измененных записей по времени."""
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+from ldap3 import Server, Connection, MOCK_SYNC, OFFLINE_AD_2012_R2
+
+from app import db
+from app.modules.ldap_mod.ldap_class import LDAPManager
+from app.modules.ldap_mod.models import LDAPServer, LDAPUsers, ContactPhoto
+from app.modules.ldap_mod.photo_store import store_photo
+from app.modules.ldap_mod.views import sync_ldap_contacts
+
+
+BASE_DN = 'dc=test,dc=local'
+LAST_SYNC = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def directory(monkeypatch):
+    """Пустой mock каталог LDAP, к которому подключаются менеджеры синхронизации"""
+    server = Server('mock', get_info=OFFLINE_AD_2012_R2)
+    connection = Connection(server, user=f'cn=admin,{BASE_DN}', password='secret', client_strategy=MOCK_SYNC)
+    connection.strategy.add_entry(f'cn=admin,{BASE_DN}', {'objectClass': 'top', 'userPassword': 'secret'})
+    connection.bind()
+
+    def connect(self):
+        self.connection = connection
+        return True, 'ok'
+
+    monkeypatch.setattr(LDAPManager, 'connect', connect)
+    monkeypatch.setattr(LDAPManager, 'disconnect', lambda self, discard=False: None)
+    return connection
+
+
+def _add_entry(connection, number, title, when_changed=None, photo=None):
+    attributes = {
+        'objectClass': 'person',
+        'cn': f'user{number}',
+        'title': title,
+        'objectGUID': uuid.UUID(int=number).bytes_le,
+        'whenCreated': '20200101000000.0Z',
+    }
+    if photo:
+        attributes['thumbnailPhoto'] = photo
+    if when_changed:
+        attributes['whenChanged'] = when_changed.strftime('%Y%m%d%H%M%S.0Z')
+    connection.strategy.add_entry(f'cn=user{number},{BASE_DN}', attributes)
+    return '{%s}' % uuid.UUID(int=number)
+
+
+def _add_server(last_sync):
+    server = LDAPServer(name='Mock', host='mock', port=389, base_dn=BASE_DN, bind_login='admin',
+                        bind_password='secret', search_filter='(objectClass=person)', last_sync=last_sync)
+    db.session.add(server)
+    db.session.commit()
+    return server.id
+
+
+def _title(guid):
+    db.session.expire_all()
+    return LDAPUsers.query.filter_by(guid=guid).one().title
+
+
+def test_first_sync_updates_previously_saved_contacts(directory):
+    guid = _add_entry(directory, 1, 'Новая должность', when_changed=datetime(2020, 1, 1))
+    new_guid = _add_entry(directory, 2, 'Инженер')
+    server_id = _add_server(last_sync=None)                                             # синхронизаций еще не было
+    db.session.add(LDAPUsers(guid=guid, server_id=server_id, cn='user1', title='Старая должность'))  # контакт сохранен вручную
+    db.session.commit()
+
+    success, message = sync_ldap_contacts(server_id)
+
+    assert success, message
+    assert _title(guid) == 'Новая должность'
+    assert _title(new_guid) == 'Инженер'
+
+
+def test_full_sync_applies_change_in_the_same_second(directory):
+    guid = _add_entry(directory, 1, 'Новая должность', when_changed=LAST_SYNC)         # изменен в ту же секунду, что и прошлая синхронизация
+    server_id = _add_server(last_sync=LAST_SYNC)
+    db.session.add(LDAPUsers(guid=guid, server_id=server_id, cn='user1', title='Старая должность'))
+    db.session.commit()
+
+    success, message = sync_ldap_contacts(server_id, full=True)
+
+    assert success, message
+    assert _title(guid) == 'Новая должность'
+
+
+def test_sync_deletes_only_replaced_unused_photos(directory):
+    old_photo, shared_photo, new_photo = (b'\xff\xd8' + bytes([number]) * 64 for number in range(3))
+    guid = _add_entry(directory, 1, 'Инженер', photo=new_photo)
+    server_id = _add_server(last_sync=LAST_SYNC)
+    db.session.add_all([
+        LDAPUsers(guid=guid, server_id=server_id, cn='user1', photo_hash=store_photo(old_photo)),
+        LDAPUsers(guid=None, server_id=server_id, cn='manual', photo_hash=store_photo(shared_photo)),
+    ])
+    unused = store_photo(shared_photo + b'unused')                                      # ни на кого не ссылается, но этот проход его не касался
+    db.session.commit()
+
+    success, message = sync_ldap_contacts(server_id, full=True)
+
+    assert success, message
+    assert {photo.hash for photo in ContactPhoto.query} == {
+        LDAPUsers.query.filter_by(guid=guid).one().photo_hash, store_photo(shared_photo), unused
+    }
+
+
+def test_sync_stops_after_deadline(directory):
+    _add_entry(directory, 1, 'Инженер')
+    server_id = _add_server(last_sync=None)
+
+    success, message = sync_ldap_contacts(server_id, deadline=time.monotonic() - 1)    # срок уже истек
+
+    assert not success
+    assert 'превышено время' in message
+    assert LDAPUsers.query.count() == 0                                                 # изменения откатаны
+    assert db.session.get(LDAPServer, server_id).sync_started_at is None               # блокировка снята
@@ -0,0 +1,74 @@
+"""API карты: видимая область, ближайшие коллеги и пакетное размещение."""
+import pytest
+
+from app import db
+from app.modules.ldap_mod.models import LDAPServer, LDAPUsers
+
+
+def _add_placed_users():
+    """Сервер с пользователями на сетке 10x10 с шагом 100px"""
+    server = LDAPServer(name='Организация')
+    db.session.add(server)
+    db.session.flush()
+    db.session.add_all([
+        LDAPUsers(server_id=server.id, cn=f'Сотрудник {col}-{row}', coordinates=f'{col * 100},{row * 100}', is_on_map=True)
+        for col in range(10) for row in range(10)
+    ])
+    db.session.commit()
+    return server.id
+
+
+@pytest.mark.parametrize('query', [
+    'x=nan&y=10', 'x=10&y=inf', 'x=-inf&y=10', 'x=abc&y=10', 'x=10',
+])
+def test_nearest_rejects_bad_point(client, query):
+    server_id = _add_placed_users()
+    assert client.get(f'/phonebook/api/map/{server_id}/nearest?{query}').status_code == 400
+
+
+@pytest.mark.parametrize('query', [
+    'x1=0&y1=0&x2=nan&y2=100', 'x1=0&y1=-inf&x2=100&y2=100', 'x1=0&y1=0&x2=100',
+])
+def test_viewport_rejects_bad_area(client, query):
+    server_id = _add_placed_users()
+    assert client.get(f'/phonebook/api/map/{server_id}/users?{query}').status_code == 400
+
+
+def test_viewport(client):
+    server_id = _add_placed_users()
+    data = client.get(f'/phonebook/api/map/{server_id}/users?x1=0&y1=0&x2=150&y2=150').get_json()
+    assert sorted((user['x'], user['y']) for user in data['users']) == [(0, 0), (0, 100), (100, 0), (100, 100)]
+
+
+@pytest.mark.parametrize('x, y', [(450, 450), (1e9, 1e9), (-1e12, 300)])
+def test_nearest_stops_expanding(client, count_queries, x, y):
+    server_id = _add_placed_users()
+    with count_queries() as statements:
+        data = client.get(f'/phonebook/api/map/{server_id}/nearest', query_string={'x': x, 'y': y, 'limit': 5}).get_json()
+
+    assert len(data['users']) == 5
+    distances = [user['distance'] for user in data['users']]
+    assert distances == sorted(distances)
+    assert len(statements) <= 4, '\n'.join(statements)                                 # не зависит от того, насколько далеко точка
+
+
+def test_batch_update(admin_client):
+    server_id = _add_placed_users()
+    if not db.session.get(LDAPUsers, 1):                                                # true из JSON совпал бы с этим id
+        db.session.add(LDAPUsers(id=1, server_id=server_id, cn='Первый', coordinates='9,9', is_on_map=True))
+        db.session.commit()
+    first, second = [user.id for user in LDAPUsers.query.filter(LDAPUsers.id != 1).order_by(LDAPUsers.id).limit(2)]
+
+    data = admin_client.post(f'/map/update_coordinates_batch/{server_id}', json={'changes': [
+        {'user_id': first, 'coordinates': '5,7'},
+        {'user_id': second, 'coordinates': None},
+        {'user_id': True, 'coordinates': '1,1'},                                        # true — не id пользователя (в Python это 1)
+        {'user_id': '3', 'coordinates': '1,1'},
+        {'user_id': first + 100000, 'coordinates': '1,1'},
+    ]}).get_json()
+
+    assert [result['success'] for result in data['results']] == [True, True, False, False, False]
+    db.session.expire_all()
+    assert (db.session.get(LDAPUsers, first).map_x, db.session.get(LDAPUsers, first).map_y) == (5, 7)
+    assert db.session.get(LDAPUsers, second).is_on_map is False
+    assert db.session.get(LDAPUsers, 1).coordinates != '1,1'
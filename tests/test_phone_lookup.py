@@ -0,0 +1,34 @@
+"""Обратный поиск контакта по номеру телефона."""
+from app import db
+from app.modules.ldap_mod.models import LDAPServer, LDAPUsers
+from app.modules.ldap_mod.phones import lookup_by_phone
+
+
+def _add_contacts():
+    server = LDAPServer(name='Организация')
+    db.session.add(server)
+    db.session.flush()
+    db.session.add_all([
+        LDAPUsers(server_id=server.id, cn='Петров', telephone='8 (383) 123-45-67', mobile='+7 913 000-11-29'),
+        LDAPUsers(server_id=server.id, cn='Сидоров', telephone='+7 383 765-45-67'),
+        LDAPUsers(server_id=server.id, cn='Иванов', telephone='+7 383 123-45-68'),
+    ])
+    db.session.commit()
+
+
+def test_exact_number(app):
+    _add_contacts()
+    assert [row.cn for row in lookup_by_phone('+7 383 123 45 67')] == ['Петров']
+
+
+def test_suffix(app):
+    _add_contacts()
+    assert [row.cn for row in lookup_by_phone('4567', suffix_digits=4)] == ['Петров', 'Сидоров']
+    assert [(row.cn, row.kind) for row in lookup_by_phone('11-29', suffix_digits=4)] == [('Петров', 'mobile')]
+    assert lookup_by_phone('1129', suffix_digits=5) == []                               # цифр меньше, чем нужно сравнить
+
+
+def test_api_lookup(client):
+    _add_contacts()
+    data = client.get('/phonebook/api/lookup', query_string={'number': '8 383 123-45-67'}).get_json()
+    assert [contact['cn'] for contact in data['contacts']] == ['Петров']
@@ -0,0 +1,23 @@
+"""Keyset пагинация API контактов: каждый контакт ровно один раз, в порядке (cn, id)."""
+from conftest import insert_contacts
+
+
+def test_pages_cover_all_contacts_with_equal_names(client):
+    insert_contacts(250, cn='Иванов Иван')                                               # одинаковые имена — порядок решает id
+
+    seen = []
+    cursor = None
+    while True:
+        response = client.get('/phonebook/api/contacts', query_string={'limit': 40, **({'cursor': cursor} if cursor else {})})
+        data = response.get_json()
+        seen.extend(contact['id'] for contact in data['contacts'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+
+    assert len(seen) == 250
+    assert seen == sorted(seen)
+
+
+def test_invalid_cursor(client):
+    assert client.get('/phonebook/api/contacts?cursor=zzz').status_code == 400
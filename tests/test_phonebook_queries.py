@@ -0,0 +1,63 @@
+"""
+Число SQL запросов страниц телефонной книги не должно зависеть от количества контактов
+(нет запросов на каждый контакт: связей, фото и т.п.).
+"""
+import pytest
+
+from app import cache, db
+from app.modules.ldap_mod.models import LDAPUsers, LDAPServer, ContactPhoto
+from app.modules.phonebook_mod.search import invalidate_search_index
+from conftest import insert_contacts
+
+
+BASE_COUNT = 30
+
+
+def _reset():
+    db.session.execute(LDAPUsers.__table__.delete())
+    db.session.execute(LDAPServer.__table__.delete())
+    db.session.execute(ContactPhoto.__table__.delete())
+    db.session.commit()
+    db.session.expunge_all()
+    cache.clear()
+    invalidate_search_index()
+
+
+def _statements_for(client, count_queries, count, url):
+    _reset()
+    insert_contacts(count)
+    with count_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return statements
+
+
+@pytest.mark.parametrize('url', [
+    '/phonebook/phonebook_index',
+    '/phonebook/phonebook_index?search=сотрудник',
+    '/phonebook/api/contacts',
+    '/phonebook/api/contacts?format=html',
+    '/phonebook/api/contacts?organization=Организация 1',
+])
+def test_statement_count_does_not_grow_with_contacts(client, count_queries, url):
+    small = _statements_for(client, count_queries, BASE_COUNT, url)
+    large = _statements_for(client, count_queries, BASE_COUNT * 10, url)
+    assert len(small) == len(large), '\n'.join(large)
+
+
+def test_phonebook_page_does_not_read_photos(client, count_queries):
+    insert_contacts(BASE_COUNT)
+    with count_queries() as statements:
+        response = client.get('/phonebook/phonebook_index')
+    assert response.status_code == 200
+    assert not any('ldap_users.photo AS' in statement for statement in statements), '\n'.join(statements)
+
+
+def test_cached_phonebook_page_reads_only_version(client, count_queries):
+    insert_contacts(BASE_COUNT * 10)
+    client.get('/phonebook/phonebook_index')                                             # прогрев кеша
+
+    with count_queries() as statements:
+        response = client.get('/phonebook/phonebook_index')
+    assert response.status_code == 200
+    assert len(statements) == 1, '\n'.join(statements)
@@ -0,0 +1,97 @@
+"""
+Запросы к контактам, которые выполняет приложение, должны обслуживаться индексами.
+
+Таблица заполняется 100k контактами, выполняются сами функции и запросы из views,
+а для каждого отправленного в БД SELECT строится план (EXPLAIN). Тест падает, если
+ldap_users или ldap_user_phones читаются полным просмотром: SQLite — SCAN (в том числе
+обход всего индекса), PostgreSQL — Seq Scan.
+"""
+import re
+
+from sqlalchemy import event, text
+
+from app import db
+from app.modules.ldap_mod.models import LDAPUsers, LDAPUserPhone
+from app.modules.ldap_mod.phones import build_phone_rows, lookup_by_phone
+from app.modules.map_mod.spatial import users_in_viewport, nearest_users
+from app.modules.phonebook_mod.queries import get_contacts_page
+from conftest import insert_contacts
+
+
+CONTACTS = 100000
+SERVERS = 20
+ON_MAP_EVERY = 100                                                                      # размещен на карте каждый сотый контакт
+CHECKED_TABLES = ('ldap_users', 'ldap_user_phones')
+
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (%s)\b' % '|'.join(CHECKED_TABLES))
+POSTGRESQL_FULL_SCAN = re.compile(r'Seq Scan on (%s)\b' % '|'.join(CHECKED_TABLES))
+
+
+def _seed():
+    server_ids = insert_contacts(CONTACTS, servers=SERVERS)
+    users = LDAPUsers.__table__
+    db.session.execute(users.update().where(users.c.id % ON_MAP_EVERY == 0).values(
+        is_on_map=True, map_x=users.c.id % 1000, map_y=users.c.id / ON_MAP_EVERY
+    ))
+    phones = []
+    for user_id, telephone in db.session.execute(db.select(users.c.id, users.c.telephone)):
+        phones.extend(build_phone_rows(user_id, {'telephone': telephone}))
+    db.session.execute(LDAPUserPhone.__table__.insert(), phones)
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    return server_ids
+
+
+def _app_queries(server_id):
+    """Запросы к контактам в том виде, в каком их выполняет приложение"""
+    first_page, cursor = get_contacts_page(limit=100)
+    get_contacts_page(cursor=cursor, limit=100)                                         # keyset: следующая страница
+    get_contacts_page(organization='Организация 3', limit=100)
+    lookup_by_phone('+7 495 0012345')                                                   # точный номер
+    lookup_by_phone('12345', suffix_digits=5)                                           # последние цифры
+    users_in_viewport(server_id, 0, 0, 200, 200)
+    nearest_users(server_id, 100, 50)
+    LDAPUsers.query.filter_by(server_id=server_id).order_by(LDAPUsers.cn).all()       # show_list_saved_contacts
+    LDAPUsers.query.filter_by(server_id=server_id).all()                              # get_users_for_map
+    LDAPUsers.query.filter_by(server_id=server_id, is_on_map=True).all()              # размещенные на карте
+    LDAPUsers.query.filter_by(guid='guid-00004242', server_id=server_id).first()      # quick_add_contact / quick_update_contact
+    db.session.query(LDAPUsers.guid, LDAPUsers.content_hash).filter(                    # сравнение при синхронизации
+        LDAPUsers.server_id == server_id, LDAPUsers.guid.isnot(None), LDAPUsers.guid != ''
+    ).all()
+
+
+def _full_scans(statement, parameters):
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        plan = [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+        return [line.strip() for line in plan if POSTGRESQL_FULL_SCAN.search(line)]
+    # Первая страница без фильтров: обход индекса в порядке сортировки только до LIMIT
+    if not re.search(r'\bWHERE\b', statement) and re.search(r'\bLIMIT\b', statement):
+        return []
+    plan = [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+    return [line for line in plan if SQLITE_FULL_SCAN.match(line)]
+
+
+def test_contact_queries_use_indexes(app):
+    server_ids = _seed()
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        _app_queries(server_ids[3])
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert statements
+    problems = []
+    for statement, parameters in statements:
+        scans = _full_scans(statement, parameters)
+        if scans:
+            problems.append(f'{", ".join(scans)}:\n{statement}')
+    assert not problems, '\n\n'.join(problems)
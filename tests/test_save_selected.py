@@ -0,0 +1,116 @@
+"""
+Сохранение выбранных в LDAP контактов: число SQL запросов не зависит от числа
+выбранных GUID внутри пачки и растет только на константу с каждой пачкой BULK_BATCH_SIZE.
+"""
+import math
+import re
+import uuid
+
+import pytest
+from ldap3 import Server, Connection, MOCK_SYNC, OFFLINE_AD_2012_R2
+
+from app import db
+from app.modules.ldap_mod.bulk import BULK_BATCH_SIZE
+from app.modules.ldap_mod.ldap_class import LDAPManager
+from app.modules.ldap_mod.models import LDAPServer, LDAPUsers
+
+
+ENTRIES = 2000
+BASE_DN = 'dc=test,dc=local'
+PHOTO = b'\xff\xd8' + bytes(64)                                                        # у всех одно фото: хранится один раз
+
+
+@pytest.fixture(scope='module')
+def ldap_connection():
+    server = Server('mock', get_info=OFFLINE_AD_2012_R2)
+    connection = Connection(server, user=f'cn=admin,{BASE_DN}', password='secret', client_strategy=MOCK_SYNC)
+    connection.strategy.add_entry(f'cn=admin,{BASE_DN}', {'objectClass': 'top', 'userPassword': 'secret'})
+    for number in range(ENTRIES):
+        connection.strategy.add_entry(f'cn=user{number},{BASE_DN}', {
+            'objectClass': 'person',
+            'cn': f'user{number}',
+            'telephoneNumber': f'+7 495 {number:07d}',
+            'objectGUID': uuid.UUID(int=number + 1).bytes_le,
+            'thumbnailPhoto': PHOTO,
+        })
+    connection.bind()
+    return connection
+
+
+@pytest.fixture
+def snapshot(admin_client, ldap_connection, monkeypatch):
+    """Открывает страницу выбора контактов и возвращает (server_id, snapshot_id, все GUID)"""
+    def connect(self):
+        self.connection = ldap_connection
+        return True, 'ok'
+
+    monkeypatch.setattr(LDAPManager, 'connect', connect)
+    monkeypatch.setattr(LDAPManager, 'disconnect', lambda self, discard=False: None)
+
+    server = LDAPServer(name='Mock', host='mock', port=389, base_dn=BASE_DN, bind_login='admin',
+                        bind_password='secret', search_filter='(objectClass=person)')
+    db.session.add(server)
+    db.session.commit()
+
+    response = admin_client.get(f'/ldap/{server.id}/users')
+    assert response.status_code == 200
+    snapshot_id = re.search(rb'name="snapshot_id" value="(\w+)"', response.data).group(1).decode()
+    guids = ['{%s}' % uuid.UUID(int=number + 1) for number in range(ENTRIES)]
+    return server.id, snapshot_id, guids
+
+
+def _save(admin_client, count_queries, server_id, snapshot_id, guids):
+    with count_queries() as statements:
+        response = admin_client.post('/ldap/save-selected', data={
+            'server_id': server_id, 'snapshot_id': snapshot_id, 'selected_users': guids
+        })
+    assert response.status_code == 302
+    return statements
+
+
+# Запросы одной пачки: выбор сохраненных GUID (IN), upsert, удаление и запись телефонов
+STATEMENTS_PER_BATCH = 4
+# Сверх пачек: увеличение версии контактов (2 запроса, если строки счетчика еще нет),
+# а при новом фото — его поиск в хранилище и запись. Фото не менялись — осиротевшие не ищутся
+FIRST_SAVE_STATEMENTS = 4
+RESAVE_STATEMENTS = 1
+
+
+@pytest.mark.parametrize('count', [100, 300, 500, 1500, 2000])
+def test_statement_count_for_large_selection(admin_client, count_queries, snapshot, count):
+    server_id, snapshot_id, guids = snapshot
+    batches = math.ceil(count / BULK_BATCH_SIZE)
+
+    statements = _save(admin_client, count_queries, server_id, snapshot_id, guids[:count])
+    assert LDAPUsers.query.count() == count
+    assert len(statements) == FIRST_SAVE_STATEMENTS + STATEMENTS_PER_BATCH * batches, '\n'.join(statements)
+
+    statements = _save(admin_client, count_queries, server_id, snapshot_id, guids[:count])   # те же контакты: только обновление
+    assert LDAPUsers.query.count() == count
+    assert len(statements) == RESAVE_STATEMENTS + STATEMENTS_PER_BATCH * batches, '\n'.join(statements)
+
+
+def test_browse_page_renders_one_page_of_snapshot(admin_client, snapshot, monkeypatch):
+    server_id, snapshot_id, guids = snapshot
+    monkeypatch.setattr(LDAPManager, 'connect', lambda self: pytest.fail('страницы снимка читаются без LDAP'))
+
+    response = admin_client.get(f'/ldap/{server_id}/users?snapshot_id={snapshot_id}&page=2')
+
+    assert response.status_code == 200
+    shown = re.findall(rb'name="selected_users"\s+value="([^"]+)"', response.data)
+    page_size = admin_client.application.config['LDAP_BROWSE_PAGE_SIZE']
+    assert len(shown) == page_size
+    assert shown[0].decode() == sorted(guids, key=lambda guid: f'user{uuid.UUID(guid).int - 1}')[page_size]
+
+
+def test_flash_reports_saved_count(admin_client, snapshot):
+    server_id, snapshot_id, guids = snapshot
+
+    admin_client.post('/ldap/save-selected', data={
+        'server_id': server_id, 'snapshot_id': snapshot_id, 'selected_users': guids[:3] + ['{unknown}']
+    })
+
+    with admin_client.session_transaction() as session:
+        messages = dict((message, category) for category, message in session['_flashes'])
+    assert messages['Успешно сохранено/обновленно 3 пользователей'] == 'success'
+    assert messages['Не найдено в списке LDAP: 1 пользователей'] == 'warning'